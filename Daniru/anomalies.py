@@ -0,0 +1,223 @@
+"""
+Sales anomalies across every brand, category, city and product series
+
+Monthly revenue and transaction counts of every series of the DIMENSIONS
+are laid out as one series x month array and scored all at once:
+
+- rolling (default): robust z-score of each month against the median and
+  MAD (median absolute deviation) of the WINDOW months before it
+- seasonal: robust z-score of each month's change on the same month a year
+  earlier, against the median and MAD of all of that series' yearly changes
+
+Months scoring THRESHOLD or more either way are flagged. Series too sparse
+for a median to mean anything (sales in under MIN_ACTIVE of the reference
+months) are not scored, and a month the data ends partway through is left
+out, so it does not read as a drop.
+
+The flagged months go to a compact parquet table that the dashboard's alerts
+panel reads:
+
+    python anomalies.py                               # every dimension
+    python anomalies.py --method seasonal --dimension City Brand,Category
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+
+# Series are grouped by each of these (comma-joined names group by several columns)
+DIMENSIONS = ("Brand", "Category", "City", "Product_Name")
+METRICS = ("revenue", "transactions")
+METHODS = ("rolling", "seasonal")
+WINDOW = 12
+SEASON = 12
+# The usual cut-off for robust (median / MAD) z-scores
+THRESHOLD = 3.5
+MIN_ACTIVE = 0.5
+# MAD of normally distributed data is 0.6745 standard deviations
+MAD_SCALE = 1.4826
+# Series scored per block, bounding the sliding-window copies
+CHUNK = 16_384
+
+ANOMALIES_FILE = os.path.join(".pipeline", "anomalies.parquet")
+
+def series_matrix(df, keys):
+    """
+    Monthly revenue and transactions of every series of a dimension
+
+    Args:
+        df (pd.DataFrame): Transactions with the key columns, a datetime
+            Purchase_Date and Purchase_Amount
+        keys (list): Columns identifying a series
+
+    Returns:
+        tuple: (names, months, values) where names labels each series,
+            months are the complete months (month ends) and values is a
+            metrics x series x months float32 array, 0 for months without
+            sales
+    """
+    df = df[df["Purchase_Date"].notna()]
+    dates = df["Purchase_Date"]
+    first, last = dates.min().to_period("M"), dates.max().to_period("M")
+    # A month the data stops partway through would look like a drop
+    if dates.max() < last.to_timestamp("M"):
+        last -= 1
+    months = pd.period_range(first, last, freq="M")
+    column = (dates.dt.year.to_numpy() - first.year) * 12 + dates.dt.month.to_numpy() - first.month
+
+    codes, uniques = pd.MultiIndex.from_frame(df[keys]).factorize() if len(keys) > 1 else pd.factorize(df[keys[0]])
+    keep = (codes >= 0) & (column < len(months))
+    cell = codes[keep].astype(np.int64) * len(months) + column[keep]
+    size = len(uniques) * len(months)
+    values = np.stack([
+        np.bincount(cell, weights=df["Purchase_Amount"].to_numpy(dtype=float)[keep], minlength=size),
+        np.bincount(cell, minlength=size).astype(float),
+    ]).reshape(len(METRICS), len(uniques), len(months)).astype(np.float32)
+
+    names = [" / ".join(map(str, key)) for key in uniques] if len(keys) > 1 else [str(key) for key in uniques]
+    return np.asarray(names, dtype=object), months.to_timestamp("M"), values
+
+def _robust_z(values, reference, counts=False):
+    """
+    z-scores of values against the median / MAD of their reference windows
+
+    Args:
+        values (np.ndarray): series x months
+        reference (np.ndarray): series x months x window
+        counts (bool): Values are counts, which vary by at least their
+            Poisson noise (the square root of their level)
+
+    Returns:
+        tuple: (z, expected), NaN where the reference is too sparse
+    """
+    median = np.median(reference, axis=-1)
+    mad = np.median(np.abs(reference - median[..., None]), axis=-1)
+    # A series steady enough to have no spread still gets a small one
+    scale = np.maximum(MAD_SCALE * mad, 0.05 * np.abs(median))
+    if counts:
+        scale = np.maximum(scale, np.sqrt(np.abs(median)))
+    active = (reference != 0).mean(axis=-1) >= MIN_ACTIVE
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(active & (scale > 0), (values - median) / scale, np.nan)
+    return z, median
+
+def score(values, method="rolling", window=WINDOW, season=SEASON, counts=False):
+    """
+    Robust z-scores of every series and month
+
+    Args:
+        values (np.ndarray): series x months
+        method (str): One of METHODS
+        window (int): Reference months of the rolling method
+        season (int): Months in a year, for the seasonal method
+        counts (bool): Values are counts (see _robust_z)
+
+    Returns:
+        tuple: (z, expected), series x months, NaN for months that cannot be
+            scored (the first window or season months, sparse series)
+    """
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    z = np.full(values.shape, np.nan, dtype=np.float32)
+    expected = np.full(values.shape, np.nan, dtype=np.float32)
+    if method == "rolling":
+        if values.shape[1] <= window:
+            return z, expected
+        # Window ending the month before each scored month
+        reference = sliding_window_view(values, window, axis=1)[:, :-1]
+        z[:, window:], expected[:, window:] = _robust_z(values[:, window:], reference, counts)
+    elif method == "seasonal":
+        if values.shape[1] <= season:
+            return z, expected
+        change = values[:, season:] - values[:, :-season]
+        # Every yearly change of a series is scored against all of them
+        reference = np.broadcast_to(change[:, None, :], change.shape + (change.shape[1],))
+        z[:, season:], centre = _robust_z(change, reference, counts)
+        expected[:, season:] = values[:, :-season] + centre
+    else:
+        raise ValueError(f"Unknown method {method!r}; expected one of {METHODS}")
+    return z, expected
+
+def detect(df, dimensions=DIMENSIONS, method="rolling", threshold=THRESHOLD):
+    """
+    Flag anomalous months of every series of the dimensions
+
+    Args:
+        df (pd.DataFrame): Cleaned transactions
+        dimensions (tuple): Column names; "A,B" groups by both columns
+        method (str): One of METHODS
+        threshold (float): Smallest |z| flagged
+
+    Returns:
+        pd.DataFrame: One row per flagged series, metric and month:
+            dimension, series, metric, month, value, expected, z and kind
+            ("spike" or "drop"), latest month first, then by |z|
+    """
+    frames = []
+    with span("anomalies", method=method) as info:
+        series = 0
+        for dimension in dimensions:
+            keys = dimension.split(",")
+            names, months, values = series_matrix(df, keys)
+            series += values.shape[1]
+            for m, metric in enumerate(METRICS):
+                for start in range(0, values.shape[1], CHUNK):
+                    block = values[m, start:start + CHUNK]
+                    z, expected = score(block, method, counts=metric == "transactions")
+                    rows, cols = np.nonzero(np.abs(np.nan_to_num(z)) >= threshold)
+                    frames.append(pd.DataFrame({
+                        "dimension": dimension.replace(",", " × "),
+                        "series": names[start + rows],
+                        "metric": metric,
+                        "month": months[cols],
+                        "value": block[rows, cols],
+                        "expected": expected[rows, cols],
+                        "z": z[rows, cols],
+                    }))
+        info.update(series=series)
+
+    alerts = pd.concat(frames, ignore_index=True)
+    alerts["kind"] = np.where(alerts["z"] > 0, "spike", "drop")
+    order = np.lexsort((-alerts["z"].abs().to_numpy(), -alerts["month"].to_numpy().astype(np.int64)))
+    return alerts.iloc[order].reset_index(drop=True)
+
+def save(alerts, path=ANOMALIES_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    alerts.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def load(path=ANOMALIES_FILE):
+    """Read stored alerts, or None if detection has not run"""
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+def main():
+    import utils
+
+    parser = argparse.ArgumentParser(description="Flag anomalous months in every brand, category, city and product series")
+    parser.add_argument("--data", default="Walmart_customer_fixed.csv", help="CSV to scan")
+    parser.add_argument("--dimension", nargs="+", default=list(DIMENSIONS),
+                        help="columns to group series by; A,B groups by both")
+    parser.add_argument("--method", choices=METHODS, default="rolling", help="reference for the z-scores")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="smallest |z| flagged")
+    args = parser.parse_args()
+
+    columns = sorted({c for d in args.dimension for c in d.split(",")} | {"Purchase_Date", "Purchase_Amount"})
+    df, _ = utils.load_and_clean_data(args.data, columns=columns)
+    alerts = detect(df, tuple(args.dimension), args.method, args.threshold)
+    save(alerts)
+
+    print(f"🚨 {len(alerts):,} anomalous months flagged ({(alerts['kind'] == 'spike').sum():,} spikes, "
+          f"{(alerts['kind'] == 'drop').sum():,} drops)")
+    with pd.option_context("display.width", 140):
+        print(alerts.head(10).to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+    print(f"💾 Alerts saved to: {ANOMALIES_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,30 @@
-import streamlit as st
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import os
-from PIL import Image
-import base64
-from io import BytesIO
+import time
+
+import streamlit as st
+
+import instrumentation
+import utils
+
+# Heavy modules (pandas, Plotly, PIL) are imported inside the functions that
+# need them, so pages without charts or data start without paying for them.
+
+DATA_FILE = "Walmart_customer_fixed.csv"
+
+# Columns each data-backed page reads from the CSV on first use
+PAGE_COLUMNS = {
+    "overview": ("Brand", "Purchase_Amount", "Rating", "Market_Price", "Customer_ID"),
+    "feature_analysis": ("Brand", "City", "Market_Price", "Purchase_Amount", "Discount_Applied", "Purchase_Date"),
+    "market_insights": ("Brand", "Purchase_Date", "Purchase_Amount", "Product_Category", "Category", "Age_Group",
+                        "Gender_Group"),
+    "forecast_explorer": ("Brand", "Product_Name", "Purchase_Date", "Purchase_Amount", "Rating", "Market_Price"),
+}
+
+# The diagnostics page is left out of the menu unless the URL has ?diagnostics=1
+DIAGNOSTICS_PAGE = "🩺 Diagnostics"
+
+# Page renders kept per session for the diagnostics page
+MAX_RENDER_TIMINGS = 200
 
 # Set page config
 st.set_page_config(
@@ -60,294 +75,492 @@ st.markdown('<h1 class="main-header">🍎 Apple Market Analyzer Dashboard</h1>',
 
 # Sidebar navigation
 st.sidebar.title("📊 Navigation")
+page_options = ["🏠 Overview", "📈 Feature Analysis", "🔮 Predictions", "🧭 Forecast Explorer", "📊 Market Insights", "📋 Reports"]
+if st.query_params.get("diagnostics") == "1":
+    page_options.append(DIAGNOSTICS_PAGE)
 page = st.sidebar.selectbox(
     "Choose Analysis Section",
-    ["🏠 Overview", "📈 Feature Analysis", "🔮 Predictions", "📊 Market Insights", "📋 Reports"]
+    page_options,
+    key="page"
 )
 
+# Keep the sidebar filter selections while on pages that don't draw them
+# (Streamlit drops the state of widgets a run leaves out)
+for key in [k for k in st.session_state if str(k).startswith("filter_") or k == "exact_counts"]:
+    st.session_state[key] = st.session_state[key]
+
 # Load data utility functions
-@st.cache_data
-def load_data():
-    """Load the main dataset"""
+@st.cache_resource(max_entries=2 * len(PAGE_COLUMNS))
+def load_apple_data(version, columns):
+    """
+    Load and clean the given dataset columns once per dataset version
+    
+    The sidebar filter columns are loaded too. The frames are shared
+    read-only by every session rather than copied into each one (as
+    st.cache_data would), so an extra viewer costs only its own widget
+    state. Pages must not modify them; derive new frames instead.
+    """
+    import filters
+    import pipeline
+    import segments
+    
+    # Customer segments are joined on Customer_ID, when they have been fitted
+    assignments = segments.load_assignments(pipeline.SEGMENTS_FILE)
+    wanted = list(columns) + [column for column in filters.FILTERS if column not in columns]
+    if assignments is not None and "Customer_ID" not in wanted:
+        wanted.append("Customer_ID")
+    df, apple_df = utils.load_and_clean_data(DATA_FILE, columns=wanted)
+    if df is not None and assignments is not None:
+        join_only = [] if "Customer_ID" in columns else ["Customer_ID"]
+        df = segments.attach(df, assignments).drop(columns=join_only)
+        apple_df = segments.attach(apple_df, assignments).drop(columns=join_only)
+    return utils.share_frame(df), utils.share_frame(apple_df)
+
+@st.cache_resource(max_entries=2 * len(PAGE_COLUMNS))
+def load_filter_index(version, columns):
+    """
+    Index a page's frame for the sidebar filters, once for all sessions
+    
+    Returns:
+        tuple: (filters.FilterIndex over df, boolean mask of df's Apple rows)
+    """
+    import filters
+    
+    df, apple_df = load_apple_data(version, columns)
+    return filters.FilterIndex(df), df.index.isin(apple_df.index)
+
+def filter_masks(version, columns, selections):
+    """
+    Row masks of a page's frames for the filter selections
+    
+    Returns:
+        tuple: (mask over df, mask over apple_df), or None when no filter
+            applies
+    """
+    if not selections:
+        return None
+    
+    index, apple_rows = load_filter_index(version, columns)
+    mask = index.mask(selections)
+    return None if mask is None else (mask, mask[apple_rows])
+
+def current_data_version():
+    """
+    Version token of the data the pages draw
+    
+    Covers the CSV and the customer segments joined onto it, so rewriting
+    either reloads the frames and rebuilds the charts.
+    """
+    import pipeline
+    
+    return f"{utils.dataset_version(DATA_FILE)}+{utils.dataset_version(pipeline.SEGMENTS_FILE)}"
+
+def clear_filters():
+    for key in [k for k in st.session_state if str(k).startswith("filter_")]:
+        del st.session_state[key]
+
+def render_filters(index):
+    """
+    Draw the sidebar filters and return the active selections
+    
+    Returns:
+        tuple: (column, selection) pairs for filters.FilterIndex.mask(), only
+            for filters narrowed from their defaults
+    """
+    import filters
+    
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("🔍 Filters")
+    selections = []
+    
+    bounds = index.bounds("Purchase_Date") if "Purchase_Date" in index else None
+    if bounds:
+        full_range = (bounds[0].date(), bounds[1].date())
+        st.session_state.setdefault("filter_Purchase_Date", full_range)
+        picked = st.sidebar.date_input("Purchase date", min_value=full_range[0], max_value=full_range[1],
+                                       key="filter_Purchase_Date")
+        # A range being picked has only its start date until the second click
+        if len(picked) == 2 and tuple(picked) != full_range:
+            selections.append(("Purchase_Date", tuple(picked)))
+    
+    widgets = [("City", "City", None), ("Category", "Category", None),
+               ("Age", "Age group", list(filters.AGE_GROUPS)), ("Discount_Applied", "Discount applied", None),
+               ("Segment", "Customer segment", None)]
+    for column, label, options in widgets:
+        if column in index:
+            picked = st.sidebar.multiselect(label, options or index.values(column), placeholder="All",
+                                            key=f"filter_{column}")
+            if picked:
+                selections.append((column, tuple(picked)))
+    
+    st.sidebar.button("Clear filters", on_click=clear_filters, disabled=not selections)
+    st.sidebar.caption("Filters apply to the Overview, Feature Analysis and Market Insights pages")
+    st.sidebar.toggle("Exact counts", key="exact_counts",
+                      help="Compute customer counts and top cities from the data instead of the pipeline's sketches")
+    return tuple(selections)
+
+@st.cache_resource(max_entries=2)
+def load_sketches(version):
+    """Load the pipeline's sketches once per file version, shared by all sessions"""
+    import pipeline
+    import sketches
+    
+    return sketches.Sketches.load(pipeline.SKETCHES_FILE)
+
+def sketch_version(selections):
+    """
+    Version of the pipeline's sketches, when tiles may answer from them
+    
+    Sketches cover the whole, unfiltered dataset, so filtered views, the
+    "Exact counts" toggle and sketches older than the data (or missing) fall
+    back to computing from the loaded frames.
+    
+    Returns:
+        str: Version of the sketches and data files to pass to
+            load_sketches(), or None to compute exactly
+    """
+    import pipeline
+    
+    if selections or st.session_state.get("exact_counts"):
+        return None
     try:
-        df = pd.read_csv("Walmart_customer_fixed.csv", low_memory=False)
-        return df
-    except FileNotFoundError:
-        st.error("Data file not found. Please ensure 'Walmart_customer_fixed.csv' is in the correct location.")
+        current = os.path.getmtime(pipeline.SKETCHES_FILE) >= os.path.getmtime(DATA_FILE)
+    except OSError:
+        current = False
+    if not current:
         return None
+    return f"{utils.dataset_version(pipeline.SKETCHES_FILE)}+{utils.dataset_version(DATA_FILE)}"
 
-@st.cache_data
-def load_apple_data():
-    """Load and process Apple-specific data"""
-    df = load_data()
-    if df is not None:
-        # Clean and process data
-        df = df.drop_duplicates()
-        thresh = 0.5 * df.shape[0]
-        df = df.loc[:, df.isna().sum() <= thresh]
-        
-        # Convert common fields
-        if "Purchase_Date" in df.columns:
-            df["Purchase_Date"] = pd.to_datetime(df["Purchase_Date"], errors="coerce")
-        if "Market_Price" in df.columns:
-            df["Market_Price"] = pd.to_numeric(df["Market_Price"], errors="coerce")
-        if "Purchase_Amount" in df.columns:
-            df["Purchase_Amount"] = pd.to_numeric(df["Purchase_Amount"], errors="coerce")
-        if "Rating" in df.columns:
-            df["Rating"] = pd.to_numeric(df["Rating"], errors="coerce")
-        
-        # Fill missing values
-        if "Purchase_Amount" in df.columns:
-            df["Purchase_Amount"] = df["Purchase_Amount"].fillna(1)
-        
-        # Filter for Apple products
-        apple_df = df[df["Brand"].str.lower() == "apple"].copy()
-        return df, apple_df
-    return None, None
-
-def load_summary_data():
-    """Load summary data from text files"""
-    summaries = {}
-    summary_files = {
-        'ratings': 'apple_ratings/apple_ratings_summary.txt',
-        'sales': 'apple_sales/apple_sales_summary.txt',
-        'price_elasticity': 'price_elasticity/price_elasticity_summary.txt',
-        'product_domination': 'product_domination/product_domination_summary.txt'
-    }
+@st.cache_data(show_spinner=False)
+def build_sketch_chart_json(version):
+    """Build the top cities chart from the sketches and cache its Plotly JSON"""
+    import charts
     
-    for key, file_path in summary_files.items():
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                summaries[key] = f.read()
-        except FileNotFoundError:
-            summaries[key] = f"Summary file not found: {file_path}"
-    
-    return summaries
-
-def load_forecast_images():
-    """Load forecast images"""
-    images = {}
-    image_files = {
-        'ratings': 'apple_ratings/apple_ratings_forecast.png',
-        'sales': 'apple_sales/apple_sales_forecast.png',
-        'price_elasticity': 'price_elasticity/price_elasticity_forecast.png',
-        'product_domination': 'product_domination/product_domination_forecast.png'
-    }
+    top = load_sketches(version).top_cities.top(10)["estimate"]
+    return charts.create_top_cities_chart(top, approximate=True).to_json()
+
+def filtered_data(version, columns):
+    """
+    Draw the sidebar filters and return the page's frames narrowed to them
     
-    for key, file_path in image_files.items():
+    Returns:
+        tuple: (full_dataframe, apple_dataframe, selections); the frames are
+            None if the data could not be loaded or no Apple rows match
+    """
+    df, apple_df = load_apple_data(version, columns)
+    if df is None or apple_df is None:
+        return None, None, ()
+    
+    index, _ = load_filter_index(version, columns)
+    selections = render_filters(index)
+    if not selections:
+        return df, apple_df, selections
+    
+    with instrumentation.span("filter", filters=len(selections)):
+        masks = filter_masks(version, columns, selections)
+        if masks is not None:
+            df, apple_df = df[masks[0]], apple_df[masks[1]]
+    st.sidebar.caption(f"{len(df):,} of {index.size:,} transactions match")
+    if apple_df.empty:
+        st.warning("No Apple transactions match the filters")
+        return None, None, selections
+    return df, apple_df, selections
+
+@st.cache_data(show_spinner=False, max_entries=500)
+def build_chart_json(builder, version, columns, frame="apple_df", filters=(), **params):
+    """
+    Build a chart from the charts module and cache its Plotly JSON
+    
+    The cache key is the builder name, the dataset version, the filter
+    selections and the chart parameters, so revisiting a page skips
+    rebuilding the figure.
+    """
+    import charts
+    
+    df, apple_df = load_apple_data(version, columns)
+    if df is None or apple_df is None:
+        return None
+    
+    # Only the frame this chart draws is narrowed
+    masks = filter_masks(version, columns, filters)
+    if frame == "demographics":
+        data = demographics_cube(version, columns, masks)
+    else:
+        data = df if frame == "df" else apple_df
+        if masks is not None:
+            data = data[masks[0] if frame == "df" else masks[1]]
+    
+    with instrumentation.span("plot", builder=builder):
+        fig = getattr(charts, builder)(data, **params)
+        return fig.to_json() if fig is not None else None
+
+def demographics_cube(version, columns, masks):
+    """
+    Age_Group x Gender x Brand x Category cube of a page's frame
+    
+    The unfiltered cube is the pipeline's stored one when it is newer than
+    the data; filtered views (or a missing or stale cube) group the
+    matching rows instead.
+    """
+    import demographics
+    
+    df, _ = load_apple_data(version, columns)
+    if masks is None:
         try:
-            if os.path.exists(file_path):
-                images[key] = Image.open(file_path)
-            else:
-                images[key] = None
-        except Exception as e:
-            st.warning(f"Could not load image {file_path}: {str(e)}")
-            images[key] = None
+            current = os.path.getmtime(demographics.CUBE_FILE) >= os.path.getmtime(DATA_FILE)
+        except OSError:
+            current = False
+        if current:
+            return demographics.load()
+        return demographics.cube(df)
+    return demographics.cube(df[masks[0]])
+
+@st.cache_resource
+def get_forecast_queue():
+    """Share one background forecast queue across all sessions"""
+    import forecast_jobs
     
-    return images
+    return forecast_jobs.ForecastJobQueue()
+
+@st.fragment(run_every=1)
+def show_forecast_progress(metric, brand, product, horizon):
+    """Poll a background forecast job, rerunning the page once it finishes"""
+    job = get_forecast_queue().status(metric, brand, product, horizon)
+    if job is None or job["state"] in ("done", "failed"):
+        st.rerun()
+    st.progress(job["progress"], text=f"⏳ {job['message']}")
+
+def show_chart(builder, version, columns, frame="apple_df", filters=(), **params):
+    """Render a cached chart, returning False if it could not be built"""
+    import plotly.io as pio
+    
+    fig_json = build_chart_json(builder, version, columns, frame, filters, **params)
+    if fig_json is None:
+        return False
+    st.plotly_chart(pio.from_json(fig_json), use_container_width=True)
+    return True
+
+def zoom_slider(label, key, low, high):
+    """
+    Draw a range slider over a column's values
+    
+    The chosen window is kept in session state and clamped to the current
+    bounds, which move whenever the sidebar filters change.
+    
+    Returns:
+        tuple: The chosen (low, high), or None for the full range (or when
+            the column holds a single value, which cannot be zoomed)
+    """
+    if not low < high:
+        if low == high:
+            st.caption(f"{label}: {low:,.2f} (every row has this value)")
+        return None
+    chosen = st.session_state.get(key)
+    if chosen is None or chosen[1] < low or chosen[0] > high:
+        clamped = (low, high)
+    else:
+        clamped = (max(chosen[0], low), min(chosen[1], high))
+    if clamped != chosen:
+        st.session_state[key] = clamped
+    window = st.slider(label, low, high, key=key)
+    # Only a narrowed window is passed on, so the full view stays a single cache entry
+    return None if window == (low, high) else window
 
 # Overview Page
-if page == "🏠 Overview":
+def render_overview():
+    """Render the Overview page"""
+    columns = PAGE_COLUMNS["overview"]
+    data_version = current_data_version()
+    
     st.header("📊 Dashboard Overview")
     
-    # Load data
-    df, apple_df = load_apple_data()
-    summaries = load_summary_data()
+    df, apple_df, filters = filtered_data(data_version, columns)
     
     if df is not None and apple_df is not None:
+        metrics = utils.calculate_key_metrics(df, apple_df)
+        
+        # Distinct customers from the pipeline's HyperLogLog sketch unless
+        # filtered or asked to be exact
+        sketches_version = sketch_version(filters)
+        if sketches_version:
+            customers = f"≈{load_sketches(sketches_version).customers.count():,}"
+        else:
+            customers = f"{apple_df['Customer_ID'].nunique():,}" if "Customer_ID" in apple_df.columns else "n/a"
+        
         # Key metrics
-        col1, col2, col3, col4 = st.columns(4)
+        col1, col2, col3, col4, col5 = st.columns(5)
         
         with col1:
             st.metric(
                 label="📱 Total Apple Products",
-                value=f"{len(apple_df):,}",
-                delta=f"{len(apple_df)/len(df)*100:.1f}% of total"
+                value=f"{metrics['total_apple_products']:,}",
+                delta=f"{metrics['apple_percentage']:.1f}% of total"
             )
         
         with col2:
-            avg_rating = apple_df["Rating"].mean() if "Rating" in apple_df.columns else 0
             st.metric(
                 label="⭐ Average Rating",
-                value=f"{avg_rating:.2f}",
+                value=f"{metrics['avg_rating']:.2f}",
                 delta="Apple Products"
             )
         
         with col3:
-            total_sales = apple_df["Purchase_Amount"].sum() if "Purchase_Amount" in apple_df.columns else 0
             st.metric(
                 label="💰 Total Sales",
-                value=f"${total_sales:,.0f}",
+                value=f"${metrics['total_sales']:,.0f}",
                 delta="Apple Revenue"
             )
         
         with col4:
-            avg_price = apple_df["Market_Price"].mean() if "Market_Price" in apple_df.columns else 0
             st.metric(
                 label="💵 Average Price",
-                value=f"${avg_price:.2f}",
+                value=f"${metrics['avg_price']:.2f}",
                 delta="Per Product"
             )
         
+        with col5:
+            st.metric(
+                label="👥 Apple Customers",
+                value=customers,
+                delta="Distinct buyers"
+            )
+        
         st.markdown("---")
         
         # Market share visualization
         st.subheader("📈 Market Share Analysis")
-        
-        if "Brand" in df.columns and "Purchase_Amount" in df.columns:
-            brand_share = df.groupby("Brand")["Purchase_Amount"].sum().sort_values(ascending=False)
-            brand_share_pct = brand_share / brand_share.sum() * 100
-            
-            # Create pie chart
-            fig = px.pie(
-                values=brand_share_pct.values,
-                names=brand_share_pct.index,
-                title="Market Share by Brand",
-                color_discrete_sequence=px.colors.qualitative.Set3
-            )
-            fig.update_traces(textposition='inside', textinfo='percent+label')
-            st.plotly_chart(fig, use_container_width=True)
+        show_chart("create_market_share_chart", data_version, columns, frame="df", filters=filters)
         
         # Apple ratings distribution
         if "Rating" in apple_df.columns:
             st.subheader("⭐ Apple Ratings Distribution")
-            fig = px.histogram(
-                apple_df.dropna(subset=['Rating']),
-                x='Rating',
-                nbins=10,
-                title="Apple Product Ratings Distribution",
-                color_discrete_sequence=['#1f77b4']
-            )
-            fig.update_layout(showlegend=False)
-            st.plotly_chart(fig, use_container_width=True)
+            show_chart("create_ratings_distribution", data_version, columns, filters=filters)
+    
+    render_alerts()
+
+@st.cache_resource(max_entries=2)
+def load_anomalies(version):
+    """Load the pipeline's anomaly alerts once per file version"""
+    import anomalies
+    
+    return anomalies.load()
+
+def render_alerts():
+    """Alerts panel: the latest anomalous months of every brand, category, city and product"""
+    import anomalies
+    
+    st.markdown("---")
+    st.subheader("🚨 Alerts")
+    alerts = load_anomalies(utils.dataset_version(anomalies.ANOMALIES_FILE))
+    if alerts is None:
+        st.info("No anomaly scan yet; run `python pipeline.py` or `python anomalies.py`.")
+        return
+    if alerts.empty:
+        st.success("No anomalous months found")
+        return
+    
+    # The last three months with data
+    months = sorted(alerts["month"].unique())[-3:]
+    recent = alerts[alerts["month"].isin(months)]
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Alerts (last 3 months)", f"{len(recent):,}")
+    col2.metric("📈 Spikes", f"{(recent['kind'] == 'spike').sum():,}")
+    col3.metric("📉 Drops", f"{(recent['kind'] == 'drop').sum():,}")
+    col4.metric("🍎 Apple alerts", f"{(recent['series'] == 'Apple').sum():,}")
+    
+    dimension = st.selectbox("Series", ["All"] + sorted(recent["dimension"].unique()), key="alert_dimension")
+    if dimension != "All":
+        recent = recent[recent["dimension"] == dimension]
+    st.dataframe(
+        recent.head(200),
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "month": st.column_config.DateColumn("Month", format="YYYY-MM"),
+            "value": st.column_config.NumberColumn("Value", format="%.2f"),
+            "expected": st.column_config.NumberColumn("Expected", format="%.2f"),
+            "z": st.column_config.NumberColumn("z", format="%+.1f"),
+        },
+    )
+    st.caption(f"Months at least {anomalies.THRESHOLD} robust z-scores from the median of the {anomalies.WINDOW} "
+               "months before them, over the whole dataset (sidebar filters do not apply)")
 
 # Feature Analysis Page
-elif page == "📈 Feature Analysis":
+def render_feature_analysis():
+    """Render the Feature Analysis page"""
+    columns = PAGE_COLUMNS["feature_analysis"]
+    data_version = current_data_version()
+    
     st.header("📈 Apple Market Feature Analysis")
     
-    df, apple_df = load_apple_data()
+    df, apple_df, filters = filtered_data(data_version, columns)
     
     if df is not None and apple_df is not None:
         # Geographic Analysis
         st.subheader("🌍 Geographic Market Insights")
-        
-        if "City" in apple_df.columns and "Purchase_Amount" in apple_df.columns:
-            top_cities = apple_df.groupby("City")["Purchase_Amount"].sum().sort_values(ascending=False).head(10)
+        sketches_version = sketch_version(filters)
+        if sketches_version:
+            import plotly.io as pio
             
-            fig = px.bar(
-                x=top_cities.values,
-                y=top_cities.index,
-                orientation='h',
-                title="Top 10 Cities by Apple Sales",
-                labels={'x': 'Total Sales Amount', 'y': 'City'},
-                color=top_cities.values,
-                color_continuous_scale='Blues'
-            )
-            fig.update_layout(height=500)
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(pio.from_json(build_sketch_chart_json(sketches_version)), use_container_width=True)
+        else:
+            show_chart("create_geographic_analysis", data_version, columns, filters=filters)
         
         # Price vs Sales Analysis
         st.subheader("💰 Price & Sales Relationship")
         
-        if "Market_Price" in apple_df.columns and "Purchase_Amount" in apple_df.columns:
-            fig = px.scatter(
-                apple_df,
-                x="Market_Price",
-                y="Purchase_Amount",
-                title="Apple Price vs Purchase Volume",
-                labels={'Market_Price': 'Market Price ($)', 'Purchase_Amount': 'Purchase Amount ($)'},
-                color='Market_Price',
-                color_continuous_scale='Viridis'
-            )
-            st.plotly_chart(fig, use_container_width=True)
+        x_range = y_range = None
+        if "Market_Price" in apple_df.columns and "Purchase_Amount" in apple_df.columns and len(apple_df) > 0:
+            with st.expander("🔍 Zoom into a price / purchase window"):
+                x_range = zoom_slider("Market Price ($)", "zoom_price", float(apple_df["Market_Price"].min()),
+                                      float(apple_df["Market_Price"].max()))
+                y_range = zoom_slider("Purchase Amount ($)", "zoom_amount", float(apple_df["Purchase_Amount"].min()),
+                                      float(apple_df["Purchase_Amount"].max()))
+        
+        show_chart("create_price_sales_scatter", data_version, columns, x_range=x_range, y_range=y_range, filters=filters)
         
         # Discount Analysis
         if "Discount_Applied" in df.columns:
             st.subheader("📉 Discount Impact Analysis")
-            
-            disc_sales = df.groupby(["Brand", "Discount_Applied"])["Purchase_Amount"].sum().unstack(fill_value=0)
-            if "Apple" in disc_sales.index:
-                apple_disc = disc_sales.loc["Apple"]
-                
-                fig = px.bar(
-                    x=apple_disc.index,
-                    y=apple_disc.values,
-                    title="Apple Sales: Discount vs No Discount",
-                    labels={'x': 'Discount Applied', 'y': 'Total Sales Amount ($)'},
-                    color=apple_disc.values,
-                    color_continuous_scale=['red', 'green']
-                )
-                st.plotly_chart(fig, use_container_width=True)
+            show_chart("create_discount_analysis", data_version, columns, frame="df", filters=filters)
         
         # Time-based Trends
         st.subheader("📅 Time-based Market Trends")
-        
-        if "Purchase_Date" in apple_df.columns and apple_df["Purchase_Date"].notna().any():
-            # Monthly trends
-            apple_monthly = apple_df.groupby(pd.Grouper(key="Purchase_Date", freq="M"))["Purchase_Amount"].sum()
-            
-            fig = px.line(
-                x=apple_monthly.index,
-                y=apple_monthly.values,
-                title="Monthly Apple Sales Trend",
-                labels={'x': 'Month', 'y': 'Sales Amount ($)'}
-            )
-            fig.update_traces(mode='lines+markers')
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # Weekday analysis
-            apple_df_copy = apple_df.copy()
-            apple_df_copy["Weekday"] = apple_df_copy["Purchase_Date"].dt.day_name()
-            weekday_sales = apple_df_copy.groupby("Weekday")["Purchase_Amount"].sum().reindex(
-                ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-            )
-            
-            fig = px.bar(
-                x=weekday_sales.index,
-                y=weekday_sales.values,
-                title="Apple Sales by Weekday",
-                labels={'x': 'Day of Week', 'y': 'Total Sales Amount ($)'},
-                color=weekday_sales.values,
-                color_continuous_scale='Blues'
-            )
-            st.plotly_chart(fig, use_container_width=True)
+        show_chart("create_monthly_trends", data_version, columns, filters=filters)
+        show_chart("create_weekday_analysis", data_version, columns, filters=filters)
 
 # Predictions Page
-elif page == "🔮 Predictions":
+def render_predictions():
+    """Render the Predictions page"""
     st.header("🔮 Apple Market Predictions")
     
     # Load forecast images and summaries
-    images = load_forecast_images()
-    summaries = load_summary_data()
+    images = utils.load_forecast_images()
+    summaries = utils.load_summary_data()
     
     # Create tabs for different prediction types
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Ratings Forecast", "💰 Sales Forecast", "📈 Price Elasticity", "🏆 Product Domination"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Ratings Forecast", "💰 Sales Forecast", "📈 Price Elasticity",
+                                            "🏆 Product Domination", "🎛️ What-If"])
     
     with tab1:
         st.subheader("📊 Apple Ratings Forecast")
         
         if images.get('ratings'):
-            st.image(images['ratings'], caption="Apple Ratings Forecast", use_column_width=True)
+            st.image(images['ratings'], caption="Apple Ratings Forecast", use_column_width=True, output_format="PNG")
         
         if summaries.get('ratings'):
             st.subheader("📋 Summary")
             st.text(summaries['ratings'])
     
     with tab2:
-        st.subheader("💰 Apple Sales Forecast")
-        
-        if images.get('sales'):
-            st.image(images['sales'], caption="Apple Sales Forecast", use_column_width=True)
-        
-        if summaries.get('sales'):
-            st.subheader("📋 Summary")
-            st.text(summaries['sales'])
+        render_sales_forecast()
     
     with tab3:
         st.subheader("📈 Price Elasticity Analysis")
         
         if images.get('price_elasticity'):
-            st.image(images['price_elasticity'], caption="Price Elasticity Forecast", use_column_width=True)
+            st.image(images['price_elasticity'], caption="Price Elasticity Forecast", use_column_width=True, output_format="PNG")
         
         if summaries.get('price_elasticity'):
             st.subheader("📋 Summary")
@@ -357,86 +570,326 @@ elif page == "🔮 Predictions":
         st.subheader("🏆 Product Domination Analysis")
         
         if images.get('product_domination'):
-            st.image(images['product_domination'], caption="Product Domination Forecast", use_column_width=True)
+            st.image(images['product_domination'], caption="Product Domination Forecast", use_column_width=True, output_format="PNG")
         
         if summaries.get('product_domination'):
             st.subheader("📋 Summary")
             st.text(summaries['product_domination'])
+    
+    with tab5:
+        render_what_if()
+
+def render_sales_forecast():
+    """Apple's total sales forecast, from the frame the price elasticity analysis stores"""
+    import charts
+    import forecast_store
+    
+    st.subheader("💰 Apple Sales Forecast")
+    frame = forecast_store.load_forecast("sales", "Apple", horizon=6)
+    if frame is None:
+        st.info("No sales forecast stored yet; run `python pipeline.py` or `python price_elasticity.py`.")
+        return
+    
+    st.plotly_chart(charts.create_forecast_chart(frame, "Apple Sales Forecast (Next 6 Months)", "Revenue ($)"),
+                    use_container_width=True)
+    st.caption("Forecasts for other brands, products and horizons are in the Forecast Explorer.")
+    with st.expander("📋 Forecast data"):
+        st.dataframe(frame, use_container_width=True)
+
+@st.cache_resource(max_entries=2)
+def load_scenarios(version):
+    """Load the stored demand-model components once per file version"""
+    import scenarios
+    
+    return scenarios.Scenarios.load()
+
+def render_what_if():
+    """Price / discount what-if simulator on the stored demand-model components"""
+    import charts
+    import scenarios
+    
+    st.subheader("🎛️ Price What-If Simulator")
+    model = load_scenarios(utils.dataset_version(scenarios.COMPONENTS_FILE))
+    if model is None:
+        st.info("The demand models have not been fitted yet; run `python pipeline.py` or `python scenarios.py`.")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        series = st.selectbox("Series", model.series, key="whatif_series")
+    with col2:
+        price = st.slider("Average price change (%)", -30, 30, 0, key="whatif_price")
+    with col3:
+        discount = st.slider("Discounted purchases (± points)", -50, 50, 0, key="whatif_discount")
+    with col4:
+        competitor = st.slider("Competitor price change (%)", -30, 30, 0, key="whatif_competitor")
+    
+    with instrumentation.span("simulate", series=series):
+        changes = {"price": price, "discount": discount, "competitor": competitor}
+        frame = model.frame(series, **changes)
+        totals = model.summary(**changes).set_index("series").loc[series]
+    
+    months = int(frame["y"].isna().sum())
+    col1, col2, col3 = st.columns(3)
+    col1.metric(f"Baseline revenue (next {months} months)", f"${totals['baseline']:,.0f}")
+    col2.metric("Scenario revenue", f"${totals['scenario']:,.0f}",
+                None if totals["baseline"] <= 0 else f"{totals['change']:+.1f}%")
+    difference = totals["scenario"] - totals["baseline"]
+    col3.metric("Revenue change", f"{'-' if difference < 0 else '+'}${abs(difference):,.0f}")
+    
+    st.plotly_chart(charts.create_scenario_chart(frame, f"{series}: Revenue Under the Scenario"), use_container_width=True)
+    
+    with st.expander("🧮 Model components"):
+        coefficients = frame.iloc[0][[f"coef_{r}" for r in scenarios.REGRESSORS]]
+        st.caption("Revenue change per unit of each regressor (Discount_Applied: per 100 points of discounted share)")
+        st.dataframe(coefficients.rename(lambda c: c.removeprefix("coef_")).to_frame("coefficient"))
+        st.dataframe(frame[["ds", "y", "trend", "seasonality", "yhat", "scenario"]], use_container_width=True)
+
+# Forecast Explorer Page
+def render_forecast_explorer():
+    """Render the Forecast Explorer page"""
+    import forecast_store
+    import forecasting
+    
+    columns = PAGE_COLUMNS["forecast_explorer"]
+    data_version = current_data_version()
+    
+    st.header("🧭 Forecast Explorer")
+    st.markdown("Stored forecasts render instantly; series that have not been forecast yet run in the background.")
+    
+    df, _ = load_apple_data(data_version, columns)
+    if df is None:
+        return
+    
+    brands = sorted(df["Brand"].dropna().unique())
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        brand = st.selectbox("Brand", brands, index=brands.index("Apple") if "Apple" in brands else 0)
+    
+    with col2:
+        products = sorted(df.loc[df["Brand"] == brand, "Product_Name"].dropna().unique())
+        product = st.selectbox("Product", ["All products"] + products)
+        product = None if product == "All products" else product
+    
+    with col3:
+        metric = st.selectbox("Metric", list(forecasting.METRICS), format_func=lambda m: forecasting.METRICS[m][2])
+    
+    with col4:
+        horizon = st.select_slider("Horizon (months)", [3, 6, 12], value=6)
+    
+    version = forecast_store.data_version()
+    frame = forecast_store.load_forecast(metric, brand, product, horizon, version=version)
+    if frame is not None:
+        import charts
+        
+        label = forecasting.METRICS[metric][2]
+        title = f"{brand} {product or 'All Products'}: {label} Forecast (Next {horizon} Months)"
+        st.plotly_chart(charts.create_forecast_chart(frame, title, label), use_container_width=True)
+        
+        with st.expander("📋 Forecast data"):
+            st.dataframe(frame, use_container_width=True)
+        return
+    
+    queue = get_forecast_queue()
+    job = queue.status(metric, brand, product, horizon)
+    
+    if job and job["state"] in ("queued", "running"):
+        show_forecast_progress(metric, brand, product, horizon)
+        return
+    
+    if job and job["state"] == "failed":
+        st.error(f"❌ Forecast failed: {job['error']}")
+    elif forecast_store.stored_version(metric, brand, product, horizon) is not None:
+        # Stored from an older version of the data: refit without waiting for the button
+        history = forecasting.monthly_series(df, metric, brand, product)
+        queue.submit(history, metric, brand, product, horizon, version=version)
+        st.info("The stored forecast predates the current data and is being refitted.")
+        show_forecast_progress(metric, brand, product, horizon)
+        return
+    else:
+        st.info("This series has not been forecast yet.")
+    
+    if st.button("🔮 Forecast this series"):
+        history = forecasting.monthly_series(df, metric, brand, product)
+        queue.submit(history, metric, brand, product, horizon, version=version)
+        st.rerun()
 
 # Market Insights Page
-elif page == "📊 Market Insights":
+def render_market_insights():
+    """Render the Market Insights page"""
+    columns = PAGE_COLUMNS["market_insights"]
+    data_version = current_data_version()
+    
     st.header("📊 Advanced Market Insights")
     
-    df, apple_df = load_apple_data()
+    df, apple_df, filters = filtered_data(data_version, columns)
     
     if df is not None and apple_df is not None:
         # Seasonal Analysis
         st.subheader("🎯 Seasonal Sales Analysis")
-        
-        if "Purchase_Date" in apple_df.columns and apple_df["Purchase_Date"].notna().any():
-            apple_df_copy = apple_df.copy()
-            apple_df_copy["Month"] = apple_df_copy["Purchase_Date"].dt.month
-            apple_df_copy["Day"] = apple_df_copy["Purchase_Date"].dt.day
-            
-            def label_season(row):
-                m, d = row["Month"], row["Day"]
-                if m == 1 and d <= 7:
-                    return "New Year"
-                elif m == 12 and d >= 20:
-                    return "Christmas"
-                elif m in [8, 9] and (m == 8 or (m == 9 and d <= 15)):
-                    return "Back-to-School"
-                else:
-                    return "Other"
-            
-            apple_df_copy["Season"] = apple_df_copy.apply(label_season, axis=1)
-            seasonal_sales = apple_df_copy.groupby("Season")["Purchase_Amount"].sum().sort_values(ascending=False)
-            
-            fig = px.bar(
-                x=seasonal_sales.index,
-                y=seasonal_sales.values,
-                title="Apple Seasonal Sales Spikes",
-                labels={'x': 'Season', 'y': 'Total Sales Amount ($)'},
-                color=seasonal_sales.values,
-                color_continuous_scale='Set2'
-            )
-            st.plotly_chart(fig, use_container_width=True)
+        show_chart("create_seasonal_analysis", data_version, columns, filters=filters)
         
         # Product Category Analysis
         st.subheader("📱 Product Category Performance")
+        show_chart("create_category_analysis", data_version, columns, filters=filters)
         
-        if "Product_Category" in apple_df.columns:
-            category_sales = apple_df.groupby("Product_Category")["Purchase_Amount"].sum().sort_values(ascending=False)
-            
-            fig = px.pie(
-                values=category_sales.values,
-                names=category_sales.index,
-                title="Apple Sales by Product Category",
-                color_discrete_sequence=px.colors.qualitative.Set3
-            )
-            st.plotly_chart(fig, use_container_width=True)
-        
-        # Customer Demographics (if available)
+        # Customer Demographics, from the Age_Group x Gender x Brand x Category cube
         st.subheader("👥 Customer Demographics")
-        
-        if "Age_Group" in apple_df.columns:
-            age_sales = apple_df.groupby("Age_Group")["Purchase_Amount"].sum().sort_values(ascending=False)
-            
-            fig = px.bar(
-                x=age_sales.index,
-                y=age_sales.values,
-                title="Apple Sales by Age Group",
-                labels={'x': 'Age Group', 'y': 'Total Sales Amount ($)'},
-                color=age_sales.values,
-                color_continuous_scale='Blues'
-            )
-            st.plotly_chart(fig, use_container_width=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            show_chart("create_age_group_analysis", data_version, columns, frame="demographics", filters=filters)
+        with col2:
+            show_chart("create_age_group_share_chart", data_version, columns, frame="demographics", filters=filters)
+    
+    render_promotion_lift()
+    render_feedback_search()
+    render_feedback_themes()
+
+@st.cache_resource(max_entries=2)
+def load_promotion_lift(version):
+    """Load the pipeline's promotion lifts once per file version"""
+    import promotions
+    
+    return promotions.load()
+
+def render_promotion_lift():
+    """Competitor promotion lift per brand, Apple category or month, with bootstrap intervals"""
+    import charts
+    import promotions
+    
+    st.subheader("🏷️ Competitor Promotions")
+    lifts = load_promotion_lift(utils.dataset_version(promotions.LIFT_FILE))
+    if lifts is None:
+        st.info("Promotion lifts have not been estimated yet; run `python pipeline.py` or `python promotions.py`.")
+        return
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        metric = st.selectbox("Metric", list(promotions.METRICS), format_func=promotions.METRICS.get,
+                              key="promotion_metric")
+    with col2:
+        view = st.radio("Compare", ["Brands", "Apple categories", "Months"], horizontal=True, key="promotion_view")
+    
+    rows = lifts[lifts["metric"] == metric]
+    total = rows[rows["level"] == "Total"].iloc[0]
+    st.metric(f"Overall lift when a competitor promotes ({promotions.CONFIDENCE:.0%} CI)",
+              f"{total['lift']:+,.3f} ({total['lift_pct']:+.1f}%)",
+              f"[{total['lift_lower']:+,.3f}, {total['lift_upper']:+,.3f}]", delta_color="off")
+    
+    if view == "Brands":
+        # The brands with the most comparisons, Apple always included
+        brands = rows[rows["level"] == "Brand"]
+        top = brands["cells"].rank(method="first", ascending=False) <= 15
+        shown = brands[top | (brands["Brand"] == "Apple")].sort_values("cells", ascending=False)
+        shown = shown.assign(group=shown["Brand"])
+    elif view == "Apple categories":
+        shown = rows[(rows["level"] == "Category") & (rows["Brand"] == "Apple")]
+        shown = shown.assign(group="Apple " + shown["Category"])
+    else:
+        shown = rows[rows["level"] == "Month"]
+        shown = shown.assign(group=shown["Month"])
+    shown = shown[shown["lift_lower"].notna()]
+    
+    label = promotions.METRICS[metric]
+    st.plotly_chart(charts.create_promotion_lift_chart(shown, label, f"{label}: Lift Under Competitor Promotions ({view})"),
+                    use_container_width=True)
+    st.caption("Transactions during a competitor promotion against the rest, compared within Brand × Category × "
+               "month cells over the whole dataset (sidebar filters do not apply). Bars whose interval crosses "
+               "zero show no clear effect; groups with under "
+               f"{promotions.MIN_TRANSACTIONS} transactions on either side are left out.")
+
+@st.cache_resource(max_entries=2)
+def load_feedback_index(version):
+    """Load the pipeline's feedback index once per file version, shared by all sessions"""
+    import feedback_search
+    import pipeline
+    
+    return feedback_search.FeedbackIndex(pipeline.FEEDBACK_DIR)
+
+def render_feedback_search():
+    """Feedback search box: matching Feedback / Competitor_Feedback per brand, model or product"""
+    import charts
+    import feedback_search
+    import pipeline
+    
+    st.subheader("💬 Feedback Search")
+    version = utils.dataset_version(pipeline.FEEDBACK_INDEX_FILE)
+    if version == "missing":
+        st.info("The feedback index has not been built yet; run `python pipeline.py`.")
+        return
+    index = load_feedback_index(version)
+    
+    col1, col2, col3 = st.columns([3, 2, 1])
+    with col1:
+        query = st.text_input("Search feedback", placeholder='e.g. battery or "damaged item"', key="feedback_query")
+    with col2:
+        fields = st.multiselect("Fields", list(feedback_search.FIELDS), default=list(feedback_search.FIELDS),
+                                key="feedback_fields")
+    with col3:
+        by = st.selectbox("Count by", list(feedback_search.ATTRIBUTES), index=1, key="feedback_by")
+    
+    if not query.strip() or not fields:
+        st.caption("Most frequent terms")
+        st.dataframe(index.term_counts(tuple(fields) or feedback_search.FIELDS).head(15), use_container_width=True,
+                     hide_index=True)
+        return
+    
+    with instrumentation.span("search", query=query):
+        counts = index.counts(query, by, tuple(fields))
+    total = int(counts["total"].sum())
+    st.metric("Matching transactions", f"{total:,}", f"{total / max(len(index), 1):.1%} of {len(index):,}",
+              delta_color="off")
+    if not total:
+        return
+    fig = charts.create_feedback_chart(counts.head(20), by, f"Feedback Matching {query} by {by.replace('_', ' ')}")
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(index.matches(query, tuple(fields), limit=100), use_container_width=True, hide_index=True)
+    st.caption("Terms must all appear; quote words to match them as a phrase. Searches the whole dataset "
+               "(sidebar filters do not apply).")
+
+@st.cache_resource(max_entries=2)
+def load_feedback_themes(version):
+    """Load the pipeline's feedback embeddings once per file version, shared by all sessions"""
+    import feedback_themes
+    import pipeline
+    
+    return feedback_themes.ThemeCache(pipeline.THEMES_DIR)
+
+def render_feedback_themes():
+    """Feedback themes and a similar-complaints lookup from the cached embeddings"""
+    import feedback_themes
+    import pipeline
+    
+    st.subheader("🧩 Feedback Themes")
+    version = utils.dataset_version(pipeline.THEMES_FILE)
+    if version == "missing":
+        st.info("Feedback has not been embedded yet; run `python pipeline.py` or `python feedback_themes.py`.")
+        return
+    cache = load_feedback_themes(version)
+    
+    themes = cache.themes()
+    col1, col2 = st.columns(2)
+    col1.metric("Themes", f"{len(themes):,}")
+    col2.metric("Distinct texts", f"{len(cache):,}")
+    st.dataframe(themes.drop(columns="theme").head(30), use_container_width=True, hide_index=True)
+    
+    texts = cache.texts.assign(rows=cache.texts[list(feedback_themes.FIELDS)].sum(axis=1))
+    options = texts.sort_values("rows", ascending=False)["text"].tolist()
+    text = st.selectbox("Similar complaints to", options, key="similar_feedback")
+    if text:
+        st.dataframe(cache.similar(text).drop(columns="theme"), use_container_width=True, hide_index=True,
+                     column_config={"similarity": st.column_config.NumberColumn(format="%.3f")})
+    embedder = "hashed character n-grams" if cache.embedder == feedback_themes.HASHING else cache.embedder
+    st.caption(f"Each distinct text is embedded once ({embedder}); themes group texts within cosine distance "
+               f"{feedback_themes.THEME_DISTANCE} of each other.")
 
 # Reports Page
-elif page == "📋 Reports":
+def render_reports():
+    """Render the Reports page"""
     st.header("📋 Analysis Reports")
     
-    summaries = load_summary_data()
+    summaries = utils.load_summary_data()
     
     # Create expandable sections for each report
     with st.expander("📊 Apple Ratings Analysis Report", expanded=True):
@@ -445,12 +898,6 @@ elif page == "📋 Reports":
         else:
             st.warning("Ratings summary not available")
     
-    with st.expander("💰 Apple Sales Analysis Report", expanded=True):
-        if summaries.get('sales'):
-            st.text(summaries['sales'])
-        else:
-            st.warning("Sales summary not available")
-    
     with st.expander("📈 Price Elasticity Analysis Report", expanded=True):
         if summaries.get('price_elasticity'):
             st.text(summaries['price_elasticity'])
@@ -467,17 +914,76 @@ elif page == "📋 Reports":
     st.subheader("📥 Download Reports")
     
     if st.button("📊 Generate Combined Report"):
-        combined_report = ""
-        for key, summary in summaries.items():
-            combined_report += f"\n{'='*50}\n{key.upper()} ANALYSIS\n{'='*50}\n\n{summary}\n\n"
-        
         st.download_button(
             label="📥 Download Combined Report",
-            data=combined_report,
+            data=utils.create_combined_report(summaries),
             file_name="apple_market_analysis_report.txt",
             mime="text/plain"
         )
 
+# Diagnostics Page
+def render_diagnostics():
+    """Render the hidden Diagnostics page"""
+    import pandas as pd
+    
+    st.header("🩺 Diagnostics")
+    
+    timings = st.session_state.get("render_timings", [])
+    if not timings:
+        st.info("No page renders recorded in this session yet")
+    else:
+        renders = pd.DataFrame([
+            {
+                "time": t["at"],
+                "page": t["page"],
+                "render_ms": t["spans"][0]["duration_ms"],
+                "peak_rss_mb": t["spans"][0]["peak_rss_mb"],
+                "peak_growth_mb": t["spans"][0]["peak_growth_mb"],
+                "inner_spans": ", ".join(f"{s.get('builder', s['span'])} {s['duration_ms']:.0f} ms" for s in t["spans"][1:]),
+            }
+            for t in timings
+        ])
+        
+        st.subheader("⏱️ Render Times by Page")
+        st.dataframe(
+            renders.groupby("page")["render_ms"]
+            .agg(renders="count", median_ms="median", max_ms="max", last_ms="last")
+            .round(1),
+            use_container_width=True
+        )
+        
+        st.subheader("🧾 Renders This Session")
+        st.dataframe(renders.iloc[::-1], use_container_width=True, hide_index=True)
+    
+    st.subheader("🔄 Recent Offline Runs")
+    runs = [r for r in instrumentation.read_records() if "span" not in r][-20:]
+    if runs:
+        st.dataframe(pd.DataFrame(runs[::-1]), use_container_width=True, hide_index=True)
+    else:
+        st.info(f"No runs logged yet in {instrumentation.LOG_FILE}")
+
+def render_timed(page):
+    """Render a page, recording its spans in this session's render timings"""
+    with instrumentation.collect() as spans:
+        with instrumentation.span("render", page=page):
+            PAGES[page]()
+    
+    timings = st.session_state.setdefault("render_timings", [])
+    timings.append({"page": page, "at": time.strftime("%H:%M:%S"), "spans": spans})
+    del timings[:-MAX_RENDER_TIMINGS]
+
+PAGES = {
+    "🏠 Overview": render_overview,
+    "📈 Feature Analysis": render_feature_analysis,
+    "🔮 Predictions": render_predictions,
+    "🧭 Forecast Explorer": render_forecast_explorer,
+    "📊 Market Insights": render_market_insights,
+    "📋 Reports": render_reports,
+    DIAGNOSTICS_PAGE: render_diagnostics,
+}
+
+render_timed(page)
+
 # Footer
 st.markdown("---")
 st.markdown(
@@ -1,82 +1,94 @@
 import os
 import pandas as pd
 import matplotlib.pyplot as plt
-from prophet import Prophet
-
-print("⏳ Loading dataset...")
-df = pd.read_csv("Walmart_customer_fixed.csv", low_memory=False)
-df['Purchase_Date'] = pd.to_datetime(df['Purchase_Date'], errors='coerce')
-
-print("⏳ Filtering Apple-related sales...")
-mask_brand = df['Brand'].fillna('').str.contains('apple', case=False, na=False)
-mask_product = df['Product_Name'].fillna('').str.contains('apple', case=False, na=False)
-apple_sales = df[mask_brand | mask_product].copy()
-
-# --- Ensure Ratings column exists ---
-if 'Rating' not in apple_sales.columns:
-    raise ValueError("❌ The dataset does not contain a 'Rating' column.")
-
-print("⏳ Aggregating monthly average ratings...")
-monthly_rating = (
-    apple_sales
-    .set_index('Purchase_Date')
-    .resample('ME')['Rating']
-    .mean()
-    .reset_index()
-)
-
-# --- Prepare data for Prophet ---
-rating_df = monthly_rating.rename(columns={'Purchase_Date': 'ds', 'Rating': 'y'})
-
-print("⏳ Training Prophet model...")
-model = Prophet()
-model.fit(rating_df)
-
-print("⏳ Forecasting next 6 months...")
-future = model.make_future_dataframe(periods=6, freq='ME')
-forecast = model.predict(future)
-
-# --- Ensure output folder ---
-output_dir = "apple_ratings"
-os.makedirs(output_dir, exist_ok=True)
-
-summary_file = os.path.join(output_dir, "apple_ratings_summary.txt")
-plot_file = os.path.join(output_dir, "apple_ratings_forecast.png")
-
-print("⏳ Generating plot...")
-plt.figure(figsize=(10, 5))
-
-# Actual ratings
-plt.plot(rating_df['ds'], rating_df['y'], marker='o', color="purple", label="Actual Avg Rating")
-
-# Forecast ratings
-last_actual_date = rating_df['ds'].max()
-forecast_part = forecast[forecast['ds'] >= last_actual_date]
-plt.plot(forecast_part['ds'], forecast_part['yhat'], linestyle="--", color="orange", label="Forecast Avg Rating")
-
-# Divider line & shading
-plt.axvline(x=last_actual_date, color="black", linestyle="--", linewidth=1.2)
-plt.axvspan(last_actual_date, forecast['ds'].max(), color="gray", alpha=0.15)
-
-# Formatting
-plt.title("Apple Average Rating Forecast (Next 6 Months)")
-plt.xlabel("Month")
-plt.ylabel("Average Rating")
-plt.ylim(0, 5)
-plt.grid(True, linestyle="--", alpha=0.6)
-plt.legend()
-plt.tight_layout()
-
-# Save plot
-plt.savefig(plot_file, dpi=300, bbox_inches="tight")
-plt.close()
-print(f"📈 Plot saved to: {plot_file}")
-
-print("⏳ Writing summary file...")
-last_text = "\n".join(f"{row.ds:%Y-%m}: {row.y:.2f}" for _, row in rating_df.tail(12).iterrows())
-future_text = "\n".join(f"{row.ds:%Y-%m}: {row.yhat:.2f}" for _, row in forecast_part.tail(6).iterrows())
-
-summary_text = f"""
+import instrumentation
+from instrumentation import span
+from forecast_artifacts import save_forecast_figure
+from forecast_store import save_forecast
+from forecasting import fit_model, forecast_frame, load_apple_sales, predict
+
+OUTPUT_DIR = "apple_ratings"
+SUMMARY_FILE = os.path.join(OUTPUT_DIR, "apple_ratings_summary.txt")
+PLOT_FILE = os.path.join(OUTPUT_DIR, "apple_ratings_forecast.png")
+HORIZON = 6
+
+def aggregate(apple_sales):
+    """Aggregate Apple sales into a monthly average rating series (ds, y)"""
+    # --- Ensure Ratings column exists ---
+    if 'Rating' not in apple_sales.columns:
+        raise ValueError("❌ The dataset does not contain a 'Rating' column.")
+
+    with span("aggregate"):
+        monthly_rating = (
+            apple_sales
+            .set_index('Purchase_Date')
+            .resample('ME')['Rating']
+            .mean()
+            .reset_index()
+        )
+
+    # --- Prepare data for Prophet ---
+    return monthly_rating.rename(columns={'Purchase_Date': 'ds', 'Rating': 'y'})
+
+def forecast(rating_df):
+    """Forecast the next HORIZON months of ratings and persist the forecast frame"""
+    model = fit_model(rating_df)
+    forecast, = predict([model], HORIZON)
+    frame = forecast_frame(forecast, rating_df)
+
+    # --- Persist forecast frame for the dashboard's Forecast Explorer ---
+    save_forecast(frame, metric="rating", brand="Apple", horizon=HORIZON)
+    return frame
+
+def plot(rating_df, forecast, plot_file=PLOT_FILE):
+    """Plot actual and forecast ratings"""
+    os.makedirs(os.path.dirname(plot_file), exist_ok=True)
+    with span("plot"):
+        plt.figure(figsize=(10, 5))
+
+        # Actual ratings
+        plt.plot(rating_df['ds'], rating_df['y'], marker='o', color="purple", label="Actual Avg Rating")
+
+        # Forecast ratings
+        last_actual_date = rating_df['ds'].max()
+        forecast_part = forecast[forecast['ds'] >= last_actual_date]
+        plt.plot(forecast_part['ds'], forecast_part['yhat'], linestyle="--", color="orange", label="Forecast Avg Rating")
+        if forecast_part['yhat_lower'].notna().any():
+            plt.fill_between(forecast_part['ds'], forecast_part['yhat_lower'], forecast_part['yhat_upper'],
+                             color="orange", alpha=0.2, label="80% Interval")
+
+        # Divider line & shading
+        plt.axvline(x=last_actual_date, color="black", linestyle="--", linewidth=1.2)
+        plt.axvspan(last_actual_date, forecast['ds'].max(), color="gray", alpha=0.15)
+
+        # Formatting
+        plt.title(f"Apple Average Rating Forecast (Next {HORIZON} Months)")
+        plt.xlabel("Month")
+        plt.ylabel("Average Rating")
+        plt.ylim(0, 5)
+        plt.grid(True, linestyle="--", alpha=0.6)
+        plt.legend()
+        plt.tight_layout()
+
+    # Save plot plus its display-sized variant
+    save_forecast_figure(plt.gcf(), plot_file, dpi=300, bbox_inches="tight")
+    plt.close()
+
+def _interval(row):
+    """Interval suffix of a forecast row's summary line, empty without intervals"""
+    if pd.isna(row.yhat_lower):
+        return ""
+    return f" (80% interval {row.yhat_lower:.2f}-{row.yhat_upper:.2f})"
+
+def summarize(rating_df, forecast, summary_file=SUMMARY_FILE):
+    """Write the ratings forecast summary text file"""
+    os.makedirs(os.path.dirname(summary_file), exist_ok=True)
+    forecast_part = forecast[forecast['ds'] >= rating_df['ds'].max()]
+
+    last_text = "\n".join(f"{row.ds:%Y-%m}: {row.y:.2f}" for _, row in rating_df.tail(12).iterrows())
+    future_text = "\n".join(f"{row.ds:%Y-%m}: {row.yhat:.2f}{_interval(row)}" for _, row in forecast_part.tail(HORIZON).iterrows())
+
+    summary_text = f"""
 📊 Apple Ratings Forecast Summary
 
 Total months analyzed: {len(rating_df)}
@@ -85,12 +97,34 @@ Average rating overall: {rating_df['y'].mean():.2f}
 Last 12 months of ratings:
 {last_text}
 
-Next 6 months (forecasted ratings):
+Next {HORIZON} months (forecasted ratings):
 {future_text}
 """
 
-with open(summary_file, "w", encoding="utf-8") as f:
-    f.write(summary_text)
+    with span("save", artifact=summary_file):
+        with open(summary_file, "w", encoding="utf-8") as f:
+            f.write(summary_text)
 
-print(f"📊 Summary saved to: {summary_file}")
-print("✅ Processing finished!")
+def main():
+    with instrumentation.run("apple_ratings"):
+        print("⏳ Loading dataset and filtering Apple-related sales...")
+        apple_sales = load_apple_sales("Walmart_customer_fixed.csv")
+
+        print("⏳ Aggregating monthly average ratings...")
+        rating_df = aggregate(apple_sales)
+
+        print(f"⏳ Training Prophet model and forecasting next {HORIZON} months...")
+        forecast_df = forecast(rating_df)
+
+        print("⏳ Generating plot...")
+        plot(rating_df, forecast_df)
+        print(f"📈 Plot saved to: {PLOT_FILE}")
+
+        print("⏳ Writing summary file...")
+        summarize(rating_df, forecast_df)
+
+        print(f"📊 Summary saved to: {SUMMARY_FILE}")
+        print("✅ Processing finished!")
+
+if __name__ == "__main__":
+    main()
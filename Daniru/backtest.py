@@ -0,0 +1,247 @@
+"""
+Rolling-origin backtests of the forecast models
+
+Every series the forecast scripts forecast (Apple's monthly sales, average
+rating and average price, and the top products' sales) is cut at a series
+of origins: train on the months up to the origin, forecast the next
+HORIZON months, compare with what actually happened, move the origin on by
+STEP months. Every forecaster configuration in CONFIGS runs on every fold,
+and the folds fan out across a process pool.
+
+Each fold's forecast is cached under a hash of its configuration and
+training window, so a rerun (or a run after a new month of data, which
+only adds folds) fits only what it has not fitted before. Scores per series
+and configuration are stored in a parquet file:
+
+- MAPE and sMAPE (%), over months with non-zero actuals for MAPE
+- coverage: share of actuals inside the forecast's 80% interval (Prophet's
+  default interval width), which should be close to 0.8; prophet and
+  prophet_analytic differ only in how the interval is drawn (see
+  forecasting.py)
+- fit_seconds: mean time to fit and predict one fold
+
+    python backtest.py                      # every series and configuration
+    python backtest.py --config prophet loglinear --workers 4
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+
+HORIZON = 6
+# Months of history before the first origin, and months between origins
+MIN_TRAIN = 18
+STEP = 3
+# Two-sided 80% normal quantile, for the baselines' intervals
+Z80 = 1.2816
+
+FOLDS_FILE = os.path.join(".pipeline", "backtest_folds.parquet")
+SCORES_FILE = os.path.join(".pipeline", "backtest_scores.parquet")
+
+def _future_dates(history, horizon):
+    return pd.date_range(history["ds"].max(), periods=horizon + 1, freq="ME")[1:]
+
+def _filled(history):
+    """Series values with empty months carried over from their neighbours"""
+    return history["y"].ffill().bfill().to_numpy(dtype=float)
+
+def _prophet(history, horizon, intervals="sampled", **options):
+    """Prophet with an interval mode from forecasting.INTERVAL_MODES"""
+    import forecasting
+
+    model = forecasting.fit_model(history, **options)
+    forecast, = forecasting.predict([model], horizon, intervals)
+    return forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]].tail(horizon)
+
+def _loglinear(history, horizon):
+    """Trend plus yearly seasonality of log values (see hierarchy.py)"""
+    import hierarchy
+
+    y = _filled(history)
+    forecast, fitted = hierarchy.loglinear_forecasts(y[None, :], horizon)
+    spread = Z80 * np.std(y - fitted[0])
+    return pd.DataFrame({"ds": _future_dates(history, horizon), "yhat": forecast[0],
+                         "yhat_lower": forecast[0] - spread, "yhat_upper": forecast[0] + spread})
+
+def _seasonal_naive(history, horizon):
+    """Same month last year (last month's value for under a year of data)"""
+    y = _filled(history)
+    season = 12 if len(y) > 12 else 1
+    yhat = y[len(y) - season + np.arange(horizon) % season]
+    spread = Z80 * np.std(y[season:] - y[:-season])
+    return pd.DataFrame({"ds": _future_dates(history, horizon), "yhat": yhat,
+                         "yhat_lower": yhat - spread, "yhat_upper": yhat + spread})
+
+# configuration name -> (forecaster, options); a forecaster takes a ds/y
+# history and a horizon and returns ds, yhat, yhat_lower, yhat_upper
+CONFIGS = {
+    "prophet": (_prophet, {}),
+    "prophet_analytic": (_prophet, {"intervals": "analytic"}),
+    "prophet_no_yearly": (_prophet, {"yearly_seasonality": False}),
+    "loglinear": (_loglinear, {}),
+    "seasonal_naive": (_seasonal_naive, {}),
+}
+
+def analysis_series(apple_sales):
+    """
+    The series the forecast scripts forecast
+
+    Args:
+        apple_sales (pd.DataFrame): Output of forecasting.load_apple_sales()
+
+    Returns:
+        dict: Series name -> monthly ds/y frame
+    """
+    import forecasting
+    import product_domination
+
+    series = {metric: forecasting.monthly_series(apple_sales, metric) for metric in ("sales", "rating", "price")}
+    for product in product_domination.top_products(product_domination.aggregate(apple_sales)):
+        series[f"sales/{product}"] = forecasting.monthly_series(apple_sales, "sales", product=product)
+    return series
+
+def origins(history, horizon=HORIZON, min_train=MIN_TRAIN, step=STEP):
+    """Training lengths (months) of the folds of a series, latest last"""
+    return list(range(min_train, len(history) - horizon + 1, step))
+
+def fold_key(name, config, history, horizon):
+    """
+    Hash of a fold's series, configuration and training window, for the cache
+
+    Series with the same history (such as two products that never sold)
+    still get their own folds, so each is cached and scored once.
+    """
+    forecaster, options = CONFIGS[config]
+    h = hashlib.sha256(f"{name}\0{config}\0{sorted(options.items())}\0{horizon}".encode())
+    h.update(history["ds"].to_numpy(dtype="datetime64[ns]").tobytes())
+    h.update(history["y"].to_numpy(dtype=float).tobytes())
+    return h.hexdigest()[:24]
+
+def _init_worker():
+    """Quiet CmdStan and import Prophet up front, so fold timings are fits only"""
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    import prophet  # noqa: F401
+
+def _run_fold(config, history, horizon):
+    """Fit one configuration on one training window, in a worker process"""
+    forecaster, options = CONFIGS[config]
+    start = time.perf_counter()
+    frame = forecaster(history, horizon, **options)
+    return frame, time.perf_counter() - start
+
+def run(series, configs=None, horizon=HORIZON, min_train=MIN_TRAIN, step=STEP, workers=None,
+        folds_file=FOLDS_FILE):
+    """
+    Backtest configurations on series, reusing cached folds
+
+    Args:
+        series (dict): Series name -> monthly ds/y frame
+        configs (list): Names from CONFIGS, defaults to all of them
+        horizon (int): Months forecast from each origin
+        min_train (int): Months of history before the first origin
+        step (int): Months between origins
+        workers (int): Worker processes, defaults to the CPU count
+        folds_file (str): Fold cache (parquet); None disables caching
+
+    Returns:
+        pd.DataFrame: One row per series, configuration, origin and
+            forecast month: key, series, config, origin, ds, y, yhat,
+            yhat_lower, yhat_upper, fit_seconds
+    """
+    configs = list(configs or CONFIGS)
+    cached = pd.read_parquet(folds_file) if folds_file and os.path.exists(folds_file) else None
+    done = set(cached["key"]) if cached is not None else set()
+
+    tasks, keys = [], []
+    for name, history in series.items():
+        for months in origins(history, horizon, min_train, step):
+            train, test = history.iloc[:months], history.iloc[months:months + horizon]
+            for config in configs:
+                key = fold_key(name, config, train, horizon)
+                keys.append(key)
+                if key not in done:
+                    tasks.append((key, name, config, train, test))
+
+    with span("backtest", folds=len(keys), fitted=len(tasks)):
+        frames = []
+        if tasks:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = [pool.submit(_run_fold, config, train, horizon) for _, _, config, train, _ in tasks]
+                for (key, name, config, train, test), future in zip(tasks, futures):
+                    frame, seconds = future.result()
+                    frames.append(frame.assign(key=key, series=name, config=config, origin=train["ds"].max(),
+                                               y=test["y"].to_numpy(), fit_seconds=seconds))
+
+    folds = pd.concat(([cached] if cached is not None else []) + frames, ignore_index=True)
+    if folds_file and frames:
+        os.makedirs(os.path.dirname(folds_file) or ".", exist_ok=True)
+        tmp_path = f"{folds_file}.{os.getpid()}.tmp"
+        folds.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, folds_file)
+    return folds[folds["key"].isin(keys)].reset_index(drop=True)
+
+def score(folds):
+    """
+    Score backtest folds per series and configuration
+
+    Returns:
+        pd.DataFrame: series, config, folds, mape, smape, coverage and
+            fit_seconds, best sMAPE first within each series
+    """
+    y, yhat = folds["y"], folds["yhat"]
+    scored = folds.assign(
+        ape=(y - yhat).abs() / y.abs().where(y != 0),
+        sape=2 * (y - yhat).abs() / (y.abs() + yhat.abs()).where((y.abs() + yhat.abs()) > 0),
+        covered=((y >= folds["yhat_lower"]) & (y <= folds["yhat_upper"])).where(y.notna()),
+    )
+    # fit_seconds is repeated on every month of a fold
+    per_fold = scored.drop_duplicates("key")
+    scores = scored.groupby(["series", "config"]).agg(
+        mape=("ape", "mean"), smape=("sape", "mean"), coverage=("covered", "mean"),
+    )
+    scores[["mape", "smape"]] *= 100
+    scores["folds"] = per_fold.groupby(["series", "config"]).size()
+    scores["fit_seconds"] = per_fold.groupby(["series", "config"])["fit_seconds"].mean()
+    scores = scores.reset_index()[["series", "config", "folds", "mape", "smape", "coverage", "fit_seconds"]]
+    return scores.sort_values(["series", "smape"], kind="stable").reset_index(drop=True)
+
+def save_scores(scores, scores_file=SCORES_FILE):
+    os.makedirs(os.path.dirname(scores_file) or ".", exist_ok=True)
+    tmp_path = f"{scores_file}.{os.getpid()}.tmp"
+    scores.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, scores_file)
+
+def main():
+    import forecasting
+
+    parser = argparse.ArgumentParser(description="Backtest the forecast models on rolling origins")
+    parser.add_argument("--data", default="Walmart_customer_fixed.csv", help="CSV to backtest on")
+    parser.add_argument("--config", nargs="+", choices=sorted(CONFIGS), help="configurations to run (default: all)")
+    parser.add_argument("--horizon", type=int, default=HORIZON, help="months forecast from each origin")
+    parser.add_argument("--step", type=int, default=STEP, help="months between origins")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true", help="refit every fold")
+    args = parser.parse_args()
+
+    series = analysis_series(forecasting.load_apple_sales(args.data))
+    started = time.perf_counter()
+    folds = run(series, args.config, args.horizon, step=args.step, workers=args.workers,
+                folds_file=None if args.no_cache else FOLDS_FILE)
+    scores = score(folds)
+    save_scores(scores)
+
+    print(f"🧪 {folds['key'].nunique():,} folds over {len(series)} series in {time.perf_counter() - started:.1f}s")
+    with pd.option_context("display.width", 120, "display.max_rows", 200):
+        print(scores.to_string(index=False, float_format=lambda v: f"{v:,.3f}"))
+    print(f"💾 Scores saved to: {SCORES_FILE}")
+
+if __name__ == "__main__":
+    main()
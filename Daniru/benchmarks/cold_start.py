@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark for the dashboard
+
+Measures two things, each in a fresh interpreter so nothing is warm:
+
+* how long ``streamlit run app.py`` takes until the server answers its
+  health check, and
+* for every page, how long the first script run takes when that page is the
+  landing page, including all imports, and which heavy modules it pulled in.
+
+Run it from the Daniru folder:
+
+    python benchmarks/cold_start.py
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+PAGES = ["🏠 Overview", "📈 Feature Analysis", "🔮 Predictions", "🧭 Forecast Explorer", "📊 Market Insights", "📋 Reports"]
+
+# plotly and PIL themselves are already imported by streamlit
+HEAVY_MODULES = ["pandas", "plotly.express", "matplotlib", "seaborn"]
+
+# Executed in a child interpreter; prints one JSON line
+FIRST_RUN_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app_test = AppTest.from_file(sys.argv[1], default_timeout=float(sys.argv[3]))
+app_test.session_state["page"] = sys.argv[2]
+app_test.run()
+elapsed = (time.perf_counter() - start) * 1000
+heavy = [name for name in sys.argv[4].split(",") if name in sys.modules]
+print(json.dumps({"ms": elapsed, "heavy": heavy, "error": bool(app_test.exception)}))
+"""
+
+def free_port():
+    """Return a TCP port that is currently free on localhost"""
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+def time_server_ready(app, timeout):
+    """Start ``streamlit run`` and return milliseconds until /_stcore/health is OK"""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", app,
+         "--server.headless", "true", "--server.port", str(port),
+         "--browser.gatherUsageStats", "false"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://localhost:{port}/_stcore/health", timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError("Streamlit server did not become healthy in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+def time_first_run(app, page, timeout):
+    """Run the app once in a fresh interpreter with ``page`` preselected"""
+    output = subprocess.run(
+        [sys.executable, "-c", FIRST_RUN_SCRIPT, app, page, str(timeout), ",".join(HEAVY_MODULES)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app", default="app.py", help="Streamlit script to benchmark")
+    parser.add_argument("--timeout", type=float, default=120, help="timeout in seconds")
+    args = parser.parse_args()
+    app = os.path.abspath(args.app)
+    
+    print(f"streamlit run ready: {time_server_ready(app, args.timeout):.0f} ms\n")
+    
+    print(f"{'landing page':<22}{'first run ms':>14}  heavy modules imported")
+    for page in PAGES:
+        result = time_first_run(app, page, args.timeout)
+        status = "  (script raised)" if result["error"] else ""
+        print(f"{page:<22}{result['ms']:>14.0f}  {', '.join(result['heavy']) or '-'}{status}")
+
+if __name__ == "__main__":
+    main()
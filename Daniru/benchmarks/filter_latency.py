@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Chart latency after a sidebar filter change
+
+Drives app.py headlessly with Streamlit's AppTest. For each data-backed page
+it times the rerun after each filter change (new selections, so every chart
+is rebuilt) against a warm rerun with no filters. It first times
+FilterIndex.mask() for five combined filters against the equivalent boolean
+scans of the columns. Run it from the Daniru folder:
+
+    python benchmarks/filter_latency.py
+    python benchmarks/filter_latency.py --data benchmarks/.data/walmart_1000000_seed0.csv
+"""
+
+import argparse
+import datetime
+import os
+import shutil
+import statistics
+import sys
+import time
+
+from streamlit.testing.v1 import AppTest
+
+from session_memory import APP_DIR, app_dir_with_data
+
+PAGES = ["🏠 Overview", "📈 Feature Analysis", "📊 Market Insights"]
+
+def timed_run(app_test):
+    start = time.perf_counter()
+    app_test.run()
+    elapsed = (time.perf_counter() - start) * 1000
+    if app_test.exception:
+        raise RuntimeError(app_test.exception[0].message)
+    return elapsed
+
+def filter_changes(app_test):
+    """Yield (description, apply) for a sequence of filter changes"""
+    def dates():
+        return app_test.sidebar.date_input(key="filter_Purchase_Date")
+
+    start, end = dates().value
+    middle = start + (end - start) / 2
+    yield "date range: first half", lambda: dates().set_value((start, middle))
+    yield "+ category", lambda: app_test.sidebar.multiselect(key="filter_Category").select("Electronics")
+    yield "+ age groups", lambda: app_test.sidebar.multiselect(key="filter_Age").set_value(["25-34", "35-44"])
+    yield "+ discount", lambda: app_test.sidebar.multiselect(key="filter_Discount_Applied").select("Yes")
+    yield "date range: second half", lambda: dates().set_value((middle + datetime.timedelta(days=1), end))
+
+def mask_benchmark(data_file, rounds=5):
+    """Time FilterIndex.mask() against boolean scans for one combined selection"""
+    import filters
+    import utils
+
+    df, _ = utils.load_and_clean_data(data_file)
+    df = utils.share_frame(df)
+    start = time.perf_counter()
+    index = filters.FilterIndex(df)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    low, high = index.bounds("Purchase_Date")
+    middle = low + (high - low) / 2
+    cities = tuple(index.values("City")[::10])
+    selections = (("Purchase_Date", (low, middle)), ("City", cities), ("Category", ("Electronics",)),
+                  ("Age", ("25-34", "35-44")), ("Discount_Applied", ("Yes",)))
+
+    def scan():
+        return ((df["Purchase_Date"] >= low) & (df["Purchase_Date"] <= middle) & df["City"].isin(cities)
+                & (df["Category"] == "Electronics") & df["Age"].between(25, 44)
+                & (df["Discount_Applied"] == "Yes")).to_numpy()
+
+    assert (index.mask(selections) == scan()).all()
+    timings = {}
+    for name, func in (("mask", lambda: index.mask(selections)), ("scan", scan)):
+        times = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            func()
+            times.append((time.perf_counter() - start) * 1000)
+        timings[name] = statistics.median(times)
+    return len(df), build_ms, timings
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data", help="CSV to serve instead of the real dataset")
+    parser.add_argument("--reruns", type=int, default=3, help="warm reruns per page")
+    parser.add_argument("--timeout", type=float, default=300, help="per-run timeout in seconds")
+    args = parser.parse_args()
+
+    workdir = app_dir_with_data(args.data) if args.data else APP_DIR
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+    try:
+        rows, build_ms, timings = mask_benchmark(os.path.join(workdir, "Walmart_customer_fixed.csv"))
+        print(f"🔍 {rows:,} rows: index built in {build_ms:.0f} ms; combined filters "
+              f"{timings['mask']:.1f} ms via the index vs {timings['scan']:.1f} ms by boolean scans\n")
+
+        print(f"{'page':<22}{'change':<26}{'rerun ms':>10}")
+        for page in PAGES:
+            app_test = AppTest.from_file(os.path.join(workdir, "app.py"), default_timeout=args.timeout)
+            app_test.run()
+            app_test.sidebar.selectbox[0].select(page)
+            timed_run(app_test)
+            warm = statistics.median(timed_run(app_test) for _ in range(args.reruns))
+            print(f"{page:<22}{'(no filters, warm)':<26}{warm:>10.1f}", flush=True)
+            for description, apply in filter_changes(app_test):
+                apply()
+                print(f"{'':<22}{description:<26}{timed_run(app_test):>10.1f}", flush=True)
+    finally:
+        if workdir != APP_DIR:
+            shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
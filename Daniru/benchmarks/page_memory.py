@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Peak memory benchmark for dashboard page renders
+
+Each data-backed dashboard page is rendered in a fresh subprocess so that the
+peak RSS reported for one page is not inflated by another. Run it from the
+Daniru folder:
+
+    python benchmarks/page_memory.py --rows 500000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PAGES = {
+    "overview": [
+        ("create_market_share_chart", "df"),
+        ("create_ratings_distribution", "apple_df"),
+    ],
+    "feature_analysis": [
+        ("create_geographic_analysis", "apple_df"),
+        ("create_price_sales_scatter", "apple_df"),
+        ("create_discount_analysis", "df"),
+        ("create_monthly_trends", "apple_df"),
+        ("create_weekday_analysis", "apple_df"),
+    ],
+    "market_insights": [
+        ("create_seasonal_analysis", "apple_df"),
+        ("create_category_analysis", "apple_df"),
+        ("create_age_group_analysis", "demographics"),
+        ("create_age_group_share_chart", "demographics"),
+    ],
+}
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB"""
+    try:
+        # VmHWM honours reset_peak_rss(), ru_maxrss does not
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def current_rss_mb():
+    """Return the current resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return peak_rss_mb()
+
+def reset_peak_rss():
+    """Reset the kernel's RSS high-water mark where the platform allows it"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def make_dataset(source, rows):
+    """
+    Write a copy of the source CSV tiled up to the requested number of rows
+    
+    Args:
+        source (str): Path to the original CSV file
+        rows (int): Number of data rows wanted
+        
+    Returns:
+        str: Path to the generated CSV file
+    """
+    import pandas as pd
+    
+    df = pd.read_csv(source, low_memory=False)
+    repeats = -(-rows // len(df))
+    tiled = pd.concat([df] * repeats, ignore_index=True).head(rows)
+    # Make the tiled rows distinct so drop_duplicates keeps them
+    tiled["Customer_ID"] = tiled["Customer_ID"] + "-" + (tiled.index // len(df)).astype(str)
+    
+    handle, path = tempfile.mkstemp(suffix=".csv", prefix="page_memory_")
+    os.close(handle)
+    tiled.to_csv(path, index=False)
+    return path
+
+def render_page(page, data_path):
+    """Render one page's charts in this process and return its memory stats"""
+    import charts
+    import demographics
+    import utils
+    
+    df, apple_df = utils.load_and_clean_data(data_path)
+    frames = {"df": df, "apple_df": apple_df, "demographics": demographics.cube(df)}
+    load_peak = peak_rss_mb()
+    
+    reset_peak_rss()
+    rss_before_render = current_rss_mb()
+    tracemalloc.start()
+    for builder, frame in PAGES[page]:
+        getattr(charts, builder)(frames[frame])
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    render_peak = peak_rss_mb()
+    
+    return {
+        "page": page,
+        "rows": len(df),
+        "peak_rss_mb": round(max(load_peak, render_peak), 1),
+        "render_rss_growth_mb": round(render_peak - rss_before_render, 1),
+        "render_traced_peak_mb": round(traced_peak / (1024 * 1024), 1),
+    }
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data", default="Walmart_customer_fixed.csv", help="source CSV file")
+    parser.add_argument("--rows", type=int, default=0, help="tile the source CSV up to this many rows")
+    parser.add_argument("--page", choices=sorted(PAGES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.page:
+        print(json.dumps(render_page(args.page, args.data)))
+        return
+    
+    data_path = make_dataset(args.data, args.rows) if args.rows else args.data
+    try:
+        print(f"{'page':<18}{'rows':>10}{'peak RSS MB':>14}{'render RSS MB':>16}{'render traced MB':>19}")
+        for page in PAGES:
+            output = subprocess.run(
+                [sys.executable, __file__, "--page", page, "--data", data_path],
+                capture_output=True, text=True, check=True
+            ).stdout
+            stats = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{stats['page']:<18}{stats['rows']:>10,}{stats['peak_rss_mb']:>14}"
+                f"{stats['render_rss_growth_mb']:>16}{stats['render_traced_peak_mb']:>19}"
+            )
+    finally:
+        if data_path != args.data:
+            os.remove(data_path)
+
+if __name__ == "__main__":
+    main()
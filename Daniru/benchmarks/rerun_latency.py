@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Rerun latency benchmark for the dashboard pages
+
+Drives app.py headlessly with Streamlit's AppTest and times, for each page,
+the first visit (cold caches) and repeat reruns (warm caches). Run it from
+the Daniru folder:
+
+    python benchmarks/rerun_latency.py --reruns 5
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from streamlit.testing.v1 import AppTest
+
+PAGES = ["🏠 Overview", "📈 Feature Analysis", "🔮 Predictions", "🧭 Forecast Explorer", "📊 Market Insights", "📋 Reports"]
+
+def timed_run(app_test, timeout):
+    """Run the script once and return the elapsed time in milliseconds"""
+    start = time.perf_counter()
+    app_test.run(timeout=timeout)
+    elapsed = (time.perf_counter() - start) * 1000
+    if app_test.exception:
+        raise RuntimeError(app_test.exception[0].message)
+    return elapsed
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app", default="app.py", help="Streamlit script to benchmark")
+    parser.add_argument("--reruns", type=int, default=5, help="warm reruns per page")
+    parser.add_argument("--timeout", type=float, default=120, help="per-run timeout in seconds")
+    args = parser.parse_args()
+    
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.app)))
+    app_test = AppTest.from_file(os.path.abspath(args.app), default_timeout=args.timeout)
+    timed_run(app_test, args.timeout)
+    
+    print(f"{'page':<22}{'first visit ms':>16}{'rerun median ms':>18}{'rerun min ms':>15}")
+    for page in PAGES:
+        app_test.sidebar.selectbox[0].select(page)
+        first = timed_run(app_test, args.timeout)
+        reruns = [timed_run(app_test, args.timeout) for _ in range(args.reruns)]
+        print(f"{page:<22}{first:>16.1f}{statistics.median(reruns):>18.1f}{min(reruns):>15.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmarks for the pipeline stages
+
+Times each stage (loading and cleaning, the dashboard chart builders, the
+forecast scripts' aggregations) on synthetic datasets of growing size, in the
+manner of pytest-benchmark: every benchmark is calibrated to run several
+rounds within a time budget and reports min/median/mean/stddev.
+
+Results are saved as JSON under benchmarks/results/ (one file per run, named
+after the commit) and compared against a baseline run; a benchmark whose
+median slowed by more than --threshold is reported as a regression and makes
+the script exit non-zero. Run it from the Daniru folder:
+
+    python benchmarks/scaling.py --rows 10000 100000 1000000
+    python benchmarks/scaling.py --rows 10000 100000 --compare benchmarks/results/<baseline>.json
+
+Generated datasets are cached in benchmarks/.data/ so reruns skip the
+generator; 10,000,000 rows takes a few minutes to write the first time.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+DATA_DIR = os.path.join(BENCHMARK_DIR, ".data")
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+
+# Chart builders and the frame each one is given
+CHARTS = [
+    ("create_market_share_chart", "df"),
+    ("create_ratings_distribution", "apple_df"),
+    ("create_geographic_analysis", "apple_df"),
+    ("create_price_sales_scatter", "apple_df"),
+    ("create_discount_analysis", "df"),
+    ("create_monthly_trends", "apple_df"),
+    ("create_weekday_analysis", "apple_df"),
+    ("create_seasonal_analysis", "apple_df"),
+]
+
+def dataset_path(rows, seed):
+    """Generate (once) and return the cached synthetic CSV for a size"""
+    import synthetic
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"walmart_{rows}_seed{seed}.csv")
+    if not os.path.exists(path):
+        print(f"⏳ Generating {rows:,} synthetic rows...", flush=True)
+        synthetic.write_csv(rows, path, seed=seed)
+    return path
+
+def measure(func, budget, max_rounds, min_rounds=1):
+    """
+    Time a callable over calibrated rounds
+
+    Rounds continue until the time budget is spent or max_rounds is reached.
+
+    Returns:
+        dict: min, max, mean, median and stddev in seconds, plus rounds
+    """
+    times = []
+    spent = 0.0
+    while len(times) < min_rounds or (spent < budget and len(times) < max_rounds):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        spent += elapsed
+    return {
+        "min": min(times),
+        "max": max(times),
+        "mean": statistics.fmean(times),
+        "median": statistics.median(times),
+        "stddev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "rounds": len(times),
+    }
+
+def stage_benchmarks(path):
+    """
+    Yield (group, name, callable) for every stage on one dataset
+
+    Inputs each stage needs are prepared outside the timed callable, so a
+    stage's time only covers its own work.
+    """
+    import charts
+    import forecasting
+    import sketches
+    import utils
+    from apple_ratings import aggregate as ratings_aggregate
+    from price_elasticity import aggregate as price_aggregate
+    from product_domination import aggregate as products_aggregate
+
+    yield "load", "load_and_clean_data", lambda: utils.load_and_clean_data(path)
+    yield "load", "load_and_clean_data[overview columns]", lambda: utils.load_and_clean_data(
+        path, columns=["Brand", "Purchase_Amount", "Rating", "Market_Price"])
+    yield "load", "load_apple_sales", lambda: forecasting.load_apple_sales(path)
+    yield "load", "sketches.build", lambda: sketches.build(path)
+
+    df, apple_df = utils.load_and_clean_data(path)
+    frames = {"df": df, "apple_df": apple_df}
+    for builder, frame in CHARTS:
+        yield "chart", builder, lambda b=builder, f=frame: getattr(charts, b)(frames[f])
+
+    apple_sales = forecasting.load_apple_sales(path)
+    yield "aggregate", "apple_ratings.aggregate", lambda: ratings_aggregate(apple_sales)
+    yield "aggregate", "price_elasticity.aggregate", lambda: price_aggregate(apple_sales)
+    yield "aggregate", "product_domination.aggregate", lambda: products_aggregate(apple_sales)
+    yield "aggregate", "forecasting.monthly_series[sales]", lambda: forecasting.monthly_series(df, "sales", brand="Apple")
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(results, baseline, threshold):
+    """
+    Compare medians with a baseline run
+
+    Returns:
+        list: (name, rows, baseline median, median, ratio) of regressions
+    """
+    base = {(b["name"], b["rows"]): b["stats"]["median"] for b in baseline["benchmarks"]}
+    regressions = []
+    for bench in results["benchmarks"]:
+        key = (bench["name"], bench["rows"])
+        if key not in base or base[key] <= 0:
+            continue
+        ratio = bench["stats"]["median"] / base[key]
+        if ratio > 1 + threshold:
+            regressions.append((bench["name"], bench["rows"], base[key], bench["stats"]["median"], ratio))
+    return regressions
+
+def main():
+    """Main function"""
+    import warnings
+
+    warnings.filterwarnings("ignore")  # Streamlit warns when used outside `streamlit run`
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="dataset sizes")
+    parser.add_argument("--seed", type=int, default=0, help="synthetic data seed")
+    parser.add_argument("--group", choices=["load", "chart", "aggregate"], action="append", help="only these stage groups")
+    parser.add_argument("--budget", type=float, default=2.0, help="seconds per benchmark before stopping rounds")
+    parser.add_argument("--max-rounds", type=int, default=10, help="rounds per benchmark at most")
+    parser.add_argument("--compare", help="baseline results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="median slowdown counted as a regression")
+    parser.add_argument("--no-save", action="store_true", help="don't write a results file")
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_revision(),
+        "datetime": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "benchmarks": [],
+    }
+
+    for rows in args.rows:
+        path = dataset_path(rows, args.seed)
+        print(f"\n📏 {rows:,} rows")
+        for group, name, func in stage_benchmarks(path):
+            if args.group and group not in args.group:
+                continue
+            stats = measure(func, args.budget, args.max_rounds)
+            results["benchmarks"].append({"group": group, "name": name, "rows": rows, "stats": stats})
+            print(f"   {group:<10} {name:<40} median {stats['median'] * 1000:>10.1f} ms"
+                  f"   ±{stats['stddev'] * 1000:.1f}   ({stats['rounds']} rounds)", flush=True)
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out_path = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%dT%H%M%S')}-{results['commit']}.json")
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results saved to: {out_path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for name, rows, before, after, ratio in regressions:
+                print(f"   {name} @ {rows:,} rows: {before * 1000:.1f} -> {after * 1000:.1f} ms ({ratio:.2f}x)")
+            sys.exit(1)
+        print(f"\n✅ No regressions over {args.threshold:.0%} against {args.compare}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Memory cost of each additional dashboard session
+
+Opens several headless sessions of app.py with Streamlit's AppTest in one
+process, as the Streamlit server would, and visits the data-backed pages in
+each. Reports:
+
+- the RSS retained per additional session once every session has rendered
+- the traced allocation peak of a warm rerun, which is what every viewer
+  rendering at the same moment adds on top of the shared caches
+
+Run it from the Daniru folder; --data points the app at another CSV, such as
+a synthetic one from benchmarks/synthetic.py:
+
+    python benchmarks/session_memory.py --sessions 10
+    python benchmarks/session_memory.py --sessions 10 --data benchmarks/.data/walmart_1000000_seed0.csv
+"""
+
+import argparse
+import gc
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import tracemalloc
+
+from streamlit.testing.v1 import AppTest
+
+from page_memory import current_rss_mb
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_FILE = "Walmart_customer_fixed.csv"
+PAGES = ["🏠 Overview", "📈 Feature Analysis", "📊 Market Insights"]
+
+def app_dir_with_data(data):
+    """A temporary copy of the app folder (as symlinks) whose dataset is data"""
+    workdir = tempfile.mkdtemp(prefix="session_memory_")
+    for name in os.listdir(APP_DIR):
+        if name != DATA_FILE:
+            os.symlink(os.path.join(APP_DIR, name), os.path.join(workdir, name))
+    os.symlink(os.path.abspath(data), os.path.join(workdir, DATA_FILE))
+    return workdir
+
+def open_session(timeout):
+    """Start a session and render every data-backed page in it"""
+    app_test = AppTest.from_file(os.path.join(os.getcwd(), "app.py"), default_timeout=timeout)
+    app_test.run()
+    for page in PAGES:
+        app_test.sidebar.selectbox[0].select(page)
+        app_test.run()
+        if app_test.exception:
+            raise RuntimeError(app_test.exception[0].message)
+    return app_test
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10, help="sessions to open")
+    parser.add_argument("--data", help="CSV to serve instead of the real dataset")
+    parser.add_argument("--timeout", type=float, default=300, help="per-run timeout in seconds")
+    args = parser.parse_args()
+
+    workdir = app_dir_with_data(args.data) if args.data else APP_DIR
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+    try:
+        sessions = []
+        rss = []
+        for i in range(args.sessions):
+            sessions.append(open_session(args.timeout))
+            gc.collect()
+            rss.append(current_rss_mb())
+            print(f"   session {i + 1:>3}: RSS {rss[-1]:8.1f} MB", flush=True)
+
+        # A warm rerun of each page in an existing session
+        peaks = []
+        for page in PAGES:
+            sessions[0].sidebar.selectbox[0].select(page)
+            tracemalloc.start()
+            sessions[0].run()
+            peaks.append(tracemalloc.get_traced_memory()[1] / (1024 * 1024))
+            tracemalloc.stop()
+
+        growth = [after - before for before, after in zip(rss, rss[1:])]
+        print(f"\n🧠 First session: {rss[0]:.1f} MB RSS (process + shared caches)")
+        if growth:
+            print(f"   Per additional session: {statistics.median(growth):.1f} MB RSS retained (median)")
+        print(f"   Warm rerun allocation peak: {max(peaks):.1f} MB (per concurrently rendering viewer)")
+    finally:
+        if workdir != APP_DIR:
+            shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Synthetic Walmart dataset generator
+
+Writes CSVs with the same 27 columns, dtypes and value formats as
+Walmart_customer_fixed.csv at any row count. Values are drawn from the real
+file's empirical distributions so cardinalities and correlations stay
+realistic as the data grows:
+
+- Product_Name/Brand/Model/Category rows are sampled as whole catalogue
+  entries, so a product keeps its brand, model and category (the Apple share
+  matches the real data), and Market_Price stays in the model's price range.
+- Discounted purchases pay 70-95% of Market_Price, full-price ones 100%.
+- Customers buy 1-8 times (the real repeat distribution), and
+  Repeat_Customer says whether they appear more than once.
+- Product_ID and City pools grow with the row count at the real
+  distinct-per-row ratio, capped at realistic sizes, and City popularity
+  follows a shallow Zipf curve.
+- Purchase_Date spreads uniformly over the real date range.
+
+Run it from the Daniru folder:
+
+    python benchmarks/synthetic.py --rows 1000000 --out /tmp/walmart_1m.csv
+"""
+
+import argparse
+import os
+import sys
+import uuid
+
+import numpy as np
+import pandas as pd
+
+SOURCE = "Walmart_customer_fixed.csv"
+
+PRODUCT_COLUMNS = ["Product_Name", "Brand", "Model", "Category", "Fixed_Category",
+                   "Name_Brand_Model_Match", "Category_Match"]
+COMPETITOR_COLUMNS = ["Competitor_Name", "Competitor_Model", "Competitor_Price"]
+# Columns sampled independently from their real value frequencies
+MARGINAL_COLUMNS = ["Rating", "Feedback", "Gender", "Payment_Method", "Competitor_Rating",
+                    "Promotion_Competitor", "Market_Share", "Competitor_Feedback"]
+
+MAX_PRODUCT_IDS = 90_000   # PRD + five digits
+MAX_CITIES = 20_000
+# City popularity falls off as rank ** -exponent: a long tail, as in the real file
+CITY_ZIPF_EXPONENT = 0.6
+CHUNK_ROWS = 500_000
+
+class Profile:
+    """Empirical distributions of the real dataset that the generator samples"""
+
+    def __init__(self, source=SOURCE):
+        df = pd.read_csv(source, low_memory=False)
+        self.columns = list(df.columns)
+
+        self.products = df.groupby(PRODUCT_COLUMNS).size().reset_index(name="count")
+        prices = df.groupby("Model")["Market_Price"].agg(["min", "max"])
+        self.products = self.products.join(prices, on="Model")
+        self.competitors = df.groupby(COMPETITOR_COLUMNS).size().reset_index(name="count")
+        self.marginals = {column: df[column].value_counts(normalize=True) for column in MARGINAL_COLUMNS}
+
+        self.discount_rate = (df["Discount_Applied"] == "Yes").mean()
+        self.purchases_per_customer = df["Customer_ID"].value_counts().value_counts(normalize=True).sort_index()
+        self.product_ids_per_row = df["Product_ID"].nunique() / len(df)
+        self.cities_per_row = df["City"].nunique() / len(df)
+        self.cities = df["City"].unique()
+        self.age_range = (int(df["Age"].min()), int(df["Age"].max()))
+        dates = pd.to_datetime(df["Purchase_Date"])
+        self.date_range = (dates.min(), dates.max())
+
+def _weighted(rng, frequencies, size):
+    """Sample index positions of a frequency table"""
+    p = np.asarray(frequencies, dtype=float)
+    return rng.choice(len(p), size=size, p=p / p.sum())
+
+def _city_pool(profile, size):
+    """City names: the real ones first, then numbered variants of them"""
+    if size <= len(profile.cities):
+        return profile.cities[:size]
+    extra = size - len(profile.cities)
+    base = profile.cities[np.arange(extra) % len(profile.cities)]
+    suffix = np.arange(extra) // len(profile.cities) + 2
+    return np.concatenate([profile.cities, [f"{city} {n}" for city, n in zip(base, suffix)]])
+
+def _customers(rng, profile, rows):
+    """
+    Customer_ID per row and whether the customer repeats
+
+    Customers get a purchase count drawn from the real distribution, and
+    their purchases are shuffled across the rows.
+    """
+    counts = profile.purchases_per_customer
+    expected = int(rows / (counts.index.to_numpy() * counts.to_numpy()).sum()) + 1
+    per_customer = counts.index.to_numpy()[_weighted(rng, counts.to_numpy(), expected)]
+    while per_customer.sum() < rows:
+        per_customer = np.append(per_customer, per_customer[:expected // 10 + 1])
+
+    owner = np.repeat(np.arange(len(per_customer)), per_customer)[:rows]
+    rng.shuffle(owner)
+    n_customers = owner.max() + 1
+    ids = np.array([str(uuid.UUID(bytes=b.tobytes(), version=4))
+                    for b in rng.integers(0, 256, size=(n_customers, 16), dtype=np.uint8)])
+    repeats = np.bincount(owner, minlength=n_customers) > 1
+    return ids[owner], np.where(repeats[owner], "Yes", "No")
+
+def generate(rows, seed=0, profile=None, customers=None):
+    """
+    Generate a synthetic dataset
+
+    Args:
+        rows (int): Number of rows
+        seed (int): Random seed; the same seed gives the same data
+        profile (Profile): Real-data distributions, loaded from SOURCE if None
+        customers (tuple): (Customer_ID, Repeat_Customer) arrays for these
+            rows, used by write_csv() to keep customers consistent across
+            chunks; generated if None
+
+    Returns:
+        pd.DataFrame: Columns in the real file's order
+    """
+    profile = profile or Profile()
+    rng = np.random.default_rng(seed)
+    out = {}
+
+    products = profile.products.iloc[_weighted(rng, profile.products["count"], rows)].reset_index(drop=True)
+    for column in PRODUCT_COLUMNS:
+        out[column] = products[column].to_numpy()
+    low, high = products["min"].to_numpy(), products["max"].to_numpy()
+    market_price = np.round(low + rng.random(rows) * (high - low), 2)
+
+    discounted = rng.random(rows) < profile.discount_rate
+    paid_share = np.where(discounted, rng.uniform(0.70, 0.95, rows), 1.0)
+    out["Market_Price"] = market_price
+    out["Purchase_Amount"] = np.round(market_price * paid_share, 2)
+    out["Discount_Applied"] = np.where(discounted, "Yes", "No")
+
+    competitors = profile.competitors.iloc[_weighted(rng, profile.competitors["count"], rows)]
+    for column in COMPETITOR_COLUMNS:
+        out[column] = competitors[column].to_numpy()
+
+    for column, frequencies in profile.marginals.items():
+        out[column] = frequencies.index.to_numpy()[_weighted(rng, frequencies.to_numpy(), rows)]
+
+    n_ids = min(max(int(rows * profile.product_ids_per_row), 1), MAX_PRODUCT_IDS)
+    out["Product_ID"] = np.char.add("PRD", np.char.zfill(rng.integers(10_000, 10_000 + n_ids, rows).astype(str), 5))
+
+    cities = _city_pool(profile, min(max(int(rows * profile.cities_per_row), 1), MAX_CITIES))
+    popularity = 1.0 / np.arange(1, len(cities) + 1) ** CITY_ZIPF_EXPONENT
+    out["City"] = cities[_weighted(rng, popularity, rows)]
+
+    out["Customer_ID"], out["Repeat_Customer"] = customers or _customers(rng, profile, rows)
+    out["Age"] = rng.integers(profile.age_range[0], profile.age_range[1] + 1, rows)
+
+    start, end = profile.date_range
+    days = rng.integers(0, (end - start).days + 1, rows)
+    out["Purchase_Date"] = (start + pd.to_timedelta(days, unit="D")).strftime("%Y-%m-%d")
+
+    return pd.DataFrame(out)[profile.columns]
+
+def write_csv(rows, path, seed=0, chunk_rows=CHUNK_ROWS, profile=None):
+    """
+    Write a synthetic dataset to CSV in chunks, so 10M rows fit in memory
+
+    Args:
+        rows (int): Number of rows
+        path (str): Output CSV path
+        seed (int): Random seed
+        chunk_rows (int): Rows generated per chunk
+        profile (Profile): Real-data distributions, loaded from SOURCE if None
+
+    Returns:
+        str: The output path
+    """
+    profile = profile or Profile()
+    customer_ids, repeat = _customers(np.random.default_rng(seed), profile, rows)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    for i, start in enumerate(range(0, rows, chunk_rows)):
+        stop = min(start + chunk_rows, rows)
+        chunk = generate(stop - start, seed=seed + 1 + i, profile=profile,
+                         customers=(customer_ids[start:stop], repeat[start:stop]))
+        chunk.to_csv(tmp_path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="rows to generate")
+    parser.add_argument("--out", required=True, help="output CSV path")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--source", default=SOURCE, help="real CSV whose distributions are sampled")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        sys.exit(f"❌ {args.source} not found; run from the Daniru folder")
+
+    print(f"⏳ Generating {args.rows:,} rows...")
+    write_csv(args.rows, args.out, seed=args.seed, profile=Profile(args.source))
+    print(f"✅ Written to: {args.out} ({os.path.getsize(args.out) / 1e6:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
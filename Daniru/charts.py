@@ -0,0 +1,529 @@
+"""
+Plotly chart builders for the Apple Market Analyzer Dashboard
+
+Kept apart from utils.py so that pages which draw no charts never pay for
+importing Plotly.
+"""
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Price vs purchase scatter switches to WebGL, then to binned density, above these sizes
+SCATTER_WEBGL_THRESHOLD = 5_000
+SCATTER_DENSITY_THRESHOLD = 50_000
+SCATTER_BINS = 200
+
+def label_seasons(purchase_dates):
+    """
+    Label each purchase date with its sales season
+    
+    Args:
+        purchase_dates (pd.Series): Datetime series of purchase dates
+        
+    Returns:
+        np.ndarray: Season label per date ("New Year", "Christmas",
+            "Back-to-School" or "Other")
+    """
+    month = purchase_dates.dt.month.to_numpy()
+    day = purchase_dates.dt.day.to_numpy()
+    
+    conditions = [
+        (month == 1) & (day <= 7),
+        (month == 12) & (day >= 20),
+        (month == 8) | ((month == 9) & (day <= 15)),
+    ]
+    return np.select(conditions, ["New Year", "Christmas", "Back-to-School"], default="Other")
+
+def create_market_share_chart(df):
+    """
+    Create market share pie chart
+    
+    Args:
+        df (pd.DataFrame): Main dataframe
+        
+    Returns:
+        plotly.graph_objects.Figure: Market share pie chart
+    """
+    if "Brand" not in df.columns or "Purchase_Amount" not in df.columns:
+        return None
+    
+    brand_share = df.groupby("Brand")["Purchase_Amount"].sum().sort_values(ascending=False)
+    brand_share_pct = brand_share / brand_share.sum() * 100
+    
+    fig = px.pie(
+        values=brand_share_pct.values,
+        names=brand_share_pct.index,
+        title="Market Share by Brand",
+        color_discrete_sequence=px.colors.qualitative.Set3
+    )
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    return fig
+
+def create_ratings_distribution(apple_df):
+    """
+    Create ratings distribution histogram
+    
+    Args:
+        apple_df (pd.DataFrame): Apple-specific dataframe
+        
+    Returns:
+        plotly.graph_objects.Figure: Ratings distribution chart
+    """
+    if "Rating" not in apple_df.columns:
+        return None
+    
+    fig = px.histogram(
+        apple_df.dropna(subset=['Rating']),
+        x='Rating',
+        nbins=10,
+        title="Apple Product Ratings Distribution",
+        color_discrete_sequence=['#1f77b4']
+    )
+    fig.update_layout(showlegend=False)
+    return fig
+
+def create_geographic_analysis(apple_df):
+    """
+    Create geographic sales analysis
+    
+    Args:
+        apple_df (pd.DataFrame): Apple-specific dataframe
+        
+    Returns:
+        plotly.graph_objects.Figure: Geographic sales chart
+    """
+    if "City" not in apple_df.columns or "Purchase_Amount" not in apple_df.columns:
+        return None
+    
+    top_cities = apple_df.groupby("City")["Purchase_Amount"].sum().sort_values(ascending=False).head(10)
+    return create_top_cities_chart(top_cities)
+
+def create_top_cities_chart(top_cities, approximate=False):
+    """
+    Create the top cities bar chart from per-city sales
+    
+    Args:
+        top_cities (pd.Series): Sales per city, largest first
+        approximate (bool): Whether the sales are sketch estimates
+        
+    Returns:
+        plotly.graph_objects.Figure: Geographic sales chart
+    """
+    fig = px.bar(
+        x=top_cities.values,
+        y=top_cities.index,
+        orientation='h',
+        title="Top 10 Cities by Apple Sales" + (" (≈ sketch estimate)" if approximate else ""),
+        labels={'x': 'Total Sales Amount', 'y': 'City'},
+        color=top_cities.values,
+        color_continuous_scale='Blues'
+    )
+    fig.update_layout(height=500)
+    return fig
+
+def create_price_sales_scatter(apple_df, mode="auto", x_range=None, y_range=None, bins=SCATTER_BINS):
+    """
+    Create price vs sales scatter plot
+    
+    Small frames are drawn as ordinary SVG markers. Larger ones switch to
+    WebGL markers, and above SCATTER_DENSITY_THRESHOLD points the plot is
+    binned server-side into a 2D density heatmap, so the figure payload stays
+    bounded by ``bins`` squared however many rows there are. Passing a window
+    in ``x_range``/``y_range`` re-aggregates only the points inside it, which
+    is how the dashboard zooms into dense regions.
+    
+    Args:
+        apple_df (pd.DataFrame): Apple-specific dataframe
+        mode (str): "auto", "svg", "webgl" or "density"
+        x_range (tuple): Optional (min, max) Market_Price window
+        y_range (tuple): Optional (min, max) Purchase_Amount window
+        bins (int): Bins per axis in density mode
+        
+    Returns:
+        plotly.graph_objects.Figure: Price vs sales scatter plot
+    """
+    if "Market_Price" not in apple_df.columns or "Purchase_Amount" not in apple_df.columns:
+        return None
+    
+    x = apple_df["Market_Price"].to_numpy(dtype=float)
+    y = apple_df["Purchase_Amount"].to_numpy(dtype=float)
+    visible = ~(np.isnan(x) | np.isnan(y))
+    if x_range is not None:
+        visible &= (x >= x_range[0]) & (x <= x_range[1])
+    if y_range is not None:
+        visible &= (y >= y_range[0]) & (y <= y_range[1])
+    x, y = x[visible], y[visible]
+    
+    if mode == "auto":
+        if len(x) > SCATTER_DENSITY_THRESHOLD:
+            mode = "density"
+        elif len(x) > SCATTER_WEBGL_THRESHOLD:
+            mode = "webgl"
+        else:
+            mode = "svg"
+    
+    title = "Apple Price vs Purchase Volume"
+    labels = {'x': 'Market Price ($)', 'y': 'Purchase Amount ($)', 'color': 'Market Price ($)'}
+    
+    if mode != "density":
+        fig = px.scatter(
+            x=x,
+            y=y,
+            title=title,
+            labels=labels,
+            color=x,
+            color_continuous_scale='Viridis',
+            render_mode="webgl" if mode == "webgl" else "svg"
+        )
+        return fig
+    
+    if len(x) == 0:
+        counts = np.zeros((bins, bins))
+        x_edges = y_edges = np.linspace(0, 1, bins + 1)
+    else:
+        counts, x_edges, y_edges = np.histogram2d(
+            x, y, bins=bins,
+            range=[x_range or (x.min(), x.max()), y_range or (y.min(), y.max())]
+        )
+    # Leave empty bins transparent instead of painting them as zero
+    counts[counts == 0] = np.nan
+    
+    fig = go.Figure(go.Heatmap(
+        x=(x_edges[:-1] + x_edges[1:]) / 2,
+        y=(y_edges[:-1] + y_edges[1:]) / 2,
+        z=counts.T,
+        colorscale='Viridis',
+        colorbar={'title': 'Purchases'},
+        hovertemplate="Price: $%{x:.2f}<br>Amount: $%{y:.2f}<br>Purchases: %{z}<extra></extra>"
+    ))
+    fig.update_layout(
+        title=f"{title} (density of {len(x):,} purchases)",
+        xaxis_title=labels['x'],
+        yaxis_title=labels['y']
+    )
+    return fig
+
+def create_discount_analysis(df):
+    """
+    Create discount impact analysis
+    
+    Args:
+        df (pd.DataFrame): Main dataframe
+        
+    Returns:
+        plotly.graph_objects.Figure: Discount analysis chart
+    """
+    if "Discount_Applied" not in df.columns or "Brand" not in df.columns or "Purchase_Amount" not in df.columns:
+        return None
+    
+    disc_sales = df.groupby(["Brand", "Discount_Applied"])["Purchase_Amount"].sum().unstack(fill_value=0)
+    if "Apple" not in disc_sales.index:
+        return None
+    
+    apple_disc = disc_sales.loc["Apple"]
+    
+    fig = px.bar(
+        x=apple_disc.index,
+        y=apple_disc.values,
+        title="Apple Sales: Discount vs No Discount",
+        labels={'x': 'Discount Applied', 'y': 'Total Sales Amount ($)'},
+        color=apple_disc.values,
+        color_continuous_scale=['red', 'green']
+    )
+    return fig
+
+def create_monthly_trends(apple_df):
+    """
+    Create monthly sales trends
+    
+    Args:
+        apple_df (pd.DataFrame): Apple-specific dataframe
+        
+    Returns:
+        plotly.graph_objects.Figure: Monthly trends chart
+    """
+    if "Purchase_Date" not in apple_df.columns or "Purchase_Amount" not in apple_df.columns:
+        return None
+    
+    if apple_df["Purchase_Date"].notna().any():
+        apple_monthly = apple_df.groupby(pd.Grouper(key="Purchase_Date", freq="ME"))["Purchase_Amount"].sum()
+        
+        fig = px.line(
+            x=apple_monthly.index,
+            y=apple_monthly.values,
+            title="Monthly Apple Sales Trend",
+            labels={'x': 'Month', 'y': 'Sales Amount ($)'}
+        )
+        fig.update_traces(mode='lines+markers')
+        return fig
+    return None
+
+def create_weekday_analysis(apple_df):
+    """
+    Create weekday sales analysis
+    
+    Args:
+        apple_df (pd.DataFrame): Apple-specific dataframe
+        
+    Returns:
+        plotly.graph_objects.Figure: Weekday analysis chart
+    """
+    if "Purchase_Date" not in apple_df.columns or "Purchase_Amount" not in apple_df.columns:
+        return None
+    
+    # Group on weekday numbers computed from the date array alone, so the
+    # Apple frame is never copied just to hold a derived column
+    weekday_numbers = apple_df["Purchase_Date"].dt.dayofweek.to_numpy()
+    weekday_sales = apple_df["Purchase_Amount"].groupby(weekday_numbers).sum().reindex(range(7))
+    weekday_sales.index = WEEKDAYS
+    
+    fig = px.bar(
+        x=weekday_sales.index,
+        y=weekday_sales.values,
+        title="Apple Sales by Weekday",
+        labels={'x': 'Day of Week', 'y': 'Total Sales Amount ($)'},
+        color=weekday_sales.values,
+        color_continuous_scale='Blues'
+    )
+    return fig
+
+def create_seasonal_analysis(apple_df):
+    """
+    Create seasonal sales analysis
+    
+    Args:
+        apple_df (pd.DataFrame): Apple-specific dataframe
+        
+    Returns:
+        plotly.graph_objects.Figure: Seasonal analysis chart
+    """
+    if "Purchase_Date" not in apple_df.columns or "Purchase_Amount" not in apple_df.columns:
+        return None
+    
+    if not apple_df["Purchase_Date"].notna().any():
+        return None
+    
+    seasons = label_seasons(apple_df["Purchase_Date"])
+    seasonal_sales = apple_df["Purchase_Amount"].groupby(seasons).sum().sort_values(ascending=False)
+    
+    fig = px.bar(
+        x=seasonal_sales.index,
+        y=seasonal_sales.values,
+        title="Apple Seasonal Sales Spikes",
+        labels={'x': 'Season', 'y': 'Total Sales Amount ($)'},
+        color=seasonal_sales.values,
+        color_continuous_scale=px.colors.qualitative.Set2
+    )
+    return fig
+
+def create_category_analysis(apple_df):
+    """
+    Create product category analysis
+    
+    Args:
+        apple_df (pd.DataFrame): Apple-specific dataframe
+        
+    Returns:
+        plotly.graph_objects.Figure: Category analysis chart
+    """
+    if "Product_Category" not in apple_df.columns or "Purchase_Amount" not in apple_df.columns:
+        return None
+    
+    category_sales = apple_df.groupby("Product_Category")["Purchase_Amount"].sum().sort_values(ascending=False)
+    
+    fig = px.pie(
+        values=category_sales.values,
+        names=category_sales.index,
+        title="Apple Sales by Product Category",
+        color_discrete_sequence=px.colors.qualitative.Set3
+    )
+    return fig
+
+def create_age_group_analysis(cube):
+    """
+    Create age group analysis
+    
+    Args:
+        cube (pd.DataFrame): Demographics cube (see demographics.cube())
+        
+    Returns:
+        plotly.graph_objects.Figure: Apple revenue by age group and gender
+    """
+    apple = cube[cube["Brand_Group"] == "Apple"]
+    if apple.empty:
+        return None
+    
+    age_sales = apple.groupby(["Age_Group", "Gender_Group"], observed=True)["revenue"].sum().reset_index()
+    
+    fig = px.bar(
+        age_sales,
+        x="Age_Group",
+        y="revenue",
+        color="Gender_Group",
+        title="Apple Sales by Age Group",
+        labels={"Age_Group": "Age Group", "revenue": "Total Sales Amount ($)", "Gender_Group": "Gender"},
+        category_orders={"Age_Group": list(cube["Age_Group"].cat.categories)},
+        color_discrete_sequence=px.colors.sequential.Blues_r[1::3]
+    )
+    return fig
+
+def create_age_group_share_chart(cube):
+    """
+    Create Apple's share of each age group's spending
+    
+    Args:
+        cube (pd.DataFrame): Demographics cube (see demographics.cube())
+        
+    Returns:
+        plotly.graph_objects.Figure: Apple and other brands' revenue share
+            per age group
+    """
+    if cube.empty:
+        return None
+    
+    revenue = cube.groupby(["Age_Group", "Brand_Group"], observed=True)["revenue"].sum().unstack(fill_value=0)
+    share = (revenue.div(revenue.sum(axis=1), axis=0) * 100).stack().rename("share").reset_index()
+    
+    fig = px.bar(
+        share,
+        x="Age_Group",
+        y="share",
+        color="Brand_Group",
+        title="Apple vs Other Brands by Age Group",
+        labels={"Age_Group": "Age Group", "share": "Share of Revenue (%)", "Brand_Group": "Brand"},
+        category_orders={"Age_Group": list(cube["Age_Group"].cat.categories), "Brand_Group": ["Apple", "Other"]},
+        color_discrete_map={"Apple": "#1f77b4", "Other": "#c7c7c7"}
+    )
+    return fig
+
+def create_feedback_chart(counts, by, title):
+    """
+    Create a feedback match count chart
+    
+    Args:
+        counts (pd.DataFrame): Output of feedback_search.FeedbackIndex.counts()
+        by (str): Column the matches are counted per
+        title (str): Chart title
+        
+    Returns:
+        plotly.graph_objects.Figure: Matches per value, split by field
+    """
+    if counts.empty:
+        return None
+    
+    fields = [c for c in counts.columns if c not in (by, "total")]
+    long = counts.melt(id_vars=[by], value_vars=fields, var_name="Field", value_name="Matches")
+    
+    fig = px.bar(
+        long,
+        x="Matches",
+        y=by,
+        color="Field",
+        orientation="h",
+        title=title,
+        labels={by: by.replace("_", " ")},
+        category_orders={by: counts[by].tolist()},
+        color_discrete_map={"Feedback": "#1f77b4", "Competitor_Feedback": "#ff7f0e"}
+    )
+    fig.update_layout(height=max(300, 28 * len(counts) + 120))
+    return fig
+
+def create_forecast_chart(frame, title, y_label):
+    """
+    Create an interactive forecast chart from a stored forecast frame
+    
+    Args:
+        frame (pd.DataFrame): Columns ds, yhat, yhat_lower, yhat_upper, y
+        title (str): Chart title
+        y_label (str): Y-axis label
+        
+    Returns:
+        plotly.graph_objects.Figure: Actuals, forecast and uncertainty band
+    """
+    last_actual = frame.loc[frame["y"].notna(), "ds"].max()
+    future = frame[frame["ds"] >= last_actual]
+    
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=pd.concat([future["ds"], future["ds"][::-1]]),
+        y=pd.concat([future["yhat_upper"], future["yhat_lower"][::-1]]),
+        fill="toself",
+        fillcolor="rgba(255, 127, 14, 0.2)",
+        line={"width": 0},
+        hoverinfo="skip",
+        name="Uncertainty"
+    ))
+    fig.add_trace(go.Scatter(
+        x=frame["ds"], y=frame["y"], mode="lines+markers", name="Actual", line={"color": "#1f77b4"}
+    ))
+    fig.add_trace(go.Scatter(
+        x=future["ds"], y=future["yhat"], mode="lines", name="Forecast", line={"color": "#ff7f0e", "dash": "dash"}
+    ))
+    fig.add_vline(x=last_actual, line_dash="dot", line_color="gray")
+    fig.update_layout(title=title, xaxis_title="Month", yaxis_title=y_label, hovermode="x unified")
+    return fig
+
+def create_scenario_chart(frame, title):
+    """
+    Create a what-if chart: actuals, baseline forecast and scenario forecast
+    
+    Args:
+        frame (pd.DataFrame): Rows of scenarios.Scenarios.frame(): ds, y,
+            yhat and scenario
+        title (str): Chart title
+        
+    Returns:
+        plotly.graph_objects.Figure: Actual revenue with both forecasts
+    """
+    last_actual = frame.loc[frame["y"].notna(), "ds"].max()
+    future = frame[frame["ds"] >= last_actual]
+    
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=frame["ds"], y=frame["y"], mode="lines+markers", name="Actual", line={"color": "#1f77b4"}
+    ))
+    fig.add_trace(go.Scatter(
+        x=future["ds"], y=future["yhat"], mode="lines", name="Baseline", line={"color": "gray", "dash": "dash"}
+    ))
+    fig.add_trace(go.Scatter(
+        x=future["ds"], y=future["scenario"], mode="lines+markers", name="Scenario",
+        line={"color": "#ff7f0e", "width": 3}
+    ))
+    fig.add_vline(x=last_actual, line_dash="dot", line_color="gray")
+    fig.update_layout(title=title, xaxis_title="Month", yaxis_title="Revenue ($)", hovermode="x unified")
+    return fig
+
+def create_promotion_lift_chart(lifts, label, title):
+    """
+    Create a lift chart with confidence intervals from stored promotion lifts
+    
+    Args:
+        lifts (pd.DataFrame): Rows of promotions.estimate() for one level
+            and metric, with a group column naming each bar
+        label (str): Display label of the metric
+        title (str): Chart title
+        
+    Returns:
+        plotly.graph_objects.Figure: One bar per group, Apple highlighted
+    """
+    colors = np.where(lifts["group"].str.contains("Apple"), "#ff7f0e", "#1f77b4")
+    fig = go.Figure(go.Bar(
+        x=lifts["group"],
+        y=lifts["lift"],
+        marker_color=colors,
+        error_y={
+            "type": "data",
+            "symmetric": False,
+            "array": lifts["lift_upper"] - lifts["lift"],
+            "arrayminus": lifts["lift"] - lifts["lift_lower"],
+        },
+        customdata=np.column_stack([lifts["lift_pct"], lifts["cells"]]),
+        hovertemplate="%{x}<br>Lift: %{y:,.3f} (%{customdata[0]:+.1f}%)<br>Cells compared: %{customdata[1]}<extra></extra>",
+    ))
+    fig.add_hline(y=0, line_color="gray")
+    fig.update_layout(title=title, xaxis_title=None, yaxis_title=f"Lift in {label.lower()}", showlegend=False)
+    return fig
@@ -0,0 +1,332 @@
+"""
+Customer feature store
+
+One row per Customer_ID with recency/frequency/monetary, discount share,
+brand loyalty, rating and sentiment mix, for segmentation, repeat-customer
+prediction and campaign targeting to join against instead of regrouping
+raw transactions.
+
+The store keeps additive per-customer state (order and discount counts,
+revenue, first and last purchase, sentiment counts) plus orders per
+(Customer_ID, Brand). A transaction is simply a customer state with one
+order, so adding new rows is the same groupby as building from scratch:
+concatenate and re-aggregate. Features are derived from that state, and
+all three tables are zstd-compressed Parquet, so a job reading a few
+feature columns only reads those columns:
+
+    python customer_features.py Walmart_customer_fixed.csv --rebuild
+    python customer_features.py new_rows.csv        # add a batch of new rows
+
+New rows are deduplicated against every row already in the store (see
+dedup.py) and validated (see validation.py) as the dashboard's loads are.
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import dedup
+import validation
+from instrumentation import span
+
+STORE_DIR = os.path.join(".pipeline", "customers")
+
+# Columns the store reads from the transactions
+SOURCE_COLUMNS = ("Customer_ID", "Purchase_Date", "Purchase_Amount", "Discount_Applied", "Brand",
+                  "Rating", "Feedback", "Age", "Gender")
+
+# Feedback -> sentiment; anything else counts as neutral
+SENTIMENT = {
+    "Durable product": "positive",
+    "Satisfied customer": "positive",
+    "Value for money (positive)": "positive",
+    "Slow delivery": "negative",
+    "Battery drains fast": "negative",
+    "Damaged item": "negative",
+    "Usability issue": "negative",
+    "Low quality": "negative",
+    "Heating problem": "negative",
+    "Packaging issue": "negative",
+}
+SENTIMENTS = ("positive", "negative", "neutral")
+
+# state column -> how two states of the same customer combine; age and
+# gender are taken from the latest purchase
+STATE_AGGREGATIONS = {
+    "orders": "sum",
+    "revenue": "sum",
+    "discounted": "sum",
+    "rating_sum": "sum",
+    "rated": "sum",
+    **{sentiment: "sum" for sentiment in SENTIMENTS},
+    "first_purchase": "min",
+    "last_purchase": "max",
+    "age": "last",
+    "gender": "last",
+}
+
+FEATURE_COLUMNS = ("recency_days", "frequency", "monetary", "avg_order_value", "tenure_days", "discount_share",
+                   "brands", "top_brand", "brand_loyalty", "avg_rating", "positive_share", "negative_share",
+                   "neutral_share", "age", "gender")
+
+def transaction_state(df):
+    """
+    Turn transactions into one-order customer states
+
+    Args:
+        df (pd.DataFrame): Rows holding SOURCE_COLUMNS, as read from the CSV
+
+    Returns:
+        tuple: (state, brands) frames with one row per transaction, ready
+            for combine()
+    """
+    df = df[df["Customer_ID"].notna()]
+    dates = pd.to_datetime(df["Purchase_Date"], errors="coerce")
+    rating = pd.to_numeric(df["Rating"], errors="coerce")
+    sentiment = df["Feedback"].map(SENTIMENT).fillna("neutral").to_numpy()
+
+    state = pd.DataFrame({
+        "Customer_ID": df["Customer_ID"].astype(str).to_numpy(),
+        "orders": np.ones(len(df), dtype=np.int64),
+        # Missing amounts count as 1, as in utils.load_and_clean_data
+        "revenue": pd.to_numeric(df["Purchase_Amount"], errors="coerce").fillna(1).to_numpy(),
+        "discounted": (df["Discount_Applied"] == "Yes").to_numpy(dtype=np.int64),
+        "rating_sum": rating.fillna(0).to_numpy(),
+        "rated": rating.notna().to_numpy(dtype=np.int64),
+        **{name: (sentiment == name).astype(np.int64) for name in SENTIMENTS},
+        "first_purchase": dates.to_numpy(),
+        "last_purchase": dates.to_numpy(),
+        "age": pd.to_numeric(df["Age"], errors="coerce").to_numpy(),
+        "gender": df["Gender"].astype(object).to_numpy(),
+    })
+    brands = pd.DataFrame({
+        "Customer_ID": state["Customer_ID"],
+        "Brand": df["Brand"].astype(str).to_numpy(),
+        "orders": state["orders"],
+    })
+    return state, brands
+
+def combine(states, brand_orders):
+    """
+    Combine customer states into one row per customer
+
+    Args:
+        states (list): State frames (from transaction_state() or a store)
+        brand_orders (list): Matching (Customer_ID, Brand, orders) frames
+
+    Returns:
+        tuple: (state, brands) with one row per customer and per
+            (customer, brand)
+    """
+    state = pd.concat(states, ignore_index=True)
+    # Sorting by last purchase makes "last" pick each customer's latest age
+    state = state.sort_values("last_purchase", kind="stable", na_position="first")
+    # Group on integer codes: grouping on the ID strings sorts them, which
+    # costs more than every aggregation together
+    codes, ids = pd.factorize(state["Customer_ID"])
+    state = state.drop(columns="Customer_ID").groupby(codes).agg(STATE_AGGREGATIONS)
+    state.insert(0, "Customer_ID", ids[state.index])
+
+    brands = pd.concat(brand_orders, ignore_index=True)
+    customer_codes, ids = pd.factorize(brands["Customer_ID"])
+    brand_codes, names = pd.factorize(brands["Brand"])
+    pairs = customer_codes.astype(np.int64) * len(names) + brand_codes
+    orders = brands["orders"].groupby(pairs).sum()
+    brands = pd.DataFrame({
+        "Customer_ID": ids[orders.index // len(names)],
+        "Brand": names[orders.index % len(names)],
+        "orders": orders.to_numpy(),
+    })
+    return state.reset_index(drop=True), brands
+
+def derive_features(state, brands, as_of=None):
+    """
+    Derive the customer features from the combined state
+
+    Args:
+        state (pd.DataFrame): Customer state from combine()
+        brands (pd.DataFrame): Orders per (Customer_ID, Brand) from combine()
+        as_of (pd.Timestamp): Date recency is measured from, defaults to the
+            latest purchase in the store
+
+    Returns:
+        pd.DataFrame: FEATURE_COLUMNS indexed by Customer_ID
+    """
+    state = state.set_index("Customer_ID")
+    as_of = state["last_purchase"].max() if as_of is None else pd.Timestamp(as_of)
+    orders = state["orders"]
+
+    # Each customer's most bought brand (the first one listed on a tie)
+    by_customer = brands["orders"].groupby(state.index.get_indexer(brands["Customer_ID"]))
+    top = brands.iloc[by_customer.idxmax().to_numpy()].set_index("Customer_ID").reindex(state.index)
+    sentiments = {f"{name}_share": state[name] / orders for name in SENTIMENTS}
+
+    return pd.DataFrame({
+        "recency_days": (as_of - state["last_purchase"]).dt.days,
+        "frequency": orders,
+        "monetary": state["revenue"],
+        "avg_order_value": state["revenue"] / orders,
+        "tenure_days": (state["last_purchase"] - state["first_purchase"]).dt.days,
+        "discount_share": state["discounted"] / orders,
+        "brands": by_customer.size().to_numpy(),
+        "top_brand": top["Brand"],
+        "brand_loyalty": top["orders"] / orders,
+        "avg_rating": state["rating_sum"] / state["rated"].where(state["rated"] > 0),
+        **sentiments,
+        "age": state["age"],
+        "gender": state["gender"],
+    }, index=state.index)
+
+class CustomerStore:
+    """
+    Customer state, brand orders and features persisted under one directory
+
+    Args:
+        store_dir (str): Directory holding state.parquet, brands.parquet,
+            features.parquet and seen.npy (the transactions already added)
+        empty (bool): Ignore what is on disk, so the next save() replaces it
+    """
+
+    def __init__(self, store_dir=STORE_DIR, empty=False):
+        self.store_dir = store_dir
+        self.seen = dedup.SeenSet(self._path("seen.npy"))
+        state_path, brands_path = self._path("state.parquet"), self._path("brands.parquet")
+        self._states, self._brand_orders = [], []
+        if not empty and os.path.exists(state_path) and os.path.exists(brands_path):
+            self._states.append(pd.read_parquet(state_path))
+            self._brand_orders.append(pd.read_parquet(brands_path))
+        elif empty:
+            self.seen.fingerprints = self.seen.fingerprints[:0]
+
+    def _path(self, name):
+        return os.path.join(self.store_dir, name)
+
+    def __len__(self):
+        state = self.state
+        return 0 if state is None else len(state)
+
+    @property
+    def state(self):
+        """Customer state, one row per customer (None while the store is empty)"""
+        self._combine()
+        return self._states[0] if self._states else None
+
+    @property
+    def brands(self):
+        """Orders per (Customer_ID, Brand)"""
+        self._combine()
+        return self._brand_orders[0] if self._brand_orders else None
+
+    def _combine(self):
+        # Batches are combined when read rather than as they are added, so
+        # adding many chunks re-aggregates the whole store only once
+        if len(self._states) > 1:
+            state, brands = combine(self._states, self._brand_orders)
+            self._states, self._brand_orders = [state], [brands]
+
+    def add(self, df):
+        """
+        Fold a batch of transactions into the store
+
+        Args:
+            df (pd.DataFrame): Rows as read from the CSV; rows already in
+                the store or failing a validation error rule are skipped
+
+        Returns:
+            int: Rows added
+        """
+        df, _ = dedup.drop_duplicates(df, seen=self.seen, remember=False)
+        df, _ = validation.apply(df)
+        self.seen.add(dedup.fingerprint(df))
+        if not len(df):
+            return 0
+
+        # Combining the batch on its own first keeps the pending state small
+        state, brands = transaction_state(df)
+        state, brands = combine([state], [brands])
+        self._states.append(state)
+        self._brand_orders.append(brands)
+        return len(df)
+
+    def features(self, as_of=None):
+        """Customer features for the current state (see derive_features())"""
+        if self.state is None:
+            return pd.DataFrame(columns=FEATURE_COLUMNS)
+        return derive_features(self.state, self.brands, as_of)
+
+    def save(self):
+        """Write the state, brand orders, features and seen-set, each swapped into place"""
+        os.makedirs(self.store_dir, exist_ok=True)
+        tables = {"state.parquet": self.state, "brands.parquet": self.brands,
+                  "features.parquet": self.features().reset_index()}
+        with span("save", artifact=self.store_dir):
+            for name, frame in tables.items():
+                path = self._path(name)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                frame.to_parquet(tmp_path, index=False, compression="zstd")
+                os.replace(tmp_path, path)
+            self.seen.save()
+
+def build(file_path, store_dir=STORE_DIR, rebuild=False):
+    """
+    Add a CSV of transactions to a store, a chunk at a time
+
+    Args:
+        file_path (str): CSV to read
+        store_dir (str): Store directory
+        rebuild (bool): Start from an empty store instead of adding to it
+
+    Returns:
+        CustomerStore: The saved store
+    """
+    import sketches
+
+    store = CustomerStore(store_dir, empty=rebuild)
+    with span("customers", file=file_path) as info:
+        added = 0
+        for chunk in sketches.read_chunks(file_path, set(SOURCE_COLUMNS) | set(dedup.DEFAULT_KEY)):
+            added += store.add(chunk)
+        store.save()
+        info.update(rows_added=added, customers=len(store))
+    return store
+
+def load_features(columns=None, store_dir=STORE_DIR):
+    """
+    Read customer features from a store
+
+    Args:
+        columns (list): Feature columns to read, defaults to all of them
+        store_dir (str): Store directory
+
+    Returns:
+        pd.DataFrame: Features indexed by Customer_ID, or None if the store
+            has not been built
+    """
+    path = os.path.join(store_dir, "features.parquet")
+    if not os.path.exists(path):
+        return None
+    columns = ["Customer_ID"] + list(columns) if columns is not None else None
+    return pd.read_parquet(path, columns=columns).set_index("Customer_ID")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the customer feature store")
+    parser.add_argument("csv", help="transactions to add")
+    parser.add_argument("--store", default=STORE_DIR, help="store directory")
+    parser.add_argument("--rebuild", action="store_true", help="start from an empty store")
+    args = parser.parse_args()
+
+    before = len(CustomerStore(args.store)) if not args.rebuild else 0
+    store = build(args.csv, args.store, args.rebuild)
+    features = store.features()
+
+    print(f"👥 {len(store):,} customers in {args.store} ({len(store) - before:+,})")
+    print(f"🔁 {(features['frequency'] > 1).mean():.1%} bought more than once; "
+          f"median spend {features['monetary'].median():,.2f}")
+    print(f"🏷️  {features['discount_share'].mean():.1%} of orders discounted on average; "
+          f"mean brand loyalty {features['brand_loyalty'].mean():.2f}")
+    print(f"💬 Sentiment mix: " + ", ".join(f"{name} {features[f'{name}_share'].mean():.1%}" for name in SENTIMENTS))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Duplicate detection on a natural transaction key
+
+A transaction is identified by a key of a few columns (by default
+Product_ID, Customer_ID, Purchase_Date and Purchase_Amount) rather than by
+the whole row. The key columns are hashed into one 64-bit fingerprint per
+row, so finding duplicates compares integers instead of every cell.
+
+Fingerprints are taken from the values as read from the CSV, before any type
+conversion, so they stay stable from one load to the next. That lets a
+SeenSet, persisted as a sorted .npy array, dedupe an incremental load
+against everything loaded before without reloading the history:
+
+    python dedup.py new_rows.csv --seen data/seen_transactions.npy --out new_rows_deduped.csv
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.util import hash_array
+
+from instrumentation import span
+
+DEFAULT_KEY = ("Product_ID", "Customer_ID", "Purchase_Date", "Purchase_Amount")
+
+# Rows sampled to decide whether a string column is worth factorizing
+CATEGORIZE_SAMPLE = 10_000
+
+def fingerprint(df, key=DEFAULT_KEY):
+    """
+    Hash the key columns of each row into a 64-bit fingerprint
+
+    Args:
+        df (pd.DataFrame): Rows to fingerprint
+        key (tuple): Columns identifying a transaction
+
+    Returns:
+        np.ndarray: uint64 fingerprint per row
+    """
+    missing = [column for column in key if column not in df.columns]
+    if missing:
+        raise KeyError(f"Transaction key columns missing from the data: {missing}")
+
+    # Same mixing as pd.util.hash_pandas_object(df[key], index=False), which
+    # cannot pick categorize per column
+    hashes = [_hash_column(df[column].to_numpy()) for column in key]
+    out = np.full(len(df), 0x345678, dtype=np.uint64)
+    mult = np.uint64(1000003)
+    for i, column_hash in enumerate(hashes):
+        inverse = len(hashes) - i
+        out ^= column_hash
+        out *= mult
+        mult += np.uint64(82520 + inverse + inverse)
+    return out + np.uint64(97531)
+
+def _hash_column(values):
+    """
+    Hash one column's values
+
+    Factorizing strings before hashing pays off for repetitive columns such
+    as Purchase_Date but doubles the work for near-unique ones such as
+    Customer_ID, so it is decided from an evenly spread sample. Both ways
+    give the same hashes.
+    """
+    categorize = True
+    if values.dtype == object and len(values) > CATEGORIZE_SAMPLE:
+        sample = values[::len(values) // CATEGORIZE_SAMPLE]
+        categorize = len(pd.unique(sample)) < 0.5 * len(sample)
+    return hash_array(values, categorize=categorize)
+
+class SeenSet:
+    """
+    Fingerprints of every transaction loaded so far
+
+    Kept as a sorted uint64 array, so membership is a binary search and the
+    file on disk is 8 bytes per transaction.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        if path and os.path.exists(path):
+            self.fingerprints = np.load(path)
+        else:
+            self.fingerprints = np.empty(0, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def contains(self, fingerprints):
+        """
+        Check fingerprints against the set
+
+        Returns:
+            np.ndarray: Boolean mask, True where a fingerprint was seen before
+        """
+        fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        if not len(self.fingerprints):
+            return np.zeros(len(fingerprints), dtype=bool)
+        positions = np.searchsorted(self.fingerprints, fingerprints)
+        positions[positions == len(self.fingerprints)] = 0
+        return self.fingerprints[positions] == fingerprints
+
+    def add(self, fingerprints):
+        """Add fingerprints to the set"""
+        # Insert the new ones into the sorted array rather than re-sorting
+        # it, which keeps adding chunk after chunk linear in the set size
+        new = np.unique(np.asarray(fingerprints, dtype=np.uint64))
+        new = new[~self.contains(new)]
+        self.fingerprints = np.insert(self.fingerprints, np.searchsorted(self.fingerprints, new), new)
+
+    def save(self, path=None):
+        """Write the set to disk, swapping the file into place"""
+        path = path or self.path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, self.fingerprints)
+        os.replace(tmp_path, path)
+
+def drop_duplicates(df, key=DEFAULT_KEY, seen=None, remember=True):
+    """
+    Drop repeated transactions, keeping the first occurrence
+
+    Args:
+        df (pd.DataFrame): Rows as read from the CSV
+        key (tuple): Columns identifying a transaction
+        seen (SeenSet): Transactions from earlier loads; rows found in it are
+            dropped too, and the kept rows are added to it (call
+            ``seen.save()`` to persist them)
+        remember (bool): Add the kept rows to seen; pass False when later
+            checks may still reject them, and add the fingerprints of the
+            rows that pass with ``seen.add(fingerprint(df))``
+
+    Returns:
+        tuple: (deduplicated DataFrame, report dict) where the report holds
+            the key, row counts in and out, how many rows were removed as
+            repeats within this load and as seen in earlier loads, and a
+            ``removed`` DataFrame with the key columns of the removed rows
+    """
+    with span("dedupe", rows=len(df)) as info:
+        fingerprints = fingerprint(df, key)
+        within_load = pd.Series(fingerprints).duplicated().to_numpy()
+        seen_before = seen.contains(fingerprints) & ~within_load if seen is not None else np.zeros(len(df), dtype=bool)
+        removed = within_load | seen_before
+
+        if seen is not None and remember:
+            seen.add(fingerprints[~removed])
+
+        report = {
+            "key": list(key),
+            "rows_in": len(df),
+            "rows_out": int((~removed).sum()),
+            "removed_within_load": int(within_load.sum()),
+            "removed_seen_before": int(seen_before.sum()),
+            "removed": df.loc[removed, list(key)].assign(
+                Fingerprint=fingerprints[removed],
+                Reason=np.where(within_load[removed], "repeated in this load", "seen in an earlier load")
+            ),
+        }
+        info.update(removed_within_load=report["removed_within_load"], removed_seen_before=report["removed_seen_before"])
+        return (df[~removed] if removed.any() else df), report
+
+def format_report(report):
+    """Describe a drop_duplicates() report in one line"""
+    return (f"{report['rows_in']:,} rows -> {report['rows_out']:,}: removed "
+            f"{report['removed_within_load']:,} repeated in this load and "
+            f"{report['removed_seen_before']:,} seen in earlier loads "
+            f"(key: {', '.join(report['key'])})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicate a CSV batch on its transaction key")
+    parser.add_argument("csv", help="batch of rows to load")
+    parser.add_argument("--seen", help="persisted seen-set (.npy) to dedupe against and update")
+    parser.add_argument("--key", nargs="+", default=list(DEFAULT_KEY), help="transaction key columns")
+    parser.add_argument("--out", help="write the kept rows to this CSV")
+    parser.add_argument("--removed", help="write the removed rows' keys to this CSV")
+    args = parser.parse_args()
+
+    seen = SeenSet(args.seen) if args.seen else None
+    df, report = drop_duplicates(pd.read_csv(args.csv, low_memory=False), tuple(args.key), seen)
+    print(f"🧹 {format_report(report)}")
+
+    if args.out:
+        df.to_csv(args.out, index=False)
+        print(f"💾 Kept rows saved to: {args.out}")
+    if args.removed:
+        report["removed"].to_csv(args.removed, index=False)
+        print(f"💾 Removed rows saved to: {args.removed}")
+    if seen is not None:
+        seen.save()
+        print(f"📚 Seen-set now holds {len(seen):,} transactions: {args.seen}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Demographic groups and the demographics cube
+
+The data records each customer's Age and Gender and each product's Brand,
+while the demographic charts and the campaign analyses work with groups.
+derive() adds them as ordered categoricals, each computed once per distinct
+value rather than once per row:
+
+- Age_Group: the dashboard's age groups (filters.AGE_GROUPS)
+- Brand_Group: "Apple" or "Other"
+- Gender_Group: "Male", "Female" or "Unknown"
+
+utils.load_and_clean_data() derives whichever of them a caller lists, so
+they can be asked for like stored columns. The pipeline also keeps a cube of
+transactions and revenue per Age_Group x Gender_Group x Brand x Category in
+.pipeline/demographics.parquet, a few thousand rows that the demographic
+charts read instead of the transactions:
+
+    python demographics.py
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+
+# derived column -> source column
+DERIVED = {"Age_Group": "Age", "Brand_Group": "Brand", "Gender_Group": "Gender"}
+BRAND_GROUPS = ("Apple", "Other")
+GENDER_GROUPS = ("Male", "Female", "Unknown")
+CUBE_KEYS = ("Age_Group", "Gender_Group", "Brand", "Category")
+
+CUBE_FILE = os.path.join(".pipeline", "demographics.parquet")
+
+def sources(columns):
+    """Source columns needed to derive the derived columns among columns"""
+    return {DERIVED[column] for column in columns if column in DERIVED}
+
+def age_groups(age):
+    """Age_Group of each age; ages outside every group (or missing) are NaN"""
+    from filters import AGE_GROUPS
+
+    lows = np.array([low for low, _ in AGE_GROUPS.values()], dtype=float)
+    highs = np.array([np.inf if high is None else high for _, high in AGE_GROUPS.values()])
+    values = pd.to_numeric(pd.Series(age), errors="coerce").to_numpy(dtype=float)
+    codes = np.searchsorted(lows, values, side="right") - 1
+    outside = (codes < 0) | np.isnan(values) | (values > highs[np.maximum(codes, 0)])
+    codes[outside] = -1
+    return pd.Categorical.from_codes(codes, categories=list(AGE_GROUPS), ordered=True)
+
+def _grouped(values, label, categories):
+    """Label each distinct value once and spread the labels over the rows"""
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+    labels = np.array([categories.index(label(value)) for value in uniques] + [categories.index(label(None))])
+    # A missing value has code -1, which picks the appended label of None
+    return pd.Categorical.from_codes(labels[codes], categories=list(categories), ordered=True)
+
+def brand_groups(brand):
+    """Brand_Group of each brand: "Apple" or "Other" (missing brands too)"""
+    return _grouped(brand, lambda b: "Apple" if isinstance(b, str) and b.strip().lower() == "apple" else "Other",
+                    BRAND_GROUPS)
+
+def gender_groups(gender):
+    """Gender_Group of each gender: "Male", "Female" or "Unknown" """
+    def label(g):
+        g = g.strip().capitalize() if isinstance(g, str) else None
+        return g if g in GENDER_GROUPS[:2] else "Unknown"
+
+    return _grouped(gender, label, GENDER_GROUPS)
+
+DERIVERS = {"Age_Group": age_groups, "Brand_Group": brand_groups, "Gender_Group": gender_groups}
+
+def derive(df, columns=None):
+    """
+    Add derived demographic columns
+
+    Args:
+        df (pd.DataFrame): Transactions
+        columns (list): Derived columns to add, defaults to every one whose
+            source column df has
+
+    Returns:
+        pd.DataFrame: df with the derived columns (categoricals)
+    """
+    columns = [c for c in (columns or DERIVED) if c in DERIVED and DERIVED[c] in df.columns]
+    if not columns:
+        return df
+    return df.assign(**{column: DERIVERS[column](df[DERIVED[column]].to_numpy()) for column in columns})
+
+def cube(df):
+    """
+    Transactions and revenue per Age_Group x Gender_Group x Brand x Category
+
+    Args:
+        df (pd.DataFrame): Transactions with Age, Gender, Brand, Category and
+            Purchase_Amount (or the derived groups already)
+
+    Returns:
+        pd.DataFrame: One row per combination with any transactions: the
+            CUBE_KEYS, Brand_Group, transactions and revenue
+    """
+    df = derive(df, [c for c in ("Age_Group", "Gender_Group") if c not in df.columns])
+    with span("demographics_cube", rows=len(df)):
+        table = df.groupby(list(CUBE_KEYS), observed=True, sort=True).agg(
+            transactions=("Purchase_Amount", "size"), revenue=("Purchase_Amount", "sum"),
+        ).reset_index()
+    table.insert(3, "Brand_Group", brand_groups(table["Brand"].to_numpy()))
+    return table
+
+def build(data_file="Walmart_customer_fixed.csv"):
+    """Load the data and build its demographics cube"""
+    import utils
+
+    df, _ = utils.load_and_clean_data(data_file, columns=["Age_Group", "Gender_Group", "Brand", "Category",
+                                                          "Purchase_Amount"])
+    if df is None:
+        raise FileNotFoundError(f"Could not load {data_file}")
+    return cube(df)
+
+def save(table, path=CUBE_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    table.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def load(path=CUBE_FILE):
+    """Read the stored cube, or None if it has not been built"""
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Age_Group x Gender x Brand x Category cube")
+    parser.add_argument("--data", default="Walmart_customer_fixed.csv", help="CSV to summarize")
+    args = parser.parse_args()
+
+    table = build(args.data)
+    save(table)
+
+    print(f"👥 {len(table):,} demographic cells from {table['transactions'].sum():,} transactions")
+    apple = table[table["Brand_Group"] == "Apple"].groupby("Age_Group", observed=True)["revenue"].sum()
+    print("🍎 Apple revenue by age group:\n" + apple.map("{:,.2f}".format).to_string())
+    print(f"💾 Cube saved to: {CUBE_FILE}")
+
+if __name__ == "__main__":
+    main()
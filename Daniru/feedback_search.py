@@ -0,0 +1,335 @@
+"""
+Inverted index and search over Feedback and Competitor_Feedback
+
+Every transaction gets a row ID in the order it was added. For each text
+field, each term maps to a posting list: the sorted IDs of the rows whose
+text contains it. A keyword query intersects the posting lists of its terms,
+and a quoted phrase is checked against the distinct texts (a few dozen, not
+one per row), so questions like "which models get 'damaged item'" are a few
+array operations instead of a str.contains scan. Each row also keeps its
+Brand, Model and Product_Name, so matches can be counted per product without
+going back to the data.
+
+Texts are tokenized once per distinct string. New transactions are added
+without rebuilding: they are deduplicated against every row already indexed
+(see dedup.py), validated, and their IDs appended to the posting lists.
+
+    python feedback_search.py                        # top terms
+    python feedback_search.py '"damaged item"' --by Model
+    python feedback_search.py --add new_rows.csv     # index a batch of rows
+"""
+
+import argparse
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+import dedup
+import validation
+from instrumentation import span
+
+FIELDS = ("Feedback", "Competitor_Feedback")
+ATTRIBUTES = ("Brand", "Model", "Product_Name")
+SOURCE_COLUMNS = FIELDS + ATTRIBUTES
+INDEX_DIR = os.path.join(".pipeline", "feedback")
+
+TOKEN = re.compile(r"[a-z0-9]+")
+# A quoted phrase or a single term
+CLAUSE = re.compile(r'"([^"]*)"|(\S+)')
+
+def tokenize(text):
+    """Lower-cased alphanumeric terms of a text"""
+    return TOKEN.findall(text.lower()) if isinstance(text, str) else []
+
+def parse(query):
+    """
+    Split a query into clauses, every one of which a match must satisfy
+
+    Returns:
+        list: Term lists; a quoted phrase is one clause of several terms
+            that must appear in that order, every other word its own clause
+    """
+    clauses = []
+    for phrase, word in CLAUSE.findall(query):
+        terms = tokenize(phrase if phrase else word)
+        if phrase:
+            clauses.append(terms)
+        else:
+            clauses.extend([term] for term in terms)
+    return [terms for terms in clauses if terms]
+
+def _contains(tokens, phrase):
+    n = len(phrase)
+    return any(tokens[i:i + n] == phrase for i in range(len(tokens) - n + 1))
+
+class FeedbackIndex:
+    """
+    Posting lists of the feedback terms, persisted under one directory
+
+    Args:
+        index_dir (str): Directory holding index.npz and seen.npy (the
+            transactions already indexed)
+        empty (bool): Ignore what is on disk, so the next save() replaces it
+    """
+
+    def __init__(self, index_dir=INDEX_DIR, empty=False):
+        self.index_dir = index_dir
+        self.seen = dedup.SeenSet(self._path("seen.npy"))
+        self.texts, self.tokens = [], []
+        self.vocab = {name: [] for name in ATTRIBUTES}
+        self.codes = {name: [] for name in SOURCE_COLUMNS}
+        self.postings = {field: {} for field in FIELDS}
+        self.size = 0
+        if empty:
+            self.seen.fingerprints = self.seen.fingerprints[:0]
+        elif os.path.exists(self._path("index.npz")):
+            self._read()
+
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    def __len__(self):
+        return self.size
+
+    def _lookup(self, values, labels, table):
+        """Code per value, adding unseen values to labels (and table)"""
+        codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+        table = table if table is not None else {label: i for i, label in enumerate(labels)}
+        mapping = np.empty(len(uniques) + 1, dtype=np.int32)
+        mapping[-1] = -1
+        for i, value in enumerate(uniques):
+            if value not in table:
+                table[value] = len(labels)
+                labels.append(value)
+            mapping[i] = table[value]
+        # A missing value has code -1, which picks the appended -1
+        return mapping[codes]
+
+    def add(self, df):
+        """
+        Index a batch of transactions
+
+        Args:
+            df (pd.DataFrame): Rows as read from the CSV; rows already
+                indexed or failing a validation error rule are skipped
+
+        Returns:
+            int: Rows added
+        """
+        df, _ = dedup.drop_duplicates(df, seen=self.seen, remember=False)
+        df, _ = validation.apply(df)
+        self.seen.add(dedup.fingerprint(df))
+        if not len(df):
+            return 0
+
+        with span("index_feedback", rows=len(df)):
+            text_ids = {text: i for i, text in enumerate(self.texts)}
+            for name in ATTRIBUTES:
+                self.codes[name].append(self._lookup(df[name].to_numpy(), self.vocab[name], None))
+            for field in FIELDS:
+                known = len(self.texts)
+                codes = self._lookup(df[field].to_numpy(), self.texts, text_ids)
+                self.tokens += [tokenize(text) for text in self.texts[known:]]
+                self.codes[field].append(codes)
+
+                # Rows of each distinct text, then each text's rows go to its terms
+                present = codes >= 0
+                order = np.argsort(codes[present], kind="stable")
+                rows = (np.flatnonzero(present)[order] + self.size).astype(np.int32)
+                texts, starts = np.unique(codes[present][order], return_index=True)
+                for text, rows_of_text in zip(texts, np.split(rows, starts[1:])):
+                    for term in set(self.tokens[text]):
+                        self.postings[field].setdefault(term, []).append(rows_of_text)
+        self.size += len(df)
+        return len(df)
+
+    def _combine(self):
+        # Batches are combined when read rather than as they are added
+        for name, parts in self.codes.items():
+            if len(parts) > 1:
+                self.codes[name] = [np.concatenate(parts)]
+        for postings in self.postings.values():
+            for term, parts in postings.items():
+                if len(parts) > 1:
+                    postings[term] = [np.sort(np.concatenate(parts))]
+
+    def _column(self, name):
+        self._combine()
+        return self.codes[name][0] if self.codes[name] else np.empty(0, dtype=np.int32)
+
+    def posting(self, field, term):
+        """Sorted IDs of the rows whose field contains the term"""
+        self._combine()
+        parts = self.postings[field].get(term)
+        return parts[0] if parts else np.empty(0, dtype=np.int32)
+
+    def search(self, query, fields=FIELDS):
+        """
+        Rows matching every clause of a query
+
+        Args:
+            query (str): Terms and "quoted phrases", e.g. 'battery "damaged item"'
+            fields (tuple): Fields to search; each is matched on its own
+
+        Returns:
+            dict: Field -> sorted row IDs whose text matches
+        """
+        clauses = parse(query)
+        results = {}
+        for field in fields:
+            rows = None
+            for terms in clauses:
+                for term in terms:
+                    posting = self.posting(field, term)
+                    rows = posting if rows is None else np.intersect1d(rows, posting, assume_unique=True)
+                if len(terms) > 1 and len(rows):
+                    # Term order is checked on the distinct texts, not per row
+                    in_order = np.array([_contains(tokens, terms) for tokens in self.tokens] + [False])
+                    rows = rows[in_order[self._column(field)[rows]]]
+            results[field] = rows if rows is not None else np.empty(0, dtype=np.int32)
+        return results
+
+    def _labels(self, name, codes):
+        labels = np.array(self.vocab[name] + [None], dtype=object)
+        return labels[codes]
+
+    def matches(self, query, fields=FIELDS, limit=None):
+        """
+        Matching rows with their text and product
+
+        Returns:
+            pd.DataFrame: row, field, text and the ATTRIBUTES per match
+        """
+        texts = np.array(self.texts + [None], dtype=object)
+        frames = []
+        for field, rows in self.search(query, fields).items():
+            rows = rows[:limit] if limit else rows
+            frame = pd.DataFrame({"row": rows, "field": field, "text": texts[self._column(field)[rows]]})
+            for name in ATTRIBUTES:
+                frame[name] = self._labels(name, self._column(name)[rows])
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True)
+
+    def counts(self, query, by="Brand", fields=FIELDS):
+        """
+        Matching rows per Brand, Model or Product_Name
+
+        Returns:
+            pd.DataFrame: One row per value with matches: by, a column of
+                matches per field and total, most matches first
+        """
+        counts = {}
+        for field, rows in self.search(query, fields).items():
+            codes = self._column(by)[rows]
+            counts[field] = np.bincount(codes[codes >= 0], minlength=len(self.vocab[by]))
+        table = pd.DataFrame(counts, index=pd.Index(self.vocab[by], name=by))
+        table["total"] = table.sum(axis=1)
+        return table[table["total"] > 0].sort_values("total", ascending=False).reset_index()
+
+    def term_counts(self, fields=FIELDS):
+        """
+        Rows containing each term
+
+        Returns:
+            pd.DataFrame: term, a column of rows per field and total, most
+                frequent first
+        """
+        self._combine()
+        table = pd.DataFrame({field: pd.Series({term: len(parts[0]) for term, parts in self.postings[field].items()},
+                                               dtype=np.int64)
+                              for field in fields}).fillna(0).astype(np.int64)
+        table["total"] = table.sum(axis=1)
+        return table.rename_axis("term").sort_values("total", ascending=False).reset_index()
+
+    def save(self):
+        """Write the index and seen-set, each swapped into place"""
+        self._combine()
+        os.makedirs(self.index_dir, exist_ok=True)
+        arrays = {"size": np.array(self.size), "texts": np.array(self.texts, dtype=str)}
+        for name in ATTRIBUTES:
+            arrays[f"vocab_{name}"] = np.array(self.vocab[name], dtype=str)
+        for name in SOURCE_COLUMNS:
+            arrays[f"codes_{name}"] = self._column(name)
+        for field in FIELDS:
+            terms = sorted(self.postings[field])
+            lists = [self.postings[field][term][0] for term in terms]
+            arrays[f"terms_{field}"] = np.array(terms, dtype=str)
+            arrays[f"offsets_{field}"] = np.cumsum([0] + [len(rows) for rows in lists])
+            arrays[f"rows_{field}"] = np.concatenate(lists) if lists else np.empty(0, dtype=np.int32)
+        with span("save", artifact=self.index_dir):
+            path = self._path("index.npz")
+            tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez(tmp_path, **arrays)
+            os.replace(tmp_path, path)
+            self.seen.save()
+
+    def _read(self):
+        with np.load(self._path("index.npz")) as data:
+            self.size = int(data["size"])
+            self.texts = data["texts"].tolist()
+            self.tokens = [tokenize(text) for text in self.texts]
+            for name in ATTRIBUTES:
+                self.vocab[name] = data[f"vocab_{name}"].tolist()
+            for name in SOURCE_COLUMNS:
+                self.codes[name] = [data[f"codes_{name}"]]
+            for field in FIELDS:
+                rows, offsets = data[f"rows_{field}"], data[f"offsets_{field}"]
+                self.postings[field] = {term: [rows[start:end]] for term, start, end
+                                        in zip(data[f"terms_{field}"].tolist(), offsets[:-1], offsets[1:])}
+
+def build(file_path, index_dir=INDEX_DIR, rebuild=False):
+    """
+    Add a CSV of transactions to an index, a chunk at a time
+
+    Args:
+        file_path (str): CSV to read
+        index_dir (str): Index directory
+        rebuild (bool): Start from an empty index instead of adding to it
+
+    Returns:
+        FeedbackIndex: The saved index
+    """
+    import sketches
+
+    index = FeedbackIndex(index_dir, empty=rebuild)
+    with span("feedback_index", file=file_path) as info:
+        added = 0
+        for chunk in sketches.read_chunks(file_path, set(SOURCE_COLUMNS) | set(dedup.DEFAULT_KEY)):
+            added += index.add(chunk)
+        index.save()
+        info.update(rows_added=added, rows=len(index))
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description="Search Feedback and Competitor_Feedback")
+    parser.add_argument("query", nargs="?", default="", help='terms and "quoted phrases" to match')
+    parser.add_argument("--by", choices=ATTRIBUTES, default="Brand", help="count matches per this column")
+    parser.add_argument("--field", choices=FIELDS, nargs="+", default=list(FIELDS), help="fields to search")
+    parser.add_argument("--add", metavar="CSV", help="index the rows of this CSV (new rows only)")
+    parser.add_argument("--rebuild", metavar="CSV", help="index this CSV from scratch")
+    parser.add_argument("--index", default=INDEX_DIR, help="index directory")
+    args = parser.parse_args()
+
+    if args.rebuild or args.add:
+        before = 0 if args.rebuild else len(FeedbackIndex(args.index))
+        index = build(args.rebuild or args.add, args.index, rebuild=bool(args.rebuild))
+        print(f"🗂️ {len(index):,} rows indexed in {args.index} ({len(index) - before:+,})")
+    else:
+        index = FeedbackIndex(args.index)
+        if not len(index):
+            parser.error(f"no index in {args.index}; build one with --rebuild Walmart_customer_fixed.csv")
+
+    if not args.query:
+        print("🔤 Most frequent terms:\n" + index.term_counts(tuple(args.field)).head(15).to_string(index=False))
+        return
+
+    with span("search", query=args.query) as info:
+        counts = index.counts(args.query, args.by, tuple(args.field))
+        info.update(matches=int(counts["total"].sum()))
+    print(f"🔎 {counts['total'].sum():,} matches for {args.query}")
+    print(counts.head(15).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Feedback themes from cached text embeddings
+
+Feedback and Competitor_Feedback repeat the same few strings across many
+rows, so each distinct string is embedded once and its vector cached in a
+memory-mapped float16 array (.pipeline/feedback_themes/vectors.f16, with
+the texts, their row counts and themes in texts.parquet). A refresh only
+embeds strings the cache has not seen.
+
+Embeddings come from a small CPU sentence-embedding model when the optional
+sentence-transformers package is installed (MODEL, or APPLE_EMBEDDING_MODEL).
+Without it, texts are embedded as signed hashes of their character n-grams
+(a fixed random projection), which groups spellings and shared words rather
+than meaning but needs nothing beyond scikit-learn.
+
+The cached vectors are clustered into themes (average-linkage clustering on
+cosine distance, so the number of themes follows the data and a new kind of
+complaint becomes a new theme), and similar() finds the nearest texts to any
+text with one matrix product over the cache.
+
+    python feedback_themes.py                          # refresh and list themes
+    python feedback_themes.py --similar "Damaged item"
+"""
+
+import argparse
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from feedback_search import FIELDS
+from instrumentation import span
+
+MODEL = os.environ.get("APPLE_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+HASHING = "hashing"
+# Dimensions of the hashed n-gram embedding
+HASHING_DIM = 512
+# Largest cosine distance between two texts' themes for them to merge
+THEME_DISTANCE = 0.5
+# Texts clustered directly (pairwise distances); rarer ones join their nearest theme
+CLUSTER_MAX = 4_000
+NEIGHBORS = 10
+
+THEMES_DIR = os.path.join(".pipeline", "feedback_themes")
+
+def backend():
+    """The embedder to use: MODEL if sentence-transformers is installed, else HASHING"""
+    try:
+        import sentence_transformers  # noqa: F401
+    except ImportError:
+        return HASHING
+    return MODEL
+
+@lru_cache(maxsize=2)
+def _model(name):
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(name, device="cpu")
+
+def embed(texts, embedder=None):
+    """
+    Embed texts as unit vectors
+
+    Args:
+        texts (list): Strings to embed
+        embedder (str): A sentence-transformers model name or HASHING,
+            defaults to backend()
+
+    Returns:
+        np.ndarray: float32 array, one L2-normalized row per text
+    """
+    embedder = embedder or backend()
+    texts = [str(text) for text in texts]
+    with span("embed", texts=len(texts), embedder=embedder):
+        if embedder == HASHING:
+            from sklearn.feature_extraction.text import HashingVectorizer
+
+            # The hash is fixed, so a text embeds the same way in every process
+            hashed = HashingVectorizer(analyzer="char_wb", ngram_range=(3, 5), n_features=HASHING_DIM,
+                                       alternate_sign=True, norm=None).transform(texts)
+            vectors = hashed.toarray().astype(np.float32)
+        else:
+            vectors = _model(embedder).encode(texts, batch_size=64, convert_to_numpy=True).astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+def cluster(vectors, weights=None, distance=THEME_DISTANCE, limit=CLUSTER_MAX):
+    """
+    Group unit vectors into themes
+
+    Args:
+        vectors (np.ndarray): One unit vector per text
+        weights (np.ndarray): Rows per text; the limit most frequent texts
+            are clustered and every other one joins its nearest theme
+        distance (float): Largest cosine distance at which themes merge
+        limit (int): Texts clustered directly
+
+    Returns:
+        np.ndarray: Theme number per vector
+    """
+    from sklearn.cluster import AgglomerativeClustering
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) < 2:
+        return np.zeros(len(vectors), dtype=np.int64)
+    with span("cluster", texts=len(vectors)):
+        order = np.argsort(-weights, kind="stable") if weights is not None else np.arange(len(vectors))
+        head = order[:limit]
+        model = AgglomerativeClustering(n_clusters=None, distance_threshold=distance, metric="cosine",
+                                        linkage="average")
+        themes = np.empty(len(vectors), dtype=np.int64)
+        themes[head] = model.fit_predict(vectors[head])
+        rest = order[limit:]
+        if len(rest):
+            centroids = np.zeros((themes[head].max() + 1, vectors.shape[1]), dtype=np.float32)
+            np.add.at(centroids, themes[head], vectors[head])
+            themes[rest] = np.argmax(vectors[rest] @ centroids.T, axis=1)
+        return themes
+
+class ThemeCache:
+    """
+    Embeddings of every distinct feedback text, cached under one directory
+
+    Args:
+        themes_dir (str): Directory holding vectors.f16 (float16, one row
+            per text), texts.parquet (text, rows per field, theme) and
+            meta.json (embedder and dimensions)
+        embedder (str): Embedder for new texts, defaults to backend(); a
+            cache built by another embedder is discarded on update()
+    """
+
+    def __init__(self, themes_dir=THEMES_DIR, embedder=None):
+        self.themes_dir = themes_dir
+        self.embedder = embedder or backend()
+        self.texts = pd.DataFrame({"text": pd.Series(dtype=object), "theme": pd.Series(dtype=np.int64),
+                                   **{field: pd.Series(dtype=np.int64) for field in FIELDS}})
+        self.vectors = np.empty((0, 0), dtype=np.float16)
+        self._matrix = None
+        meta_path = self._path("meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if embedder is None or meta["embedder"] == self.embedder:
+                self.embedder = meta["embedder"]
+                self.texts = pd.read_parquet(self._path("texts.parquet"))
+                # Read-only mapping: the cache is only ever replaced whole
+                self.vectors = np.memmap(self._path("vectors.f16"), dtype=np.float16, mode="r",
+                                         shape=(len(self.texts), meta["dim"]))
+
+    def _path(self, name):
+        return os.path.join(self.themes_dir, name)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def update(self, df):
+        """
+        Count the texts of the transactions, embedding any new ones, and re-cluster
+
+        Args:
+            df (pd.DataFrame): Transactions with the FIELDS
+
+        Returns:
+            int: Texts embedded
+        """
+        counts = pd.concat({field: df[field].dropna().astype(str).value_counts() for field in FIELDS if field in df},
+                           axis=1).fillna(0).astype(np.int64)
+        counts = counts.reindex(columns=list(FIELDS), fill_value=0)
+        # Cached texts keep their vectors even when they no longer occur
+        known = self.texts["text"].tolist()
+        seen = set(known)
+        new = [text for text in counts.index if text not in seen]
+        vectors = np.asarray(self.vectors, dtype=np.float32)
+        if new:
+            added = embed(new, self.embedder)
+            vectors = np.vstack([vectors, added]) if len(vectors) else added
+
+        texts = pd.DataFrame({"text": known + new})
+        texts = texts.join(counts, on="text").fillna(0)
+        texts[list(FIELDS)] = texts[list(FIELDS)].astype(np.int64)
+        texts["theme"] = cluster(vectors, texts[list(FIELDS)].sum(axis=1).to_numpy())
+        self.texts, self.vectors, self._matrix = texts, vectors.astype(np.float16), None
+        return len(new)
+
+    def save(self):
+        """Write the vectors, texts and metadata, each swapped into place"""
+        os.makedirs(self.themes_dir, exist_ok=True)
+        with span("save", artifact=self.themes_dir):
+            path = self._path("vectors.f16")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            np.ascontiguousarray(self.vectors, dtype=np.float16).tofile(tmp_path)
+            os.replace(tmp_path, path)
+            path = self._path("texts.parquet")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            self.texts.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+            path = self._path("meta.json")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"embedder": self.embedder, "dim": int(self.vectors.shape[1])}, f)
+            os.replace(tmp_path, path)
+
+    def themes(self, fields=FIELDS):
+        """
+        Summarize the themes
+
+        Returns:
+            pd.DataFrame: theme, label (its most frequent text), texts,
+                rows (in the fields) and examples, most rows first
+        """
+        texts = self.texts.assign(rows=self.texts[list(fields)].sum(axis=1))
+        texts = texts[texts["rows"] > 0].sort_values("rows", ascending=False)
+        table = texts.groupby("theme", sort=False).agg(
+            label=("text", "first"), texts=("text", "size"), rows=("rows", "sum"),
+            examples=("text", lambda t: " · ".join(t.head(5))),
+        ).reset_index()
+        return table.sort_values("rows", ascending=False, ignore_index=True)
+
+    @property
+    def matrix(self):
+        """The vectors as float32 for BLAS, converted from the cache on first use"""
+        if self._matrix is None:
+            self._matrix = np.asarray(self.vectors, dtype=np.float32)
+        return self._matrix
+
+    def similar(self, text, k=NEIGHBORS):
+        """
+        Cached texts nearest to a text
+
+        Args:
+            text (str): Any text; a cached one uses its stored vector
+            k (int): Neighbours to return (the text itself included)
+
+        Returns:
+            pd.DataFrame: text, similarity (cosine), theme and rows per
+                field, most similar first
+        """
+        if not len(self):
+            return self.texts.assign(similarity=pd.Series(dtype=np.float32))
+        position = np.flatnonzero(self.texts["text"].to_numpy() == text)
+        query = self.matrix[position[0]] if len(position) else embed([text], self.embedder)[0]
+        with span("similar", texts=len(self)):
+            scores = self.matrix @ query
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+        return self.texts.iloc[top].assign(similarity=scores[top]).reset_index(drop=True)
+
+def build(data_file="Walmart_customer_fixed.csv", themes_dir=THEMES_DIR):
+    """
+    Refresh the cache from a CSV and save it
+
+    Returns:
+        ThemeCache: The saved cache
+    """
+    import utils
+
+    df, _ = utils.load_and_clean_data(data_file, columns=list(FIELDS))
+    if df is None:
+        raise FileNotFoundError(f"Could not load {data_file}")
+    cache = ThemeCache(themes_dir, embedder=backend())
+    with span("feedback_themes", file=data_file) as info:
+        embedded = cache.update(df)
+        cache.save()
+        info.update(texts=len(cache), embedded=embedded)
+    return cache
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster feedback texts into themes and find similar complaints")
+    parser.add_argument("--data", default="Walmart_customer_fixed.csv", help="CSV to read feedback from")
+    parser.add_argument("--similar", metavar="TEXT", help="list the cached texts nearest to this one")
+    parser.add_argument("-k", type=int, default=NEIGHBORS, help="neighbours to list")
+    args = parser.parse_args()
+
+    if backend() == HASHING:
+        print("⚠️  sentence-transformers is not installed; embedding hashed character n-grams instead")
+    if args.similar:
+        cache = ThemeCache()
+        if not len(cache):
+            cache = build(args.data)
+        print(f"🔎 Nearest to {args.similar!r}:")
+        print(cache.similar(args.similar, args.k).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+        return
+
+    cache = build(args.data)
+    themes = cache.themes()
+    print(f"🧩 {len(themes):,} themes among {len(cache):,} distinct texts ({cache.embedder})")
+    print(themes.to_string(index=False))
+    print(f"💾 Themes saved to: {THEMES_DIR}")
+
+if __name__ == "__main__":
+    main()
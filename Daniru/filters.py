@@ -0,0 +1,167 @@
+"""
+Indexed row filters for the dashboard's sidebar
+
+A FilterIndex is built once per loaded frame and answers "which rows match
+these selections" without scanning string columns:
+
+- low-cardinality columns (Category, Discount_Applied, Segment) keep one packed
+  bitmap per value, so selecting values is an OR of bitmaps
+- high-cardinality columns (City) keep a sorted index: row positions
+  grouped by value, so a value's rows are one contiguous slice
+- range columns (Purchase_Date, Age) keep row positions sorted by value, so
+  a range is two binary searches and one slice
+
+Every filter's matches become a packed bitmap (one bit per row), and
+combining filters is a bitwise AND over n/8 bytes.
+"""
+
+import numpy as np
+import pandas as pd
+
+# filter column -> kind: "values" (pick values), "range" (low, high) or
+# "groups" (pick named ranges, see AGE_GROUPS)
+FILTERS = {
+    "Purchase_Date": "range",
+    "City": "values",
+    "Category": "values",
+    "Age": "groups",
+    "Discount_Applied": "values",
+    "Segment": "values",
+}
+
+# age group label -> (youngest, oldest), None for an open end
+AGE_GROUPS = {
+    "18-24": (18, 24),
+    "25-34": (25, 34),
+    "35-44": (35, 44),
+    "45-54": (45, 54),
+    "55+": (55, None),
+}
+
+# Columns with more distinct values than this use a sorted index rather
+# than a bitmap per value (20,000 cities would need 20,000 bitmaps)
+BITMAP_MAX_VALUES = 64
+
+class _ValueIndex:
+    """Rows of each distinct value of a column"""
+
+    def __init__(self, values):
+        codes, uniques = pd.factorize(values, sort=True)
+        self.values = list(uniques)
+        self._lookup = {value: code for code, value in enumerate(self.values)}
+        self.size = len(codes)
+
+        if len(uniques) <= BITMAP_MAX_VALUES:
+            self._bitmaps = [np.packbits(codes == code) for code in range(len(uniques))]
+        else:
+            self._bitmaps = None
+            self._order = np.argsort(codes, kind="stable")
+            self._offsets = np.concatenate([[0], np.cumsum(np.bincount(codes[codes >= 0], minlength=len(uniques)))])
+            # Missing values (code -1) sort first; skip them
+            self._offsets += int((codes < 0).sum())
+
+    def bitmap(self, selected):
+        """Packed bitmap of the rows holding any of the selected values"""
+        codes = [self._lookup[value] for value in selected if value in self._lookup]
+        if self._bitmaps is not None:
+            bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+            for code in codes:
+                bits |= self._bitmaps[code]
+            return bits
+
+        rows = np.zeros(self.size, dtype=bool)
+        for code in codes:
+            rows[self._order[self._offsets[code]:self._offsets[code + 1]]] = True
+        return np.packbits(rows)
+
+class _RangeIndex:
+    """Row positions sorted by a numeric or datetime column"""
+
+    def __init__(self, values):
+        values = pd.Series(values)
+        is_date = pd.api.types.is_datetime64_any_dtype(values)
+        present = values.notna().to_numpy()
+        numbers = values.to_numpy(dtype="datetime64[ns]" if is_date else float)
+        self.is_date = is_date
+        self.size = len(values)
+        self._order = np.flatnonzero(present)[np.argsort(numbers[present], kind="stable")]
+        self._sorted = numbers[self._order]
+
+    def bounds(self):
+        """Smallest and largest value, or None if the column is empty"""
+        if not len(self._sorted):
+            return None
+        low, high = self._sorted[0], self._sorted[-1]
+        return (pd.Timestamp(low), pd.Timestamp(high)) if self.is_date else (low.item(), high.item())
+
+    def _positions(self, low, high):
+        start = 0 if low is None else np.searchsorted(self._sorted, self._key(low), side="left")
+        stop = len(self._sorted) if high is None else np.searchsorted(self._sorted, self._key(high), side="right")
+        return self._order[start:stop]
+
+    def _key(self, value):
+        return np.datetime64(pd.Timestamp(value), "ns") if self.is_date else float(value)
+
+    def bitmap(self, ranges):
+        """Packed bitmap of the rows inside any of the (low, high) ranges"""
+        rows = np.zeros(self.size, dtype=bool)
+        for low, high in ranges:
+            rows[self._positions(low, high)] = True
+        return np.packbits(rows)
+
+class FilterIndex:
+    """
+    Filter structures for every FILTERS column present in a frame
+
+    Args:
+        df (pd.DataFrame): Frame to index; its row order is what masks refer to
+    """
+
+    def __init__(self, df):
+        self.size = len(df)
+        self._indexes = {}
+        for column, kind in FILTERS.items():
+            if column in df.columns:
+                self._indexes[column] = _ValueIndex(df[column]) if kind == "values" else _RangeIndex(df[column])
+
+    def __contains__(self, column):
+        return column in self._indexes
+
+    def values(self, column):
+        """Distinct values of a "values" column, sorted"""
+        return self._indexes[column].values
+
+    def bounds(self, column):
+        """(min, max) of a "range" or "groups" column"""
+        return self._indexes[column].bounds()
+
+    def mask(self, selections):
+        """
+        Rows matching every selection
+
+        Args:
+            selections (tuple): (column, selection) pairs. A "values" column
+                takes the values to keep, a "range" column a (low, high)
+                pair (either end may be None) and a "groups" column the
+                AGE_GROUPS labels to keep. Columns this index does not hold
+                are ignored.
+
+        Returns:
+            np.ndarray: Boolean mask over the indexed frame's rows, or None
+                when no selection applies
+        """
+        bits = None
+        for column, selection in selections:
+            if column not in self._indexes:
+                continue
+            kind = FILTERS[column]
+            if kind == "range":
+                matched = self._indexes[column].bitmap([selection])
+            elif kind == "groups":
+                matched = self._indexes[column].bitmap([AGE_GROUPS[label] for label in selection])
+            else:
+                matched = self._indexes[column].bitmap(selection)
+            bits = matched if bits is None else bits & matched
+        if bits is None:
+            return None
+        return np.unpackbits(bits, count=self.size).view(bool)
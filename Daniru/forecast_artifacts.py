@@ -0,0 +1,181 @@
+"""
+Forecast artifact store for the Apple Market Analyzer
+
+The forecast scripts save their figures through save_forecast_figure(), which
+writes the full-resolution PNG and, next to it, a display-sized PNG variant.
+The dashboard reads the variant's raw bytes and hands them to st.image as-is,
+so rendering the Predictions page never decodes or re-encodes an image.
+
+Run this module directly to rebuild the variants for existing forecasts:
+
+    python forecast_artifacts.py
+"""
+
+import hashlib
+import io
+import os
+
+from instrumentation import span
+
+FORECAST_IMAGES = {
+    'ratings': 'apple_ratings/apple_ratings_forecast.png',
+    'price_elasticity': 'price_elasticity/price_elasticity_forecast.png',
+    'product_domination': 'product_domination/product_domination_forecast.png'
+}
+
+# Streamlit decodes and resizes any image wider than 1460px on every render,
+# so display variants stay just under that
+DISPLAY_WIDTH = 1400
+
+def display_variant_path(image_path, width=DISPLAY_WIDTH, fmt="png"):
+    """
+    Get the path of a display-sized variant of a forecast image
+
+    Args:
+        image_path (str): Path to the full-resolution image
+        width (int): Variant width in pixels
+        fmt (str): Variant format, "png" or "webp"
+
+    Returns:
+        str: Path such as "apple_ratings/apple_ratings_forecast_w1400.png"
+    """
+    root, _ = os.path.splitext(image_path)
+    return f"{root}_w{width}.{fmt}"
+
+def _resize_for_display(image, width):
+    """Downscale a PIL image to at most ``width`` pixels wide"""
+    from PIL import Image
+
+    if image.width <= width:
+        return image
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.LANCZOS)
+
+def _encode_display_png(image):
+    """Encode a PIL image as a 256-colour PNG, which suits flat line charts"""
+    from PIL import Image
+
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    buffer = io.BytesIO()
+    image.quantize(colors=256, method=Image.Quantize.FASTOCTREE).save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+def _tmp_path(path):
+    """Sibling temp path, so a finished file can be swapped in with os.replace"""
+    return f"{path}.{os.getpid()}.tmp"
+
+def write_display_variants(image_path, width=DISPLAY_WIDTH, formats=("png",)):
+    """
+    Write display-sized variants of a forecast image
+
+    PNG is the default because Streamlit passes PNG bytes through untouched,
+    while it re-encodes WebP; ask for "webp" when the image is embedded
+    elsewhere.
+
+    Args:
+        image_path (str): Path to the full-resolution image
+        width (int): Maximum variant width in pixels
+        formats (tuple): Formats to write, any of "png" and "webp"
+
+    Returns:
+        list: Paths of the variants written
+    """
+    from PIL import Image
+
+    written = []
+    with Image.open(image_path) as image:
+        image = _resize_for_display(image, width)
+
+        for fmt in formats:
+            variant_path = display_variant_path(image_path, width, fmt)
+            tmp_path = _tmp_path(variant_path)
+            if fmt == "webp":
+                image.save(tmp_path, format="WEBP", quality=85, method=6)
+            else:
+                with open(tmp_path, "wb") as f:
+                    f.write(_encode_display_png(image))
+            os.replace(tmp_path, variant_path)
+            written.append(variant_path)
+
+    return written
+
+def save_forecast_figure(fig, image_path, **savefig_kwargs):
+    """
+    Save a matplotlib figure and its display-sized variants
+
+    Each file is written next to its destination and then swapped in, so the
+    dashboard keeps serving the previous image while a refresh is running.
+
+    Args:
+        fig (matplotlib.figure.Figure): Figure to save
+        image_path (str): Path of the full-resolution PNG
+        **savefig_kwargs: Passed through to ``fig.savefig`` (dpi, bbox_inches, ...)
+
+    Returns:
+        list: Paths of the display variants written
+    """
+    with span("save", artifact=image_path):
+        tmp_path = _tmp_path(image_path)
+        fig.savefig(tmp_path, format="png", **savefig_kwargs)
+        os.replace(tmp_path, image_path)
+        return write_display_variants(image_path)
+
+def file_digest(path):
+    """
+    Hash a file's contents
+
+    Args:
+        path (str): Path to the file
+
+    Returns:
+        str: SHA-256 hex digest, or None if the file does not exist
+    """
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+def read_display_bytes(image_path, width=DISPLAY_WIDTH):
+    """
+    Read PNG bytes of a forecast image ready for display
+
+    The display variant written by save_forecast_figure() is returned as-is.
+    Without one, the original is returned as-is when it is already a narrow
+    enough PNG; only its header is read to check. The image is decoded and
+    resized only when neither applies.
+
+    Args:
+        image_path (str): Path to the full-resolution image
+        width (int): Maximum display width in pixels
+
+    Returns:
+        bytes: PNG image bytes, or None if the image does not exist
+    """
+    if not os.path.exists(image_path):
+        return None
+
+    variant_path = display_variant_path(image_path, width)
+    if os.path.exists(variant_path):
+        with open(variant_path, "rb") as f:
+            return f.read()
+
+    with open(image_path, "rb") as f:
+        data = f.read()
+
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width <= width and image.format == "PNG":
+            return data
+        return _encode_display_png(_resize_for_display(image, width))
+
+if __name__ == "__main__":
+    for key, image_path in FORECAST_IMAGES.items():
+        if not os.path.exists(image_path):
+            print(f"⚠️  Skipping {key}: {image_path} not found")
+            continue
+
+        for variant_path in write_display_variants(image_path):
+            print(f"🖼️  {variant_path}: {os.path.getsize(image_path) // 1024} KB -> {os.path.getsize(variant_path) // 1024} KB")
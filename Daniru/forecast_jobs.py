@@ -0,0 +1,91 @@
+"""
+Background job queue for on-demand forecasts
+
+The dashboard hands a monthly series to ForecastJobQueue.submit() and keeps
+rendering; a worker thread fits the model, writes the result to the forecast
+store and reports progress that the page polls. Prophet does its fitting in
+a CmdStan subprocess, so worker threads do not hold up the Streamlit
+session.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import forecast_store
+import forecasting
+
+def job_key(metric, brand=None, product=None, horizon=6):
+    """Identify a forecast job by its series"""
+    return (metric, brand, product, int(horizon))
+
+class ForecastJobQueue:
+    """
+    Thread pool that forecasts missing series in the background
+    
+    Job state is a plain dict with "state" ("queued", "running", "done" or
+    "failed"), "progress" (0-1), "message" and "error".
+    """
+    
+    def __init__(self, max_workers=2, store_dir=forecast_store.STORE_DIR):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="forecast")
+        self._store_dir = store_dir
+        self._jobs = {}
+        self._lock = threading.Lock()
+    
+    def submit(self, history, metric, brand=None, product=None, horizon=6, version=None):
+        """
+        Queue a series for forecasting unless it is already queued or running
+        
+        Args:
+            history (pd.DataFrame): Monthly ds/y series to fit
+            metric (str): Forecast metric
+            brand (str): Brand, or None for all brands
+            product (str): Product_Name, or None for all products
+            horizon (int): Forecast horizon in months
+            version (str): Version of the data history came from, stored
+                with the forecast (see forecast_store.save_forecast())
+            
+        Returns:
+            dict: Snapshot of the job's state
+        """
+        key = job_key(metric, brand, product, horizon)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job["state"] in ("done", "failed"):
+                job = {"state": "queued", "progress": 0.0, "message": "Waiting for a worker...",
+                       "error": None, "submitted": time.time()}
+                self._jobs[key] = job
+                self._executor.submit(self._run, key, history, version)
+            return dict(job)
+    
+    def status(self, metric, brand=None, product=None, horizon=6):
+        """Return a snapshot of a job's state, or None if it was never submitted"""
+        with self._lock:
+            job = self._jobs.get(job_key(metric, brand, product, horizon))
+            return dict(job) if job else None
+    
+    def active_jobs(self):
+        """Return the keys of jobs that are queued or running"""
+        with self._lock:
+            return [key for key, job in self._jobs.items() if job["state"] in ("queued", "running")]
+    
+    def _update(self, key, **changes):
+        with self._lock:
+            self._jobs[key].update(changes)
+    
+    def _run(self, key, history, version=None):
+        metric, brand, product, horizon = key
+        
+        def report(fraction, message):
+            self._update(key, progress=fraction, message=message)
+        
+        self._update(key, state="running")
+        try:
+            frame = forecasting.forecast_series(history, horizon=horizon, progress=report)
+            report(0.9, "Saving forecast...")
+            forecast_store.save_forecast(frame, metric, brand, product, horizon, store_dir=self._store_dir,
+                                         version=version)
+            self._update(key, state="done", progress=1.0, message="Forecast ready")
+        except Exception as e:
+            self._update(key, state="failed", message="Forecast failed", error=str(e))
@@ -0,0 +1,179 @@
+"""
+Columnar store for forecast frames
+
+Every forecast series is kept as one small zstd-compressed Parquet file under
+forecasts/, holding ds, yhat, yhat_lower, yhat_upper and the actuals y. The
+series key (metric, brand, product, horizon) is stored in the file's schema
+metadata, so listing the store only reads file footers.
+
+The metadata also records the version of the data file the series was
+fitted on: its content digest, the same one pipeline.py fingerprints stages
+with, so a copy of the file with identical bytes is the same version.
+load_forecast() treats a series from another version as not stored, so it
+is refitted on the current data.
+"""
+
+import os
+import re
+from functools import lru_cache
+
+from instrumentation import span
+
+STORE_DIR = "forecasts"
+DATA_FILE = "Walmart_customer_fixed.csv"
+
+VALUE_COLUMNS = ["yhat", "yhat_lower", "yhat_upper", "y"]
+
+def _slug(value):
+    """Make a key component safe for use in a file name"""
+    return re.sub(r"[^A-Za-z0-9]+", "-", value).strip("-").lower() if value else "all"
+
+def series_path(metric, brand=None, product=None, horizon=6, store_dir=STORE_DIR):
+    """
+    Get the file that holds a forecast series
+    
+    Args:
+        metric (str): Forecast metric, e.g. "sales"
+        brand (str): Brand, or None for all brands
+        product (str): Product_Name, or None for all products
+        horizon (int): Forecast horizon in months
+        store_dir (str): Store directory
+        
+    Returns:
+        str: Path of the series' Parquet file
+    """
+    name = f"{_slug(metric)}__{_slug(brand)}__{_slug(product)}__h{int(horizon)}.parquet"
+    return os.path.join(store_dir, name)
+
+@lru_cache(maxsize=4)
+def _content_digest(data_file, stamp):
+    """Digest of a file's contents, cached on its size and mtime (stamp)"""
+    from forecast_artifacts import file_digest
+    
+    return file_digest(data_file)
+
+def data_version(data_file=DATA_FILE):
+    """
+    Version of the data file forecasts are fitted on
+    
+    Returns:
+        str: SHA-256 digest of the file's contents, rehashed only when its
+            size or mtime changes, or "missing"
+    """
+    import utils
+    
+    stamp = utils.dataset_version(data_file)
+    if stamp == "missing":
+        return stamp
+    return _content_digest(data_file, stamp)
+
+def stored_version(metric, brand=None, product=None, horizon=6, store_dir=STORE_DIR):
+    """
+    Get the data version a stored series was fitted on
+    
+    Returns:
+        str: The version token, "" if the series predates versioning, or
+            None if the series is not stored
+    """
+    import pyarrow.parquet as pq
+    
+    path = series_path(metric, brand, product, horizon, store_dir)
+    if not os.path.exists(path):
+        return None
+    return (pq.read_schema(path).metadata or {}).get(b"data_version", b"").decode()
+
+def save_forecast(frame, metric, brand=None, product=None, horizon=6, store_dir=STORE_DIR, version=None):
+    """
+    Persist a forecast frame
+    
+    The file is written under a temporary name and renamed into place, so a
+    reader never sees a half-written series.
+    
+    Args:
+        frame (pd.DataFrame): Columns ds, yhat, yhat_lower, yhat_upper, y
+        metric (str): Forecast metric
+        brand (str): Brand, or None for all brands
+        product (str): Product_Name, or None for all products
+        horizon (int): Forecast horizon in months
+        store_dir (str): Store directory
+        version (str): Version of the data the frame was fitted on, defaults
+            to the current data_version()
+        
+    Returns:
+        str: Path of the written file
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    os.makedirs(store_dir, exist_ok=True)
+    path = series_path(metric, brand, product, horizon, store_dir)
+    
+    compact = frame[["ds"] + VALUE_COLUMNS].astype({column: "float32" for column in VALUE_COLUMNS})
+    table = pa.Table.from_pandas(compact, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"metric": metric.encode(),
+        b"brand": (brand or "").encode(),
+        b"product": (product or "").encode(),
+        b"horizon": str(int(horizon)).encode(),
+        b"data_version": (version or data_version()).encode(),
+    })
+    
+    with span("save", artifact=path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+    return path
+
+def load_forecast(metric, brand=None, product=None, horizon=6, store_dir=STORE_DIR, version=None):
+    """
+    Load a stored forecast frame
+    
+    Args:
+        metric (str): Forecast metric
+        brand (str): Brand, or None for all brands
+        product (str): Product_Name, or None for all products
+        horizon (int): Forecast horizon in months
+        store_dir (str): Store directory
+        version (str): Data version the frame must have been fitted on, or
+            None to accept any
+        
+    Returns:
+        pd.DataFrame: The forecast frame, or None if the series is not stored
+            (or was fitted on another version of the data)
+    """
+    import pandas as pd
+    
+    stored = stored_version(metric, brand, product, horizon, store_dir)
+    if stored is None or (version is not None and stored != version):
+        return None
+    return pd.read_parquet(series_path(metric, brand, product, horizon, store_dir))
+
+def list_forecasts(store_dir=STORE_DIR):
+    """
+    List the stored forecast series
+    
+    Returns:
+        list: One dict per series with metric, brand, product, horizon,
+            data_version and path
+    """
+    import pyarrow.parquet as pq
+    
+    if not os.path.isdir(store_dir):
+        return []
+    
+    series = []
+    for name in sorted(os.listdir(store_dir)):
+        if not name.endswith(".parquet"):
+            continue
+        path = os.path.join(store_dir, name)
+        metadata = pq.read_schema(path).metadata or {}
+        series.append({
+            "metric": metadata.get(b"metric", b"").decode(),
+            "brand": metadata.get(b"brand", b"").decode() or None,
+            "product": metadata.get(b"product", b"").decode() or None,
+            "horizon": int(metadata.get(b"horizon", b"0")),
+            "data_version": metadata.get(b"data_version", b"").decode(),
+            "path": path,
+        })
+    return series
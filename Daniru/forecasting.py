@@ -0,0 +1,234 @@
+"""
+Forecast engine shared by the forecast scripts and the dashboard
+
+Series are monthly (month-end) aggregates of one metric, optionally narrowed
+to a brand and a product, and are forecast with Prophet.
+
+Prophet's own predict() simulates 1,000 trend paths per series to draw its
+uncertainty interval, which is most of its predict time. Models here are fitted
+without that, and predict() adds the interval in one of INTERVAL_MODES:
+
+- none: point forecasts only (yhat_lower and yhat_upper are NaN)
+- analytic: a normal interval from the variance of Prophet's trend
+  simulation (future changepoints at the fitted rate, Laplace-sized rate
+  changes) plus the observation noise, in closed form
+- sampled: that simulation itself, drawn with numpy for every series at once
+
+APPLE_INTERVALS picks the default mode and APPLE_INTERVAL_DRAWS the number of
+sampled draws.
+"""
+
+import os
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+import dedup
+import validation
+from instrumentation import span
+
+# metric name -> (source column, monthly aggregation, display label)
+METRICS = {
+    "sales": ("Purchase_Amount", "sum", "Revenue ($)"),
+    "rating": ("Rating", "mean", "Average Rating"),
+    "price": ("Market_Price", "mean", "Average Price ($)"),
+}
+
+INTERVAL_MODES = ("none", "analytic", "sampled")
+INTERVALS = os.environ.get("APPLE_INTERVALS", "analytic")
+DRAWS = int(os.environ.get("APPLE_INTERVAL_DRAWS", 1000))
+# Prophet's default interval width
+INTERVAL_WIDTH = 0.8
+
+def load_apple_sales(file_path="Walmart_customer_fixed.csv"):
+    """
+    Load the dataset and keep Apple-related sales
+    
+    A row counts as Apple when either its Brand or its Product_Name mentions
+    "apple", which is the filter all forecast scripts share. Rows are
+    deduplicated and validated as utils.load_and_clean_data() does (see
+    dedup.py and validation.py), so forecasts see the dashboard's rows.
+    
+    Args:
+        file_path (str): Path to the CSV file
+        
+    Returns:
+        pd.DataFrame: Apple rows with Purchase_Date parsed
+    """
+    with span("load", file=file_path):
+        df = pd.read_csv(file_path, low_memory=False)
+    df, _ = dedup.drop_duplicates(df)
+    df, _ = validation.apply(df)
+    with span("clean"):
+        df['Purchase_Date'] = pd.to_datetime(df['Purchase_Date'], errors='coerce')
+    
+    with span("filter"):
+        mask_brand = df['Brand'].fillna('').str.contains('apple', case=False, na=False)
+        mask_product = df['Product_Name'].fillna('').str.contains('apple', case=False, na=False)
+        return df[mask_brand | mask_product].copy()
+
+def monthly_series(df, metric="sales", brand=None, product=None):
+    """
+    Aggregate transactions into a monthly series
+    
+    Args:
+        df (pd.DataFrame): Cleaned transactions with a datetime Purchase_Date
+        metric (str): One of METRICS
+        brand (str): Optional brand to keep (case-insensitive)
+        product (str): Optional Product_Name to keep
+        
+    Returns:
+        pd.DataFrame: Columns ds (month end) and y
+    """
+    column, how, _ = METRICS[metric]
+    
+    mask = df["Purchase_Date"].notna()
+    if brand is not None:
+        mask &= df["Brand"].str.lower() == brand.lower()
+    if product is not None:
+        mask &= df["Product_Name"] == product
+    
+    series = df.loc[mask, ["Purchase_Date", column]].set_index("Purchase_Date")[column].resample("ME").agg(how)
+    return series.reset_index().rename(columns={"Purchase_Date": "ds", column: "y"})
+
+def forecast_frame(forecast, history):
+    """
+    Reduce a Prophet forecast to the columns the store keeps
+    
+    Args:
+        forecast (pd.DataFrame): Output of ``Prophet.predict``
+        history (pd.DataFrame): The ds/y frame the model was fitted on
+        
+    Returns:
+        pd.DataFrame: Columns ds, yhat, yhat_lower, yhat_upper and y (the
+            actual value, NaN for future months)
+    """
+    frame = forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]]
+    return frame.merge(history[["ds", "y"]], on="ds", how="left")
+
+def fit_model(history, regressors=(), **options):
+    """
+    Fit Prophet to a ds/y frame without its built-in uncertainty sampling
+    
+    Args:
+        history (pd.DataFrame): Columns ds and y, plus one per regressor
+        regressors (tuple): Extra regressor columns of history
+        **options: Further Prophet arguments (e.g. yearly_seasonality)
+        
+    Returns:
+        prophet.Prophet: The fitted model, for predict()
+    """
+    # Prophet is slow to import, so only pay for it when a fit is needed
+    from prophet import Prophet
+    
+    model = Prophet(uncertainty_samples=0, interval_width=INTERVAL_WIDTH, **options)
+    for regressor in regressors:
+        model.add_regressor(regressor)
+    with span("fit", months=len(history)):
+        model.fit(history)
+    return model
+
+def _trend_parameters(models):
+    """Per-model y scale, noise sd, changepoint rate and Laplace scale of rate changes"""
+    y_scale = np.array([model.y_scale for model in models], dtype=float)
+    sigma = np.array([float(np.mean(model.params["sigma_obs"])) for model in models])
+    # Prophet places future changepoints as often as it placed them in the history...
+    rate = np.array([len(model.changepoints_t) for model in models], dtype=float)
+    # ...with rate changes as large as the fitted ones on average
+    scale = np.array([np.mean(np.abs(model.params["delta"])) + 1e-8 for model in models])
+    return y_scale, sigma, rate, scale
+
+def predict(models, horizon=6, intervals=None, draws=None, seed=0):
+    """
+    Forecast fitted models past their histories, with uncertainty intervals
+    
+    Series may differ in length; their arrays are aligned on the last month,
+    so the interval math runs on every series at once.
+    
+    Args:
+        models (list): Models from fit_model()
+        horizon (int): Months to forecast past each history
+        intervals (str): One of INTERVAL_MODES, defaults to INTERVALS
+        draws (int): Simulated paths per series for "sampled", defaults to DRAWS
+        seed (int): Seed of the sampled paths
+        
+    Returns:
+        list: One Prophet forecast frame per model (history and future
+            months), with yhat_lower and yhat_upper
+    """
+    intervals = intervals or INTERVALS
+    if intervals not in INTERVAL_MODES:
+        raise ValueError(f"Unknown interval mode {intervals!r}; expected one of {INTERVAL_MODES}")
+    
+    with span("predict", series=len(models), horizon=horizon, intervals=intervals):
+        forecasts = [model.predict(model.make_future_dataframe(periods=horizon, freq="ME")) for model in models]
+        if intervals == "none" or not models:
+            return [forecast.assign(yhat_lower=np.nan, yhat_upper=np.nan) for forecast in forecasts]
+        
+        # models x months, padded at the front; padding is history (t = 0) and is dropped at the end
+        length = max(len(forecast) for forecast in forecasts)
+        t = np.zeros((len(models), length))
+        yhat = np.zeros_like(t)
+        multiplier = np.ones_like(t)
+        for i, (model, forecast) in enumerate(zip(models, forecasts)):
+            t[i, -len(forecast):] = (forecast["ds"] - model.start) / model.t_scale
+            yhat[i, -len(forecast):] = forecast["yhat"]
+            multiplier[i, -len(forecast):] = 1 + forecast["multiplicative_terms"]
+        y_scale, sigma, rate, scale = (p[:, None] for p in _trend_parameters(models))
+        # Scaled time runs from 0 to 1 over the history, so changepoints land after t = 1
+        ahead = np.maximum(t - 1, 0)
+        
+        if intervals == "analytic":
+            # Rate changes d at times c (a Poisson process of intensity rate)
+            # move the trend by d (t - c); the variance of their sum over
+            # c in (1, t] is rate * E[d^2] * (t - 1)^3 / 3, with E[d^2] = 2 scale^2
+            trend_var = rate * 2 * scale ** 2 * ahead ** 3 / 3
+            sd = y_scale * np.sqrt(sigma ** 2 + multiplier ** 2 * trend_var)
+            z = NormalDist().inv_cdf(0.5 + INTERVAL_WIDTH / 2)
+            lower, upper = yhat - z * sd, yhat + z * sd
+        else:
+            draws = draws or DRAWS
+            rng = np.random.default_rng(seed)
+            end = t.max(axis=1)[:, None]
+            changes = rng.poisson(rate * (end - 1), size=(len(models), draws))
+            most = changes.max()
+            # models x draws x changepoints, unused changepoints get a zero rate change
+            when = 1 + rng.random((len(models), draws, most)) * (end - 1)[:, :, None]
+            delta = rng.laplace(0, scale[:, :, None], (len(models), draws, most))
+            delta *= np.arange(most) < changes[:, :, None]
+            # Only the last `horizon` months lie past t = 1
+            future = t[:, None, None, -horizon:]
+            shift = np.zeros((len(models), draws, length))
+            shift[:, :, -horizon:] = (delta[..., None] * np.maximum(future - when[..., None], 0)).sum(axis=2)
+            noise = rng.normal(0, 1, (len(models), draws, length)) * sigma[:, :, None]
+            paths = yhat[:, None, :] + y_scale[:, :, None] * (multiplier[:, None, :] * shift + noise)
+            lower, upper = np.quantile(paths, [0.5 - INTERVAL_WIDTH / 2, 0.5 + INTERVAL_WIDTH / 2], axis=1)
+        
+        return [forecast.assign(yhat_lower=lower[i, -len(forecast):], yhat_upper=upper[i, -len(forecast):])
+                for i, forecast in enumerate(forecasts)]
+
+def forecast_series(history, horizon=6, progress=None, intervals=None):
+    """
+    Fit Prophet to a monthly series and forecast it
+    
+    Args:
+        history (pd.DataFrame): Columns ds and y, as from monthly_series()
+        horizon (int): Months to forecast past the last actual
+        progress (callable): Optional ``progress(fraction, message)`` callback
+        intervals (str): Interval mode, one of INTERVAL_MODES (default INTERVALS)
+        
+    Returns:
+        pd.DataFrame: Forecast frame as returned by forecast_frame()
+    """
+    if history["y"].notna().sum() < 2:
+        raise ValueError("At least two months of data are needed to forecast a series")
+    
+    if progress:
+        progress(0.1, "Fitting model...")
+    model = fit_model(history)
+    
+    if progress:
+        progress(0.7, "Predicting...")
+    forecast, = predict([model], horizon, intervals)
+    return forecast_frame(forecast, history)
@@ -0,0 +1,245 @@
+"""
+Timing and memory instrumentation for the Apple Market Analyzer
+
+Wrap a hot path in span() to time it:
+
+    with instrumentation.span("fit", series="Apple"):
+        model.fit(history)
+
+Spans are only recorded inside a collect() or run() block and cost almost
+nothing outside one, so library code can be instrumented unconditionally.
+Each span records wall and CPU time, the resident set size when it ends and
+how far it raised the process's RSS high-water mark.
+
+run() is meant for a whole script or pipeline stage. On exit it appends one
+JSON line per span, plus a summary line for the run, to logs/runs.jsonl.
+Set APPLE_PROFILE=cprofile (or pyinstrument, if installed) to also dump a
+profile of the run to logs/profiles/.
+
+The dashboard uses collect() to time each page render for its diagnostics
+page.
+"""
+
+import contextvars
+import json
+import os
+import resource
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+LOG_DIR = "logs"
+LOG_FILE = os.path.join(LOG_DIR, "runs.jsonl")
+PROFILE_DIR = os.path.join(LOG_DIR, "profiles")
+PROFILERS = ("cprofile", "pyinstrument")
+
+# Spans of the active collect() block and the (name, depth) of the enclosing
+# span. Context variables keep concurrent Streamlit sessions and threads apart.
+_spans = contextvars.ContextVar("instrumentation_spans", default=None)
+_parent = contextvars.ContextVar("instrumentation_parent", default=None)
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def current_rss_mb():
+    """Return the current resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return peak_rss_mb()
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Time a block of code
+
+    Args:
+        name (str): Stage name, e.g. "load", "fit" or "llm_call"
+        **attrs: Extra JSON-serialisable fields to record with the span
+
+    Yields:
+        dict: Fields added to it inside the block are recorded too, for
+            results only known at the end (such as rows removed)
+    """
+    spans = _spans.get()
+    if spans is None:
+        yield {}
+        return
+
+    parent = _parent.get()
+    depth = 0 if parent is None else parent[1] + 1
+    # Reserve the slot now so records stay in start order, parents first
+    record = {"span": name, "parent": parent and parent[0], "depth": depth}
+    spans.append(record)
+
+    token = _parent.set((name, depth))
+    peak_before = peak_rss_mb()
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    extra = {}
+    try:
+        yield extra
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        cpu_ms = (time.process_time() - cpu_started) * 1000
+        _parent.reset(token)
+        peak_after = peak_rss_mb()
+        record.update({
+            "duration_ms": round(duration_ms, 3),
+            "cpu_ms": round(cpu_ms, 3),
+            "rss_mb": round(current_rss_mb(), 1),
+            "peak_rss_mb": round(peak_after, 1),
+            "peak_growth_mb": round(peak_after - peak_before, 1),
+        }, **attrs, **extra)
+
+@contextmanager
+def collect():
+    """
+    Record the spans run inside this block
+
+    Yields:
+        list: Span records, filled in as each span finishes
+    """
+    spans = []
+    token = _spans.set(spans)
+    parent_token = _parent.set(None)
+    try:
+        yield spans
+    finally:
+        _parent.reset(parent_token)
+        _spans.reset(token)
+
+def _start_profiler(profiler):
+    if profiler == "cprofile":
+        import cProfile
+
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("⚠️  pyinstrument is not installed; running without a profile")
+            return None
+        profile = Profiler()
+        profile.start()
+        return profile
+    raise ValueError(f"Unknown profiler {profiler!r}, expected one of {PROFILERS}")
+
+def _dump_profile(profiler, profile, name, run_id, profile_dir):
+    os.makedirs(profile_dir, exist_ok=True)
+    if profiler == "cprofile":
+        profile.disable()
+        path = os.path.join(profile_dir, f"{name}-{run_id}.prof")
+        profile.dump_stats(path)
+    else:
+        profile.stop()
+        path = os.path.join(profile_dir, f"{name}-{run_id}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profile.output_html())
+    return path
+
+def append_records(records, log_file=LOG_FILE):
+    """
+    Append records to a JSON-lines log
+
+    All records go out in one O_APPEND write, so worker processes can share
+    one log without interleaving their lines.
+    """
+    if os.path.dirname(log_file):
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+    data = "".join(json.dumps(record, default=str) + "\n" for record in records).encode("utf-8")
+    fd = os.open(log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+
+def read_records(log_file=LOG_FILE):
+    """
+    Read the records of a JSON-lines log
+
+    Returns:
+        list: Record dicts, oldest first; empty if the log does not exist
+    """
+    try:
+        with open(log_file, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def format_spans(spans):
+    """Format span records as one aligned line each, nested spans indented"""
+    return "\n".join(
+        f"   {'  ' * r['depth']}{r['span']:<{24 - 2 * r['depth']}} {r['duration_ms']:>10.1f} ms"
+        f"   peak RSS {r['peak_rss_mb']:.0f} MB (+{r['peak_growth_mb']:.0f})"
+        + (f"   ❌ {r['error']}" if "error" in r else "")
+        for r in spans if "duration_ms" in r
+    )
+
+@contextmanager
+def run(name, log_file=LOG_FILE, profiler=None, profile_dir=PROFILE_DIR, echo=print):
+    """
+    Instrument a whole script or pipeline stage
+
+    Args:
+        name (str): Run name, e.g. "apple_ratings" or "ratings.forecast"
+        log_file (str): JSON-lines log to append the span records to
+        profiler (str): "cprofile" or "pyinstrument"; defaults to the
+            APPLE_PROFILE environment variable, and no profile when unset
+        profile_dir (str): Folder for profile dumps
+        echo (callable): Receives a timing report when the run ends; pass
+            None to keep quiet
+
+    Yields:
+        list: Span records, filled in as each span finishes
+    """
+    profiler = profiler or os.environ.get("APPLE_PROFILE") or None
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    run_id = f"{started_at.replace('-', '').replace(':', '')}-{uuid.uuid4().hex[:6]}"
+    profile = _start_profiler(profiler) if profiler else None
+    started = time.perf_counter()
+    status = "ok"
+
+    with collect() as spans:
+        try:
+            yield spans
+        except BaseException:
+            status = "failed"
+            raise
+        finally:
+            profile_path = _dump_profile(profiler, profile, name, run_id, profile_dir) if profile else None
+            summary = {
+                "run": name,
+                "run_id": run_id,
+                "pid": os.getpid(),
+                "started_at": started_at,
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "peak_rss_mb": round(peak_rss_mb(), 1),
+                "profile": profile_path,
+            }
+            append_records([{"run": name, "run_id": run_id, **record} for record in spans] + [summary], log_file)
+
+            if echo is not None:
+                echo(f"⏱️  {name}: {summary['duration_ms'] / 1000:.1f}s, peak RSS {summary['peak_rss_mb']:.0f} MB")
+                if spans:
+                    echo(format_spans(spans))
+                if profile_path:
+                    echo(f"🔬 Profile saved to: {profile_path}")
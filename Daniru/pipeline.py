@@ -0,0 +1,433 @@
+"""
+Refresh pipeline for the offline analyses
+
+The forecast scripts (apple_ratings.py, price_elasticity.py and
+product_domination.py) are split into stages that form a dependency graph:
+
+    ingest -> <analysis>.aggregate -> <analysis>.forecast -> <analysis>.figure
+                                                          -> <analysis>.summary
+    sketches (top-K and distinct-count sketches for the dashboard tiles)
+    customers (customer feature store, see customer_features.py) -> segments
+    hierarchy (reconciled Brand -> Category -> Product_Name forecasts)
+    ingest -> backtest (rolling-origin scores of the forecast models)
+    ingest -> scenarios (demand-model components for the what-if simulator)
+    promotions (competitor promotion lift with bootstrap intervals)
+    anomalies (anomalous months of every brand, category, city and product)
+    demographics (Age_Group x Gender x Brand x Category cube for the charts)
+    feedback (inverted index of Feedback / Competitor_Feedback for the search box)
+    feedback_themes (cached feedback embeddings and their themes)
+
+Independent stages run concurrently in worker processes (pyplot is not
+thread-safe). Each stage is fingerprinted from its input files and the source
+of the code it runs; a stage whose fingerprint matches its last successful run
+and whose outputs still exist is skipped. Every output is written next to its
+destination and swapped in, so the dashboard keeps serving the last good
+artifacts while a refresh is running, and a failed stage leaves them alone.
+
+Each stage that runs appends its timing spans to logs/runs.jsonl (see
+instrumentation.py); --profile also dumps a profile per stage.
+
+Run it directly to bring all artifacts up to date:
+
+    python pipeline.py                # rerun what changed
+    python pipeline.py --force        # rerun everything
+    python pipeline.py --only ratings # one analysis (plus the shared stages)
+    python pipeline.py --rebuild-customers  # customer store from the full CSV
+"""
+
+import argparse
+import ast
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import instrumentation
+from forecast_artifacts import file_digest
+
+DATA_FILE = "Walmart_customer_fixed.csv"
+# Where the stage modules live, for local_sources()
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+WORK_DIR = ".pipeline"
+STATE_FILE = os.path.join(WORK_DIR, "state.json")
+APPLE_SALES_FILE = os.path.join(WORK_DIR, "apple_sales.parquet")
+SKETCHES_FILE = os.path.join(WORK_DIR, "sketches.npz")
+CUSTOMERS_DIR = os.path.join(WORK_DIR, "customers")
+CUSTOMER_FEATURES_FILE = os.path.join(CUSTOMERS_DIR, "features.parquet")
+SEGMENTS_FILE = os.path.join(CUSTOMERS_DIR, "segments.parquet")
+HIERARCHY_FILE = os.path.join(WORK_DIR, "hierarchy_forecast.parquet")
+BACKTEST_SCORES_FILE = os.path.join(WORK_DIR, "backtest_scores.parquet")
+SCENARIOS_FILE = os.path.join(WORK_DIR, "scenario_components.parquet")
+PROMOTION_LIFT_FILE = os.path.join(WORK_DIR, "promotion_lift.parquet")
+ANOMALIES_FILE = os.path.join(WORK_DIR, "anomalies.parquet")
+DEMOGRAPHICS_FILE = os.path.join(WORK_DIR, "demographics.parquet")
+FEEDBACK_DIR = os.path.join(WORK_DIR, "feedback")
+FEEDBACK_INDEX_FILE = os.path.join(FEEDBACK_DIR, "index.npz")
+THEMES_DIR = os.path.join(WORK_DIR, "feedback_themes")
+THEMES_FILE = os.path.join(THEMES_DIR, "texts.parquet")
+
+# analysis name -> module holding its aggregate/forecast/plot/summarize steps
+ANALYSES = {
+    'ratings': 'apple_ratings',
+    'price_elasticity': 'price_elasticity',
+    'product_domination': 'product_domination'
+}
+
+Stage = namedtuple("Stage", ["name", "needs", "inputs", "outputs", "code", "action", "args"])
+
+def _write_parquet(df, path):
+    """Write a DataFrame to parquet and swap it into place"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def _read_parquet(path):
+    import pandas as pd
+
+    return pd.read_parquet(path)
+
+def _use_agg_backend():
+    """Render off-screen; workers have no display"""
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+def run_stage(name, action, args, profiler=None):
+    """Run one stage action in a worker, logging its spans to logs/runs.jsonl"""
+    with instrumentation.run(name, profiler=profiler, echo=None):
+        action(*args)
+
+# --- Stage actions (top-level so worker processes can unpickle them) ---
+
+def ingest(data_file, apple_sales_file):
+    """Load the CSV and keep Apple-related sales"""
+    from forecasting import load_apple_sales
+
+    _write_parquet(load_apple_sales(data_file), apple_sales_file)
+
+def sketch(data_file, sketches_file):
+    """Build the sketches the dashboard's approximate tiles read"""
+    import sketches
+
+    sketches.build(data_file).save(sketches_file)
+
+def customers(data_file, store_dir, rebuild=False):
+    """
+    Fold the CSV's new transactions into the customer feature store
+
+    The store's seen-set skips rows it already holds, so a refresh after rows
+    are appended only adds those. Rows edited or removed in the CSV stay in
+    the store until it is rebuilt from the full CSV (rebuild=True, as with
+    --rebuild-customers, or when there is no store yet).
+    """
+    import customer_features
+
+    rebuild = rebuild or not os.path.exists(os.path.join(store_dir, "state.parquet"))
+    customer_features.build(data_file, store_dir, rebuild=rebuild)
+
+def segment(store_dir):
+    """Refit the customer segments on the feature store"""
+    import segments
+
+    segments.fit(store_dir)
+
+def reconcile(data_file, hierarchy_file):
+    """Forecast every Brand -> Category -> Product_Name node and reconcile the tree"""
+    import hierarchy
+    import utils
+
+    df, _ = utils.load_and_clean_data(data_file, columns=list(hierarchy.LEVELS) + ["Purchase_Date", "Purchase_Amount"])
+    frame, _ = hierarchy.forecast(df, method="mint")
+    _write_parquet(frame, hierarchy_file)
+
+def backtest(apple_sales_file, scores_file):
+    """Backtest every forecast configuration on the analyses' series"""
+    import backtest as harness
+
+    series = harness.analysis_series(_read_parquet(apple_sales_file))
+    harness.save_scores(harness.score(harness.run(series)), scores_file)
+
+def demand(apple_sales_file, components_file):
+    """Fit the what-if simulator's demand models and store their components"""
+    import scenarios
+
+    scenarios.save(scenarios.fit(_read_parquet(apple_sales_file)), components_file)
+
+def promotion_lift(data_file, lift_file):
+    """Estimate competitor promotion lifts with bootstrap intervals"""
+    import promotions
+    import utils
+
+    df, _ = utils.load_and_clean_data(data_file, columns=list(promotions.COLUMNS))
+    promotions.save(promotions.estimate(df), lift_file)
+
+def scan(data_file, anomalies_file):
+    """Flag anomalous months in every brand, category, city and product series"""
+    import anomalies
+    import utils
+
+    columns = list(anomalies.DIMENSIONS) + ["Purchase_Date", "Purchase_Amount"]
+    df, _ = utils.load_and_clean_data(data_file, columns=columns)
+    anomalies.save(anomalies.detect(df), anomalies_file)
+
+def demographic_cube(data_file, cube_file):
+    """Count transactions and revenue per Age_Group x Gender x Brand x Category"""
+    import demographics
+
+    demographics.save(demographics.build(data_file), cube_file)
+
+def index_feedback(data_file, index_dir):
+    """Rebuild the feedback search index from the full CSV"""
+    import feedback_search
+
+    feedback_search.build(data_file, index_dir, rebuild=True)
+
+def feedback_themes(data_file, themes_dir):
+    """Embed new feedback texts and re-cluster the themes"""
+    import feedback_themes as themes
+
+    themes.build(data_file, themes_dir)
+
+def aggregate(module_name, apple_sales_file, history_file):
+    """Run an analysis' aggregate() step"""
+    module = importlib.import_module(module_name)
+    _write_parquet(module.aggregate(_read_parquet(apple_sales_file)), history_file)
+
+def forecast(module_name, history_file, forecast_file):
+    """Run an analysis' forecast() step, which also fills the forecast store"""
+    module = importlib.import_module(module_name)
+    _write_parquet(module.forecast(_read_parquet(history_file)), forecast_file)
+
+def figure(module_name, history_file, forecast_file, plot_file):
+    """Run an analysis' plot() step"""
+    _use_agg_backend()
+    module = importlib.import_module(module_name)
+    module.plot(_read_parquet(history_file), _read_parquet(forecast_file), plot_file)
+
+def summary(module_name, history_file, forecast_file, summary_file):
+    """Run an analysis' summarize() step"""
+    module = importlib.import_module(module_name)
+    module.summarize(_read_parquet(history_file), _read_parquet(forecast_file), summary_file)
+
+def local_sources(*modules):
+    """
+    Source files of modules and of every local module they import
+
+    Imports are followed transitively, including the ones inside functions
+    (most modules here import lazily), so a stage's fingerprint covers all
+    of the code it can run without hand-maintained lists.
+
+    Args:
+        *modules (str): Module names, such as "hierarchy"
+
+    Returns:
+        tuple: Sorted .py paths, relative like the stages' other paths
+    """
+    found, pending = set(), list(modules)
+    while pending:
+        path = f"{pending.pop()}.py"
+        if path in found or not os.path.exists(os.path.join(BASE_DIR, path)):
+            continue
+        found.add(path)
+        with open(os.path.join(BASE_DIR, path), encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending += [alias.name.split(".")[0] for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                pending.append(node.module.split(".")[0])
+    return tuple(sorted(found))
+
+def build_stages(analyses=None, data_file=DATA_FILE, rebuild_customers=False):
+    """
+    Build the stage graph
+
+    Args:
+        analyses (list): Analysis names to include, defaults to all of ANALYSES
+        data_file (str): Path to the raw CSV
+        rebuild_customers (bool): Rebuild the customer feature store from the
+            full CSV instead of adding the new transactions to it
+
+    Returns:
+        list: Stage tuples in dependency order
+    """
+    stages = [Stage("ingest", (), (data_file,), (APPLE_SALES_FILE,),
+                    local_sources("forecasting"), ingest, (data_file, APPLE_SALES_FILE)),
+              Stage("sketches", (), (data_file,), (SKETCHES_FILE,),
+                    local_sources("sketches"), sketch, (data_file, SKETCHES_FILE)),
+              Stage("customers", (), (data_file,), (CUSTOMER_FEATURES_FILE,),
+                    local_sources("customer_features"), customers, (data_file, CUSTOMERS_DIR, rebuild_customers)),
+              Stage("segments", ("customers",), (CUSTOMER_FEATURES_FILE,), (SEGMENTS_FILE,),
+                    local_sources("segments"), segment, (CUSTOMERS_DIR,)),
+              Stage("hierarchy", (), (data_file,), (HIERARCHY_FILE,),
+                    local_sources("hierarchy", "utils"), reconcile, (data_file, HIERARCHY_FILE)),
+              Stage("backtest", ("ingest",), (APPLE_SALES_FILE,), (BACKTEST_SCORES_FILE,),
+                    local_sources("backtest"), backtest, (APPLE_SALES_FILE, BACKTEST_SCORES_FILE)),
+              Stage("scenarios", ("ingest",), (APPLE_SALES_FILE,), (SCENARIOS_FILE,),
+                    local_sources("scenarios"), demand, (APPLE_SALES_FILE, SCENARIOS_FILE)),
+              Stage("promotions", (), (data_file,), (PROMOTION_LIFT_FILE,),
+                    local_sources("promotions", "utils"), promotion_lift, (data_file, PROMOTION_LIFT_FILE)),
+              Stage("anomalies", (), (data_file,), (ANOMALIES_FILE,),
+                    local_sources("anomalies", "utils"), scan, (data_file, ANOMALIES_FILE)),
+              Stage("demographics", (), (data_file,), (DEMOGRAPHICS_FILE,),
+                    local_sources("demographics"), demographic_cube, (data_file, DEMOGRAPHICS_FILE)),
+              Stage("feedback", (), (data_file,), (FEEDBACK_INDEX_FILE,),
+                    local_sources("feedback_search"), index_feedback, (data_file, FEEDBACK_DIR)),
+              Stage("feedback_themes", (), (data_file,), (THEMES_FILE,),
+                    local_sources("feedback_themes"), feedback_themes, (data_file, THEMES_DIR))]
+
+    for name in analyses or ANALYSES:
+        module_name = ANALYSES[name]
+        module = importlib.import_module(module_name)
+        # Every step runs code from the analysis module and what it imports
+        code = local_sources(module_name)
+        history_file = os.path.join(WORK_DIR, f"{name}_history.parquet")
+        forecast_file = os.path.join(WORK_DIR, f"{name}_forecast.parquet")
+
+        stages += [
+            Stage(f"{name}.aggregate", ("ingest",), (APPLE_SALES_FILE,), (history_file,),
+                  code, aggregate, (module_name, APPLE_SALES_FILE, history_file)),
+            Stage(f"{name}.forecast", (f"{name}.aggregate",), (history_file,), (forecast_file,),
+                  code, forecast, (module_name, history_file, forecast_file)),
+            Stage(f"{name}.figure", (f"{name}.forecast",), (history_file, forecast_file), (module.PLOT_FILE,),
+                  code, figure, (module_name, history_file, forecast_file, module.PLOT_FILE)),
+            Stage(f"{name}.summary", (f"{name}.forecast",), (history_file, forecast_file), (module.SUMMARY_FILE,),
+                  code, summary, (module_name, history_file, forecast_file, module.SUMMARY_FILE)),
+        ]
+
+    return stages
+
+def fingerprint(stage):
+    """
+    Fingerprint a stage from its input files and code
+
+    Args:
+        stage (Stage): Stage to fingerprint
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    h = hashlib.sha256(stage.name.encode())
+    for path in stage.inputs + stage.code:
+        h.update(f"\0{path}\0{file_digest(path)}".encode())
+    return h.hexdigest()
+
+def load_state(state_file=STATE_FILE):
+    """Fingerprints of each stage's last successful run"""
+    try:
+        with open(state_file, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_state(state, state_file=STATE_FILE):
+    tmp_path = f"{state_file}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, state_file)
+
+def is_fresh(stage, state, fp):
+    """A stage is fresh when its fingerprint is unchanged and its outputs exist"""
+    return state.get(stage.name) == fp and all(os.path.exists(p) for p in stage.outputs)
+
+def run(stages, force=False, workers=None, profiler=None, log=print):
+    """
+    Run stale stages, concurrently where the graph allows
+
+    A stage is considered once every stage it needs has finished. Stages
+    downstream of a failure are not run, so their last good outputs stay in
+    place.
+
+    Args:
+        stages (list): Stage tuples from build_stages()
+        force (bool): Rerun every stage regardless of its fingerprint
+        workers (int): Worker processes, defaults to the CPU count
+        profiler (str): Dump a "cprofile" or "pyinstrument" profile per stage
+        log (callable): Receives one progress line per event
+
+    Returns:
+        dict: Stage name -> "fresh", "done", "failed" or "blocked"
+    """
+    os.makedirs(WORK_DIR, exist_ok=True)
+    state = load_state()
+    pending = {stage.name: stage for stage in stages}
+    results = {}
+    running = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            progressed = True
+            while progressed:
+                progressed = False
+                for name, stage in list(pending.items()):
+                    needs = [results.get(n) for n in stage.needs]
+                    if any(r in ("failed", "blocked") for r in needs):
+                        results[name] = "blocked"
+                        log(f"⏭️  {name}: blocked by a failed upstream stage")
+                    elif all(r in ("fresh", "done") for r in needs):
+                        fp = fingerprint(stage)
+                        if not force and is_fresh(stage, state, fp):
+                            results[name] = "fresh"
+                            log(f"✅ {name}: up to date")
+                        else:
+                            log(f"⏳ {name}: running...")
+                            future = pool.submit(run_stage, name, stage.action, stage.args, profiler)
+                            running[future] = (stage, fp, time.perf_counter())
+                    else:
+                        continue
+                    del pending[name]
+                    progressed = True
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, fp, started = running.pop(future)
+                elapsed = time.perf_counter() - started
+                try:
+                    future.result()
+                except Exception as e:
+                    results[stage.name] = "failed"
+                    log(f"❌ {stage.name}: failed after {elapsed:.1f}s: {e}")
+                else:
+                    results[stage.name] = "done"
+                    state[stage.name] = fp
+                    save_state(state)
+                    log(f"✅ {stage.name}: done in {elapsed:.1f}s")
+
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the offline analysis artifacts")
+    parser.add_argument("--force", action="store_true", help="rerun every stage")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--only", action="append", choices=sorted(ANALYSES), help="analysis to refresh (repeatable)")
+    parser.add_argument("--profile", choices=instrumentation.PROFILERS, help="dump a profile of each stage to logs/profiles/")
+    parser.add_argument("--rebuild-customers", action="store_true",
+                        help="rebuild the customer feature store from the full CSV instead of adding new rows")
+    args = parser.parse_args(argv)
+
+    if args.rebuild_customers:
+        # The stage's fingerprint does not cover its arguments, so forget its last run
+        state = load_state()
+        if state.pop("customers", None) is not None:
+            save_state(state)
+
+    print("🔄 Refreshing analysis artifacts...")
+    started = time.perf_counter()
+    results = run(build_stages(args.only, rebuild_customers=args.rebuild_customers), force=args.force, workers=args.workers, profiler=args.profile,
+                  log=lambda line: print(line, flush=True))
+
+    counts = {status: list(results.values()).count(status) for status in ("done", "fresh", "failed", "blocked")}
+    print(f"🏁 Refresh finished in {time.perf_counter() - started:.1f}s: "
+          f"{counts['done']} ran, {counts['fresh']} up to date, "
+          f"{counts['failed']} failed, {counts['blocked']} blocked")
+    return 1 if counts["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
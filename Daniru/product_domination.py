@@ -1,116 +1,157 @@
 import os
 import pandas as pd
 import matplotlib.pyplot as plt
-from ollama import chat
-from prophet import Prophet
+import instrumentation
+from instrumentation import span
+from forecast_artifacts import save_forecast_figure
+from forecast_store import save_forecast
+from forecasting import fit_model, forecast_frame, load_apple_sales, predict
 import matplotlib.lines as mlines
 
-# --- Load data ---
-df = pd.read_csv("Walmart_customer_fixed.csv", low_memory=False)
-df['Purchase_Date'] = pd.to_datetime(df['Purchase_Date'], errors='coerce')
-
-# --- Filter Apple sales ---
-mask_brand = df['Brand'].fillna('').str.contains('apple', case=False, na=False)
-mask_product = df['Product_Name'].fillna('').str.contains('apple', case=False, na=False)
-apple_sales = df[mask_brand | mask_product].copy()
-
-# --- Aggregate monthly revenue by product ---
-monthly = (
-    apple_sales
-    .groupby([pd.Grouper(key="Purchase_Date", freq="ME"), "Product_Name"])["Purchase_Amount"]
-    .sum()
-    .reset_index()
-)
-
-# --- Pick top 5 products by total revenue ---
-top_products = (
-    monthly.groupby("Product_Name")["Purchase_Amount"]
-    .sum()
-    .nlargest(5)
-    .index
-)
-
-monthly_top = monthly[monthly["Product_Name"].isin(top_products)]
-
-# --- Ensure output folder ---
-output_dir = "product_domination"
-os.makedirs(output_dir, exist_ok=True)
-
-summary_file = os.path.join(output_dir, "product_domination_summary.txt")
-plot_file = os.path.join(output_dir, "product_domination_forecast.png")
-
-# --- Forecast next 6 months for each product ---
-plt.figure(figsize=(12, 6))
-forecast_data = {}
-colors = plt.cm.tab10.colors  # consistent colors for products
-
-# Global last actual date (for divider line + shading)
-global_last_date = monthly_top['Purchase_Date'].max()
-
-for i, product in enumerate(top_products):
-    product_data = (
-        monthly_top[monthly_top['Product_Name'] == product]
-        [['Purchase_Date', 'Purchase_Amount']]
-        .rename(columns={'Purchase_Date': 'ds', 'Purchase_Amount': 'y'})
-    )
-
-    # Train Prophet
-    model = Prophet()
-    model.fit(product_data)
-
-    # Make future dataframe
-    future = model.make_future_dataframe(periods=6, freq='ME')
-    forecast = model.predict(future)
-
-    # Last actual date for THIS product
-    last_actual_date = product_data['ds'].max()
-
-    # Save forecast results (include last actual so line connects seamlessly)
-    future_forecast = forecast[forecast['ds'] >= last_actual_date]
-    forecast_data[product] = future_forecast[['ds', 'yhat']]
-
-    # Plot actual history
-    plt.plot(product_data['ds'], product_data['y'], marker='o', color=colors[i], label=product)
-
-    # Plot forecast (continuous line, no gap)
-    plt.plot(future_forecast['ds'], future_forecast['yhat'], linestyle="--", color=colors[i])
-
-# --- Add divider line and shading (global cutoff) ---
-plt.axvline(x=global_last_date, color="black", linestyle="--", linewidth=1.2)
-plt.axvspan(global_last_date, forecast['ds'].max(), color="gray", alpha=0.15)
-
-# --- Legend: Actual vs Forecast + Product colors ---
-actual_line = mlines.Line2D([], [], color="black", linestyle="-", marker="o", label="Actual")
-forecast_line = mlines.Line2D([], [], color="black", linestyle="--", label="Forecast")
-product_lines = [mlines.Line2D([], [], color=colors[i], label=prod) for i, prod in enumerate(top_products)]
-
-plt.legend(handles=[actual_line, forecast_line] + product_lines,
-           bbox_to_anchor=(1.05, 1), loc="upper left")
-
-# --- Final formatting ---
-plt.title("Apple Top 5 Products: Sales Forecast (Next 6 Months)")
-plt.xlabel("Month")
-plt.ylabel("Revenue")
-plt.grid(True, linestyle="--", alpha=0.6)
-plt.tight_layout()
-
-# Save plot (instead of showing)
-plt.savefig(plot_file, dpi=300, bbox_inches="tight")
-plt.close()
-
-# --- Prepare summary text for Ollama ---
-last_data = monthly_top.groupby("Product_Name").tail(12)
-series_text = "\n".join(f"{row.Purchase_Date:%Y-%m} | {row.Product_Name}: {row.Purchase_Amount:.2f}" for _, row in last_data.iterrows())
-
-forecast_text = ""
-for product, fcast in forecast_data.items():
-    forecast_text += f"\n{product}:\n" + fcast.to_string(index=False)
-
-prompt = f"""
-Here is Apple monthly revenue for the top 5 products (last 12 months):
+# --- Output folder ---
+OUTPUT_DIR = "product_domination"
+SUMMARY_FILE = os.path.join(OUTPUT_DIR, "product_domination_summary.txt")
+PLOT_FILE = os.path.join(OUTPUT_DIR, "product_domination_forecast.png")
+HORIZON = 6
+TOP_N = 5
+
+def aggregate(apple_sales):
+    """
+    Aggregate monthly revenue for the top products
+
+    Returns:
+        pd.DataFrame: Purchase_Date, Product_Name, Purchase_Amount rows of the
+        TOP_N products by total revenue, ordered by that revenue
+    """
+    with span("aggregate"):
+        # --- Aggregate monthly revenue by product ---
+        monthly = (
+            apple_sales
+            .groupby([pd.Grouper(key="Purchase_Date", freq="ME"), "Product_Name"])["Purchase_Amount"]
+            .sum()
+            .reset_index()
+        )
+
+        # --- Pick top products by total revenue ---
+        top_products = (
+            monthly.groupby("Product_Name")["Purchase_Amount"]
+            .sum()
+            .nlargest(TOP_N)
+            .index
+        )
+
+        monthly_top = monthly[monthly["Product_Name"].isin(top_products)]
+        rank = {product: i for i, product in enumerate(top_products)}
+
+    return monthly_top.sort_values("Product_Name", key=lambda s: s.map(rank), kind="stable").reset_index(drop=True)
+
+def top_products(monthly_top):
+    """Product names in revenue order, as kept by aggregate()"""
+    return list(monthly_top["Product_Name"].unique())
+
+def forecast(monthly_top):
+    """
+    Forecast the next HORIZON months for each product
+
+    Returns:
+        pd.DataFrame: Product_Name, ds, yhat, yhat_lower, yhat_upper rows
+        from each product's last actual month onwards (so plotted lines
+        connect seamlessly)
+    """
+    products = top_products(monthly_top)
+    histories, models = [], []
+    for product in products:
+        product_data = (
+            monthly_top[monthly_top['Product_Name'] == product]
+            [['Purchase_Date', 'Purchase_Amount']]
+            .rename(columns={'Purchase_Date': 'ds', 'Purchase_Amount': 'y'})
+        )
+
+        histories.append(product_data)
+
+        # Train Prophet
+        models.append(fit_model(product_data))
+
+    # Predict every product at once, intervals included
+    forecasts = []
+    for product, product_data, product_forecast in zip(products, histories, predict(models, HORIZON)):
+        save_forecast(forecast_frame(product_forecast, product_data), metric="sales", brand="Apple", product=product, horizon=HORIZON)
+
+        # Keep forecast results from this product's last actual date
+        last_actual_date = product_data['ds'].max()
+        future_forecast = product_forecast.loc[product_forecast['ds'] >= last_actual_date, ['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+        forecasts.append(future_forecast.assign(Product_Name=product))
+
+    return pd.concat(forecasts, ignore_index=True)[['Product_Name', 'ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+
+def plot(monthly_top, forecast_df, plot_file=PLOT_FILE):
+    """Plot each product's history and forecast on one chart"""
+    os.makedirs(os.path.dirname(plot_file), exist_ok=True)
+    with span("plot"):
+        plt.figure(figsize=(12, 6))
+        colors = plt.cm.tab10.colors  # consistent colors for products
+        products = top_products(monthly_top)
+
+        # Global last actual date (for divider line + shading)
+        global_last_date = monthly_top['Purchase_Date'].max()
+
+        for i, product in enumerate(products):
+            product_data = monthly_top[monthly_top['Product_Name'] == product]
+            future_forecast = forecast_df[forecast_df['Product_Name'] == product]
+
+            # Plot actual history
+            plt.plot(product_data['Purchase_Date'], product_data['Purchase_Amount'], marker='o', color=colors[i], label=product)
+
+            # Plot forecast (continuous line, no gap)
+            plt.plot(future_forecast['ds'], future_forecast['yhat'], linestyle="--", color=colors[i])
+
+        # --- Add divider line and shading (global cutoff) ---
+        plt.axvline(x=global_last_date, color="black", linestyle="--", linewidth=1.2)
+        plt.axvspan(global_last_date, forecast_df['ds'].max(), color="gray", alpha=0.15)
+
+        # --- Legend: Actual vs Forecast + Product colors ---
+        actual_line = mlines.Line2D([], [], color="black", linestyle="-", marker="o", label="Actual")
+        forecast_line = mlines.Line2D([], [], color="black", linestyle="--", label="Forecast")
+        product_lines = [mlines.Line2D([], [], color=colors[i], label=prod) for i, prod in enumerate(products)]
+
+        plt.legend(handles=[actual_line, forecast_line] + product_lines,
+                   bbox_to_anchor=(1.05, 1), loc="upper left")
+
+        # --- Final formatting ---
+        plt.title(f"Apple Top {TOP_N} Products: Sales Forecast (Next {HORIZON} Months)")
+        plt.xlabel("Month")
+        plt.ylabel("Revenue")
+        plt.grid(True, linestyle="--", alpha=0.6)
+        plt.tight_layout()
+
+    # Save plot (instead of showing) plus its display-sized variant
+    save_forecast_figure(plt.gcf(), plot_file, dpi=300, bbox_inches="tight")
+    plt.close()
+
+def summarize(monthly_top, forecast_df, summary_file=SUMMARY_FILE):
+    """
+    Ask Gemma3 to interpret the product forecasts and save its answer
+
+    Raises whatever the Ollama client raises when Gemma3 is unreachable.
+    """
+    from ollama import chat
+
+    # --- Prepare summary text for Ollama ---
+    last_data = monthly_top.sort_values(["Purchase_Date", "Product_Name"]).groupby("Product_Name").tail(12)
+    series_text = "\n".join(f"{row.Purchase_Date:%Y-%m} | {row.Product_Name}: {row.Purchase_Amount:.2f}" for _, row in last_data.iterrows())
+
+    forecast_text = ""
+    for product in top_products(monthly_top):
+        fcast = forecast_df.loc[forecast_df['Product_Name'] == product, ['ds', 'yhat', 'yhat_lower', 'yhat_upper']]
+        if fcast['yhat_lower'].isna().all():
+            fcast = fcast[['ds', 'yhat']]
+        forecast_text += f"\n{product}:\n" + fcast.to_string(index=False)
+
+    prompt = f"""
+Here is Apple monthly revenue for the top {TOP_N} products (last 12 months):
 {series_text}
 
-And here is the forecast for the next 6 months:
+And here is the forecast for the next {HORIZON} months (yhat_lower/yhat_upper bound its 80% interval):
 {forecast_text}
 
 Please:
@@ -119,19 +160,35 @@ Please:
 3. Suggest possible business actions Apple could take for product strategy.
 """
 
-print("⏳ Sending data to Gemma3, please wait...")
-
-# --- Call Gemma3 ---
-try:
-    response = chat(model="gemma3", messages=[{"role": "user", "content": prompt}])
+    with span("llm_call", model="gemma3"):
+        response = chat(model="gemma3", messages=[{"role": "user", "content": prompt}])
 
     # Save summary ONLY to file (not printing in terminal)
+    os.makedirs(os.path.dirname(summary_file), exist_ok=True)
     with open(summary_file, "w", encoding="utf-8") as f:
         f.write(response['message']['content'])
 
-    print("✅ Gemma3 has finished processing!")
-    print(f"📊 Summary saved to: {summary_file}")
-    print(f"📈 Plot saved to: {plot_file}")
+def main():
+    with instrumentation.run("product_domination"):
+        # --- Load data and filter Apple sales ---
+        apple_sales = load_apple_sales("Walmart_customer_fixed.csv")
+
+        monthly_top = aggregate(apple_sales)
+        forecast_df = forecast(monthly_top)
+        plot(monthly_top, forecast_df)
+
+        print("⏳ Sending data to Gemma3, please wait...")
+
+        # --- Call Gemma3 ---
+        try:
+            summarize(monthly_top, forecast_df)
+
+            print("✅ Gemma3 has finished processing!")
+            print(f"📊 Summary saved to: {SUMMARY_FILE}")
+            print(f"📈 Plot saved to: {PLOT_FILE}")
+
+        except Exception as e:
+            print("❌ Error while generating summary. Make sure Gemma3 is running and accessible.\n", e)
 
-except Exception as e:
-    print("❌ Error while generating summary. Make sure Gemma3 is running and accessible.\n", e)
+if __name__ == "__main__":
+    main()
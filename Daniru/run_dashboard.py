@@ -2,8 +2,12 @@
 """
 Apple Market Analyzer Dashboard Launcher
 This script provides an easy way to launch the Streamlit dashboard
+
+The dashboard starts straight away on the last good analysis artifacts while
+pipeline.py refreshes any stale ones in the background (--no-refresh skips it).
 """
 
+import argparse
 import subprocess
 import sys
 import os
@@ -45,7 +49,6 @@ def check_data_files():
     required_files = [
         'Walmart_customer_fixed.csv',
         'apple_ratings/apple_ratings_summary.txt',
-        'apple_sales/apple_sales_summary.txt',
         'price_elasticity/price_elasticity_summary.txt',
         'product_domination/product_domination_summary.txt'
     ]
@@ -66,6 +69,44 @@ def check_data_files():
     print("✅ All required data files found")
     return True
 
+def start_background_refresh():
+    """
+    Start pipeline.py in the background
+    
+    Its output goes to .pipeline/refresh.log so it does not interleave with
+    Streamlit's. The dashboard picks refreshed artifacts up on its next rerun.
+    
+    Returns:
+        subprocess.Popen: The refresh process, or None if it could not start
+    """
+    try:
+        os.makedirs(".pipeline", exist_ok=True)
+        log_path = os.path.join(".pipeline", "refresh.log")
+        with open(log_path, "w", encoding="utf-8") as log_file:
+            process = subprocess.Popen(
+                [sys.executable, "pipeline.py"],
+                stdout=log_file,
+                stderr=subprocess.STDOUT
+            )
+        print(f"🔄 Refreshing analysis artifacts in the background (log: {log_path})")
+        return process
+    except Exception as e:
+        print(f"⚠️  Could not start background refresh: {str(e)}")
+        print("💡 Run it manually: python pipeline.py")
+        return None
+
+def stop_background_refresh(process):
+    """Stop the background refresh if it is still running"""
+    if process is None or process.poll() is not None:
+        return
+    
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    print("🛑 Background refresh stopped")
+
 def launch_dashboard():
     """Launch the Streamlit dashboard"""
     try:
@@ -90,6 +131,11 @@ def launch_dashboard():
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Launch the Apple Market Analyzer dashboard")
+    parser.add_argument("--no-refresh", action="store_true",
+                        help="don't refresh analysis artifacts in the background")
+    args = parser.parse_args()
+    
     print("🍎 Apple Market Analyzer Dashboard Launcher")
     print("=" * 50)
     
@@ -108,8 +154,14 @@ def main():
     
     print("\n" + "="*50)
     
+    # Refresh stale artifacts while the dashboard serves the last good ones
+    refresh = None if args.no_refresh else start_background_refresh()
+    
     # Launch dashboard
-    launch_dashboard()
+    try:
+        launch_dashboard()
+    finally:
+        stop_background_refresh(refresh)
 
 if __name__ == "__main__":
     main()
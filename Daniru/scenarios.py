@@ -0,0 +1,230 @@
+"""
+Price what-if scenarios from cached demand-model components
+
+Monthly Apple revenue (in total and for each of the top products) is fitted
+with Prophet, with the month's average Market_Price, share of discounted
+purchases (Discount_Applied) and average Competitor_Price as extra
+regressors. Prophet's forecast is a sum of components:
+
+    yhat = trend + seasonality + sum_j coef_j * (x_j - center_j)
+
+fit() stores each series' trend, seasonality, regressor values and regressor
+effects per month together with the coefficients, and a scenario ("prices
++5%, 10 points more purchases discounted") is evaluated as
+
+    yhat' = yhat + sum_j coef_j * (x'_j - x_j)
+
+over the forecast months, in array arithmetic on every series at once. Moving
+a slider on the dashboard never refits anything.
+
+Forecast months carry each regressor at its average over the last
+CARRY_MONTHS months, so the baseline scenario assumes prices and discounts
+stay where they recently were.
+
+    python scenarios.py --refit               # fit and store the components
+    python scenarios.py --price 5 --discount -10
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+
+REGRESSORS = ("Market_Price", "Discount_Applied", "Competitor_Price")
+HORIZON = 6
+CARRY_MONTHS = 3
+TOTAL = "All Apple products"
+
+COMPONENTS_FILE = os.path.join(".pipeline", "scenario_components.parquet")
+
+def monthly_demand(apple_sales, product=None):
+    """
+    Monthly revenue with the month's regressor values
+
+    Args:
+        apple_sales (pd.DataFrame): Output of forecasting.load_apple_sales()
+        product (str): Optional Product_Name to keep
+
+    Returns:
+        pd.DataFrame: ds (month end), y (revenue), and the REGRESSORS
+            (Discount_Applied as the share of discounted purchases)
+    """
+    df = apple_sales[apple_sales["Purchase_Date"].notna()]
+    if product is not None:
+        df = df[df["Product_Name"] == product]
+    df = df[["Purchase_Date", "Purchase_Amount", "Market_Price", "Competitor_Price"]].assign(
+        Discount_Applied=df["Discount_Applied"].eq("Yes").astype(float))
+
+    monthly = df.set_index("Purchase_Date").resample("ME").agg({
+        "Purchase_Amount": "sum", "Market_Price": "mean", "Discount_Applied": "mean", "Competitor_Price": "mean",
+    })
+    # Months without sales have no prices; they take their neighbours'
+    monthly[list(REGRESSORS)] = monthly[list(REGRESSORS)].ffill().bfill()
+    return monthly.reset_index().rename(columns={"Purchase_Date": "ds", "Purchase_Amount": "y"})
+
+def decompose(history, horizon=HORIZON):
+    """
+    Fit one demand model and break its forecast into components
+
+    Args:
+        history (pd.DataFrame): Output of monthly_demand()
+        horizon (int): Months to forecast
+
+    Returns:
+        pd.DataFrame: One row per history and forecast month: ds, y (NaN
+            for forecast months), trend, seasonality, yhat, and per
+            regressor its value, its effect on yhat and its coefficient
+            (coef_<regressor>, revenue per unit)
+    """
+    import forecasting
+    from prophet.utilities import regressor_coefficients
+
+    model = forecasting.fit_model(history[["ds", "y"] + list(REGRESSORS)], REGRESSORS)
+    future = model.make_future_dataframe(periods=horizon, freq="ME")
+    future = future.merge(history[["ds"] + list(REGRESSORS)], on="ds", how="left")
+    future = future.fillna(history[list(REGRESSORS)].tail(CARRY_MONTHS).mean())
+
+    with span("predict", horizon=horizon):
+        forecast = model.predict(future)
+    coef = regressor_coefficients(model).set_index("regressor")["coef"]
+
+    frame = pd.DataFrame({
+        "ds": forecast["ds"],
+        "y": future[["ds"]].merge(history[["ds", "y"]], on="ds", how="left")["y"],
+        "trend": forecast["trend"],
+        "seasonality": forecast["additive_terms"] - forecast["extra_regressors_additive"],
+        "yhat": forecast["yhat"],
+    })
+    for regressor in REGRESSORS:
+        frame[regressor] = future[regressor]
+        frame[f"effect_{regressor}"] = forecast[regressor]
+        frame[f"coef_{regressor}"] = coef[regressor]
+    return frame
+
+def fit(apple_sales, horizon=HORIZON):
+    """
+    Fit the demand models of Apple's total and top products' revenue
+
+    Returns:
+        pd.DataFrame: decompose() rows of every series, with a series column
+    """
+    import product_domination
+
+    products = product_domination.top_products(product_domination.aggregate(apple_sales))
+    frames = []
+    for product in [None] + products:
+        with span("fit", series=product or TOTAL):
+            frame = decompose(monthly_demand(apple_sales, product), horizon)
+        frames.append(frame.assign(series=product or TOTAL))
+    components = pd.concat(frames, ignore_index=True)
+    return components[["series"] + [c for c in components.columns if c != "series"]]
+
+def save(components, path=COMPONENTS_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    components.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+class Scenarios:
+    """
+    Stored demand-model components, re-evaluated under price and discount changes
+
+    Args:
+        components (pd.DataFrame): Output of fit()
+    """
+
+    def __init__(self, components):
+        self.components = components.reset_index(drop=True)
+        self.series = list(self.components["series"].unique())
+        self.codes = pd.Categorical(self.components["series"], categories=self.series).codes
+        self.yhat = self.components["yhat"].to_numpy()
+        self.x = self.components[list(REGRESSORS)].to_numpy()
+        self.coef = self.components[[f"coef_{r}" for r in REGRESSORS]].to_numpy()
+        self.future = self.components["y"].isna().to_numpy()
+
+    @classmethod
+    def load(cls, path=COMPONENTS_FILE):
+        """Load stored components, or None if the models have not been fitted"""
+        if not os.path.exists(path):
+            return None
+        return cls(pd.read_parquet(path))
+
+    def simulate(self, price=0.0, discount=0.0, competitor=0.0):
+        """
+        Forecast every series under a scenario
+
+        Args:
+            price (float): Change in average Market_Price, percent
+            discount (float): Change in the share of discounted purchases,
+                percentage points (the share stays within 0-100%)
+            competitor (float): Change in average Competitor_Price, percent
+
+        Returns:
+            np.ndarray: yhat per components row, floored at zero (revenue);
+                history months keep the fitted values
+        """
+        change = np.column_stack([
+            self.x[:, 0] * price / 100,
+            np.clip(self.x[:, 1] + discount / 100, 0, 1) - self.x[:, 1],
+            self.x[:, 2] * competitor / 100,
+        ])
+        return np.maximum(self.yhat + self.future * (change * self.coef).sum(axis=1), 0)
+
+    def frame(self, series, **changes):
+        """
+        One series' components with its scenario forecast
+
+        Args:
+            series (str): One of self.series
+            **changes: simulate() arguments
+
+        Returns:
+            pd.DataFrame: The series' components rows plus a scenario column
+        """
+        rows = self.codes == self.series.index(series)
+        return self.components[rows].assign(scenario=self.simulate(**changes)[rows])
+
+    def summary(self, **changes):
+        """
+        Forecast revenue over the horizon per series, baseline against scenario
+
+        Returns:
+            pd.DataFrame: series, baseline, scenario and change (percent)
+        """
+        weights = self.future.astype(float)
+        baseline = np.bincount(self.codes, weights * self.simulate(), minlength=len(self.series))
+        changed = np.bincount(self.codes, weights * self.simulate(**changes), minlength=len(self.series))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = np.where(baseline > 0, (changed / baseline - 1) * 100, np.nan)
+        return pd.DataFrame({"series": self.series, "baseline": baseline, "scenario": changed, "change": change})
+
+def main():
+    import forecasting
+
+    parser = argparse.ArgumentParser(description="Evaluate price and discount scenarios on Apple's demand models")
+    parser.add_argument("--data", default="Walmart_customer_fixed.csv", help="CSV to fit on")
+    parser.add_argument("--refit", action="store_true", help="fit the demand models even if components are stored")
+    parser.add_argument("--price", type=float, default=0.0, help="change in average price (%%)")
+    parser.add_argument("--discount", type=float, default=0.0, help="change in discounted purchases (percentage points)")
+    parser.add_argument("--competitor", type=float, default=0.0, help="change in competitor price (%%)")
+    args = parser.parse_args()
+
+    scenarios = None if args.refit else Scenarios.load()
+    if scenarios is None:
+        components = fit(forecasting.load_apple_sales(args.data))
+        save(components)
+        print(f"💾 Components saved to: {COMPONENTS_FILE}")
+        scenarios = Scenarios(components)
+
+    summary = scenarios.summary(price=args.price, discount=args.discount, competitor=args.competitor)
+    print(f"🎛️ Price {args.price:+.1f}%, discounts {args.discount:+.1f} pts, competitor price {args.competitor:+.1f}% "
+          f"over the next {int(scenarios.future.sum() / len(scenarios.series))} months:")
+    for row in summary.itertuples():
+        change = "n/a" if np.isnan(row.change) else f"{row.change:+.1f}%"
+        print(f"   {row.series:<25} {row.baseline:>12,.2f} -> {row.scenario:>12,.2f}  ({change})")
+
+if __name__ == "__main__":
+    main()
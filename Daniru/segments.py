@@ -0,0 +1,288 @@
+"""
+Customer segmentation
+
+Customers from the feature store (see customer_features.py) are clustered
+on spend, frequency, discount share, age, rating and brand mix with
+mini-batch k-means over standardized float32 feature arrays. Restarts from
+different seeds run in parallel and the one with the lowest inertia wins.
+
+Segments are numbered by average spend, highest first, and named after the
+features that set them apart most (e.g. "S1: high spend, frequent").
+Assignments are persisted next to the feature store, where the dashboard's
+Segment filter and campaign planning read them:
+
+    python segments.py            # fit on the whole feature store
+    python segments.py --update   # fold in customers changed since the last run
+
+An update runs k-means' partial_fit on the customers whose order count
+changed (new transactions) or who are new, and reassigns only those, so
+everyone else keeps their segment between refits.
+"""
+
+import argparse
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import customer_features
+from instrumentation import span
+
+SEGMENTS_FILE = os.path.join(customer_features.STORE_DIR, "segments.parquet")
+MODEL_FILE = os.path.join(customer_features.STORE_DIR, "segmenter.pkl")
+
+# Feature columns clustered on; spend is log-scaled first because a few big
+# spenders would otherwise get segments of their own
+SEGMENT_FEATURES = ("monetary", "frequency", "discount_share", "age", "avg_rating", "brand_loyalty", "brands")
+LOG_FEATURES = ("monetary",)
+
+SEGMENTS = 5
+RESTARTS = 4
+BATCH_SIZE = 4096
+
+# (feature, direction) -> how a segment standing out on it is described
+DESCRIPTIONS = {
+    ("monetary", 1): "high spend", ("monetary", -1): "low spend",
+    ("frequency", 1): "frequent", ("frequency", -1): "one-off",
+    ("discount_share", 1): "discount-driven", ("discount_share", -1): "full price",
+    ("age", 1): "older", ("age", -1): "younger",
+    ("avg_rating", 1): "satisfied", ("avg_rating", -1): "critical",
+    ("brand_loyalty", 1): "brand-loyal", ("brand_loyalty", -1): "brand-switching",
+    ("brands", 1): "multi-brand", ("brands", -1): "single-brand",
+}
+
+class Segmenter:
+    """
+    Mini-batch k-means over standardized customer features
+
+    Args:
+        n_segments (int): Number of segments
+        batch_size (int): Customers per mini-batch
+        random_state (int): Seed of the first restart; restart i uses seed + i
+    """
+
+    def __init__(self, n_segments=SEGMENTS, batch_size=BATCH_SIZE, random_state=0):
+        self.n_segments = n_segments
+        self.batch_size = batch_size
+        self.random_state = random_state
+        self.model = None
+        self.mean_ = None
+        self.scale_ = None
+        self.fill_ = None
+        self.order_ = None
+        self.names_ = None
+
+    @staticmethod
+    def _values(features):
+        """Segment features as a float64 array, LOG_FEATURES log-scaled"""
+        values = features[list(SEGMENT_FEATURES)].to_numpy(dtype=np.float64)
+        for column in LOG_FEATURES:
+            i = SEGMENT_FEATURES.index(column)
+            values[:, i] = np.log1p(values[:, i])
+        return values
+
+    def _matrix(self, features):
+        """Standardized float32 array of the segment features"""
+        values = self._values(features)
+        # Unrated customers and missing ages take the fitted mean
+        values = np.where(np.isnan(values), self.fill_, values)
+        return ((values - self.mean_) / self.scale_).astype(np.float32)
+
+    def fit(self, features, restarts=RESTARTS, workers=None):
+        """
+        Fit the segments on a feature table
+
+        Args:
+            features (pd.DataFrame): Customer features (see customer_features)
+            restarts (int): k-means runs from different seeds
+            workers (int): Threads running restarts, defaults to one per restart
+
+        Returns:
+            Segmenter: self
+        """
+        from sklearn.cluster import MiniBatchKMeans
+        from threadpoolctl import threadpool_limits
+
+        values = self._values(features)
+        self.mean_ = self.fill_ = np.nanmean(values, axis=0)
+        self.scale_ = np.nanstd(values, axis=0)
+        self.scale_[self.scale_ == 0] = 1
+        X = self._matrix(features)
+
+        def restart(seed):
+            return MiniBatchKMeans(n_clusters=self.n_segments, batch_size=self.batch_size, n_init=1,
+                                   random_state=seed).fit(X)
+
+        # The k-means loops release the GIL, so threads share X without
+        # copies; each restart gets its share of the cores for its OpenMP loops
+        workers = workers or restarts
+        with threadpool_limits(limits=max(1, (os.cpu_count() or 1) // workers), user_api="openmp"), \
+                ThreadPoolExecutor(max_workers=workers) as pool:
+            runs = list(pool.map(restart, range(self.random_state, self.random_state + restarts)))
+        self.model = min(runs, key=lambda run: run.inertia_)
+
+        # Number segments by spend, highest first, so names stay put across refits
+        spend = self.model.cluster_centers_[:, SEGMENT_FEATURES.index("monetary")]
+        self.order_ = np.argsort(np.argsort(-spend))
+        self.names_ = self._names()
+        return self
+
+    def partial_fit(self, features):
+        """
+        Move the segment centres towards new or changed customers
+
+        Segment numbers and names stay as fitted, so assignments made before
+        and after an update read the same.
+        """
+        X = self._matrix(features)
+        for start in range(0, len(X), self.batch_size):
+            self.model.partial_fit(X[start:start + self.batch_size])
+        return self
+
+    def predict(self, features):
+        """Segment number (0 = highest spend) of each customer"""
+        return self.order_[self.model.predict(self._matrix(features))]
+
+    def centers(self):
+        """
+        Segment centres in feature units
+
+        Returns:
+            pd.DataFrame: One row per segment number, SEGMENT_FEATURES columns
+        """
+        centers = self.model.cluster_centers_ * self.scale_ + self.mean_
+        for column in LOG_FEATURES:
+            i = SEGMENT_FEATURES.index(column)
+            centers[:, i] = np.expm1(centers[:, i])
+        frame = pd.DataFrame(centers, columns=SEGMENT_FEATURES, index=self.order_)
+        return frame.sort_index()
+
+    def _names(self):
+        """Segment number -> name, from the two features setting it apart most"""
+        z = self.model.cluster_centers_
+        names = {}
+        for cluster, segment in enumerate(self.order_):
+            top = np.argsort(-np.abs(z[cluster]))[:2]
+            words = [DESCRIPTIONS[(SEGMENT_FEATURES[i], 1 if z[cluster, i] > 0 else -1)] for i in top]
+            names[int(segment)] = f"S{segment + 1}: {', '.join(words)}"
+        return names
+
+    def save(self, path=MODEL_FILE):
+        """Pickle the segmenter, swapping the file into place"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path=MODEL_FILE):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+def _assignments(segmenter, features):
+    segment = segmenter.predict(features)
+    names = segmenter.names_
+    return pd.DataFrame({
+        "Customer_ID": features.index.to_numpy(),
+        "segment": segment,
+        "Segment": pd.Series(segment).map(names).to_numpy(),
+        # Order count at assignment; a changed count marks new transactions
+        "frequency": features["frequency"].to_numpy(),
+    })
+
+def _save_assignments(assignments, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    assignments.to_parquet(tmp_path, index=False, compression="zstd")
+    os.replace(tmp_path, path)
+
+def fit(store_dir=customer_features.STORE_DIR, n_segments=SEGMENTS, restarts=RESTARTS):
+    """
+    Segment every customer in a feature store and persist the assignments
+
+    Returns:
+        tuple: (Segmenter, assignments DataFrame)
+    """
+    features = customer_features.load_features(SEGMENT_FEATURES, store_dir)
+    if features is None:
+        raise FileNotFoundError(f"No customer feature store in {store_dir}; run customer_features.py first")
+
+    with span("segment", customers=len(features), segments=n_segments):
+        segmenter = Segmenter(n_segments).fit(features, restarts)
+        assignments = _assignments(segmenter, features)
+    segmenter.save(os.path.join(store_dir, os.path.basename(MODEL_FILE)))
+    _save_assignments(assignments, os.path.join(store_dir, os.path.basename(SEGMENTS_FILE)))
+    return segmenter, assignments
+
+def update(store_dir=customer_features.STORE_DIR):
+    """
+    Fold new and changed customers into the persisted segments
+
+    Returns:
+        tuple: (Segmenter, assignments DataFrame, customers reassigned)
+    """
+    segments_path = os.path.join(store_dir, os.path.basename(SEGMENTS_FILE))
+    segmenter = Segmenter.load(os.path.join(store_dir, os.path.basename(MODEL_FILE)))
+    assignments = pd.read_parquet(segments_path).set_index("Customer_ID")
+    features = customer_features.load_features(SEGMENT_FEATURES, store_dir)
+
+    assigned = assignments["frequency"].reindex(features.index)
+    changed = features[assigned.isna().to_numpy() | (assigned.to_numpy() != features["frequency"].to_numpy())]
+    with span("segment_update", customers=len(changed)):
+        if len(changed):
+            segmenter.partial_fit(changed)
+            fresh = _assignments(segmenter, changed).set_index("Customer_ID")
+            # Customers no longer in the store are dropped
+            assignments = pd.concat([assignments.drop(changed.index, errors="ignore"), fresh])
+            assignments = assignments.loc[assignments.index.isin(features.index)]
+    segmenter.save(os.path.join(store_dir, os.path.basename(MODEL_FILE)))
+    _save_assignments(assignments.reset_index(), segments_path)
+    return segmenter, assignments.reset_index(), len(changed)
+
+def load_assignments(path=SEGMENTS_FILE):
+    """
+    Read the persisted segment names
+
+    Returns:
+        pd.Series: Segment name indexed by Customer_ID, or None if the
+            segments have not been fitted
+    """
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path, columns=["Customer_ID", "Segment"]).set_index("Customer_ID")["Segment"]
+
+def attach(df, assignments):
+    """
+    Add a Segment column to transactions, matched on Customer_ID
+
+    Customers missing from the assignments (new since the last fit) get
+    "Unassigned".
+    """
+    segment = df["Customer_ID"].map(assignments).fillna("Unassigned")
+    return df.assign(Segment=segment.to_numpy(dtype=object))
+
+def main():
+    parser = argparse.ArgumentParser(description="Segment the customers in the feature store")
+    parser.add_argument("--store", default=customer_features.STORE_DIR, help="customer feature store directory")
+    parser.add_argument("--update", action="store_true", help="partial_fit new and changed customers only")
+    parser.add_argument("--segments", type=int, default=SEGMENTS, help="number of segments (full fit)")
+    parser.add_argument("--restarts", type=int, default=RESTARTS, help="parallel k-means restarts (full fit)")
+    args = parser.parse_args()
+
+    if args.update:
+        segmenter, assignments, changed = update(args.store)
+        print(f"🔁 {changed:,} new or changed customers reassigned")
+    else:
+        segmenter, assignments = fit(args.store, args.segments, args.restarts)
+
+    sizes = assignments["segment"].value_counts()
+    centers = segmenter.centers()
+    print(f"🧩 {len(assignments):,} customers in {segmenter.n_segments} segments:")
+    for segment, name in sorted(segmenter.names_.items()):
+        center = centers.loc[segment]
+        print(f"   {name:<40} {sizes.get(segment, 0):>9,} customers  spend {center['monetary']:>9,.2f}  "
+              f"orders {center['frequency']:.1f}  discount {center['discount_share']:.0%}  age {center['age']:.0f}")
+
+if __name__ == "__main__":
+    main()
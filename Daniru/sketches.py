@@ -0,0 +1,300 @@
+"""
+Mergeable sketches for top-K and distinct counts over high-cardinality columns
+
+- SpaceSaving keeps the heaviest keys by total weight (revenue per City or
+  Product_Name) in a fixed number of counters, each with an error bound.
+- HyperLogLog estimates the number of distinct values (Customer_IDs) in
+  2 ** precision one-byte registers, within about 1.04 / sqrt(2 ** precision)
+  (0.8% at the default precision).
+
+Both are updated a chunk at a time and are mergeable: merging two sketches
+gives the same guarantees as one sketch over both inputs, so a sketch can be
+built per chunk or per day and combined later without rereading the rows. Sketches bundles the ones the
+dashboard tiles read and persists them to one .npz file:
+
+    python sketches.py Walmart_customer_fixed.csv --save .pipeline/sketches.npz
+    python sketches.py --merge day1.npz day2.npz --save week.npz
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.util import hash_array
+
+import dedup
+import validation
+from instrumentation import span
+
+# Counters kept per SpaceSaving sketch; top-10 answers are exact unless the
+# tail of the distribution is within the error bound of the 10th key
+CAPACITY = 1_000
+PRECISION = 14
+# Bytes of CSV parsed per chunk (about 200,000 rows of the Walmart file)
+CHUNK_BYTES = 32 << 20
+
+# Columns a Sketches bundle reads
+SKETCH_COLUMNS = ("Brand", "City", "Product_Name", "Customer_ID", "Purchase_Amount")
+
+class SpaceSaving:
+    """
+    Heaviest keys by total weight, in at most `capacity` counters
+
+    Every kept key's count overestimates its true total by at most its
+    error, and any key not kept has a true total of at most min_count().
+    """
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=float)
+        self.errors = pd.Series(dtype=float)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def min_count(self):
+        """Bound on the total of any key that is not kept (0 until full)"""
+        return float(self.counts.min()) if len(self.counts) >= self.capacity else 0.0
+
+    def update(self, keys, weights=None):
+        """
+        Add a chunk of keys, each with a weight (1 if None)
+
+        The chunk is totalled per key first, so this costs one pass over the
+        chunk plus a merge of at most capacity + distinct keys counters.
+        """
+        codes, uniques = pd.factorize(np.asarray(keys), use_na_sentinel=True)
+        present = codes >= 0
+        weights = np.ones(len(codes)) if weights is None else np.asarray(weights, dtype=float)
+        totals = np.bincount(codes[present], weights=weights[present], minlength=len(uniques))
+
+        chunk = SpaceSaving(self.capacity)
+        chunk.counts = pd.Series(totals, index=uniques)
+        chunk.errors = pd.Series(0.0, index=uniques)
+        self.merge(chunk, truncate_other=False)
+
+    def merge(self, other, truncate_other=True):
+        """
+        Merge another sketch into this one
+
+        A key missing from one side is counted at that side's min_count(),
+        its largest possible total there, which keeps the error bounds valid.
+        """
+        own_floor = self.min_count()
+        other_floor = other.min_count() if truncate_other else 0.0
+        keys = self.counts.index.union(other.counts.index)
+
+        counts = self.counts.reindex(keys, fill_value=own_floor) + other.counts.reindex(keys, fill_value=other_floor)
+        errors = self.errors.reindex(keys, fill_value=own_floor) + other.errors.reindex(keys, fill_value=other_floor)
+
+        kept = counts.nlargest(self.capacity, keep="first").index
+        self.counts, self.errors = counts[kept], errors[kept]
+
+    def top(self, n=10):
+        """
+        The n heaviest keys
+
+        Returns:
+            pd.DataFrame: Indexed by key, with columns estimate (an upper
+                bound) and error (estimate - error is a lower bound)
+        """
+        top = self.counts.nlargest(n, keep="first")
+        return pd.DataFrame({"estimate": top, "error": self.errors[top.index]})
+
+class HyperLogLog:
+    """Distinct count estimate in 2 ** precision one-byte registers"""
+
+    def __init__(self, precision=PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values):
+        """Add a chunk of values; missing values are skipped"""
+        values = pd.Series(values).dropna().to_numpy()
+        if not len(values):
+            return
+        hashes = hash_array(values, categorize=False)
+
+        bucket = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        rest = hashes & np.uint64((1 << (64 - self.precision)) - 1)
+        # Rank = position of the leftmost 1 bit in the remaining bits;
+        # bit lengths are taken from 32-bit halves, which floats hold exactly
+        high = (rest >> np.uint64(32)).astype(np.float64)
+        low = (rest & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        with np.errstate(divide="ignore"):
+            bit_length = np.where(high > 0, 33 + np.floor(np.log2(high)),
+                                  np.where(low > 0, 1 + np.floor(np.log2(low)), 0))
+        rank = (64 - self.precision + 1 - bit_length).astype(np.uint8)
+        np.maximum.at(self.registers, bucket, rank)
+
+    def merge(self, other):
+        """Merge another sketch of the same precision into this one"""
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches of precision {self.precision} and {other.precision}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        """Estimated number of distinct values"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+        empty = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and empty:
+            # Linear counting is more accurate while many registers are empty
+            estimate = m * np.log(m / empty)
+        return int(round(estimate))
+
+class Sketches:
+    """
+    The sketches behind the dashboard tiles, over Apple rows
+
+    Attributes:
+        top_cities (SpaceSaving): Apple revenue per City
+        top_products (SpaceSaving): Apple revenue per Product_Name
+        customers (HyperLogLog): Distinct Apple Customer_IDs
+        rows (int): Apple rows added
+    """
+
+    def __init__(self, capacity=CAPACITY, precision=PRECISION):
+        self.top_cities = SpaceSaving(capacity)
+        self.top_products = SpaceSaving(capacity)
+        self.customers = HyperLogLog(precision)
+        self.rows = 0
+
+    def update(self, df):
+        """Add the Apple rows of a chunk of transactions"""
+        apple = df[df["Brand"].str.lower() == "apple"]
+        amount = pd.to_numeric(apple["Purchase_Amount"], errors="coerce").fillna(0).to_numpy()
+        self.top_cities.update(apple["City"].to_numpy(), amount)
+        self.top_products.update(apple["Product_Name"].to_numpy(), amount)
+        self.customers.update(apple["Customer_ID"].to_numpy())
+        self.rows += len(apple)
+
+    def merge(self, other):
+        """Merge another bundle (another chunk, file or day) into this one"""
+        self.top_cities.merge(other.top_cities)
+        self.top_products.merge(other.top_products)
+        self.customers.merge(other.customers)
+        self.rows += other.rows
+
+    def save(self, path):
+        """Write the bundle to an .npz file, swapping it into place"""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {"rows": np.array(self.rows), "precision": np.array(self.customers.precision),
+                  "customers": self.customers.registers}
+        for name in ("top_cities", "top_products"):
+            sketch = getattr(self, name)
+            arrays.update({
+                f"{name}_capacity": np.array(sketch.capacity),
+                f"{name}_keys": sketch.counts.index.to_numpy(dtype=str),
+                f"{name}_counts": sketch.counts.to_numpy(),
+                f"{name}_errors": sketch.errors.to_numpy(),
+            })
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a bundle written by save()"""
+        with np.load(path) as data:
+            sketches = cls(precision=int(data["precision"]))
+            sketches.rows = int(data["rows"])
+            sketches.customers.registers = data["customers"].copy()
+            for name in ("top_cities", "top_products"):
+                sketch = SpaceSaving(int(data[f"{name}_capacity"]))
+                keys = data[f"{name}_keys"].astype(object)
+                sketch.counts = pd.Series(data[f"{name}_counts"], index=keys)
+                sketch.errors = pd.Series(data[f"{name}_errors"], index=keys)
+                setattr(sketches, name, sketch)
+        return sketches
+
+def read_chunks(file_path, columns, chunk_bytes=CHUNK_BYTES):
+    """
+    Stream a CSV as DataFrame chunks with pyarrow's multi-threaded reader
+
+    Purchase_Amount is parsed as a float and every other column as text, as
+    a whole-file read would on this data, so each chunk has the same dtypes.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pv
+
+    header = pd.read_csv(file_path, nrows=0).columns
+    columns = [column for column in header if column in columns]
+    types = {column: pa.float64() if column == "Purchase_Amount" else pa.string() for column in columns}
+    reader = pv.open_csv(
+        file_path,
+        read_options=pv.ReadOptions(block_size=chunk_bytes),
+        convert_options=pv.ConvertOptions(include_columns=columns, column_types=types)
+    )
+    for batch in reader:
+        yield batch.to_pandas()
+
+def build(file_path, chunk_bytes=CHUNK_BYTES, seen=None):
+    """
+    Sketch a CSV a chunk at a time
+
+    Each chunk is deduplicated against every earlier chunk (see dedup.py)
+    and validated (see validation.py) as utils.load_and_clean_data would,
+    so the sketches describe the same rows as the dashboard's exact path.
+
+    Args:
+        file_path (str): CSV to read
+        chunk_bytes (int): Bytes of CSV parsed per chunk
+        seen (dedup.SeenSet): Transactions from earlier loads, to dedupe an
+            incremental file (such as one day's rows) against history
+
+    Returns:
+        Sketches: The filled bundle
+    """
+    seen = seen if seen is not None else dedup.SeenSet()
+    sketches = Sketches()
+
+    with span("sketch", file=file_path) as info:
+        for chunk in read_chunks(file_path, set(SKETCH_COLUMNS) | set(dedup.DEFAULT_KEY), chunk_bytes):
+            chunk, _ = dedup.drop_duplicates(chunk, seen=seen, remember=False)
+            chunk, _ = validation.apply(chunk)
+            seen.add(dedup.fingerprint(chunk))
+            sketches.update(chunk)
+        info.update(apple_rows=sketches.rows)
+    return sketches
+
+def _format_top(top):
+    return "\n".join(f"   {key:<30} {row.estimate:>14,.2f}  ± {row.error:,.2f}" for key, row in top.iterrows())
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or merge the dashboard sketches")
+    parser.add_argument("csv", nargs="?", help="CSV to sketch")
+    parser.add_argument("--merge", nargs="+", default=[], help="saved bundles (.npz) to merge in")
+    parser.add_argument("--save", help="write the resulting bundle to this .npz file")
+    parser.add_argument("--chunk-mb", type=int, default=CHUNK_BYTES >> 20, help="MB of CSV parsed per chunk")
+    parser.add_argument("--exact", action="store_true", help="also compute the exact answers from the CSV to compare")
+    args = parser.parse_args()
+
+    if not args.csv and not args.merge:
+        parser.error("give a CSV to sketch and/or --merge bundles")
+
+    sketches = build(args.csv, args.chunk_mb << 20) if args.csv else Sketches()
+    for path in args.merge:
+        sketches.merge(Sketches.load(path))
+
+    print(f"🍎 {sketches.rows:,} Apple rows sketched")
+    print(f"👥 ≈ {sketches.customers.count():,} distinct customers")
+    print(f"🌍 Top cities by revenue:\n{_format_top(sketches.top_cities.top(10))}")
+    print(f"🏆 Top products by revenue:\n{_format_top(sketches.top_products.top(5))}")
+
+    if args.exact and args.csv:
+        import utils
+
+        _, apple_df = utils.load_and_clean_data(args.csv, columns=list(SKETCH_COLUMNS))
+        print(f"\n🎯 Exact: {apple_df['Customer_ID'].nunique():,} distinct customers")
+        print(apple_df.groupby("City")["Purchase_Amount"].sum().nlargest(10).to_string())
+
+    if args.save:
+        sketches.save(args.save)
+        print(f"💾 Sketches saved to: {args.save}")
+
+if __name__ == "__main__":
+    main()
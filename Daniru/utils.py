@@ -2,53 +2,109 @@
 Utility functions for the Apple Market Analyzer Dashboard
 """
 
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import os
-from PIL import Image
 import streamlit as st
 
-def load_and_clean_data(file_path="Walmart_customer_fixed.csv"):
+from instrumentation import span
+
+def dataset_version(file_path="Walmart_customer_fixed.csv"):
+    """
+    Get a cheap version token for a data file
+    
+    The token changes whenever the file is rewritten, so it can be used as a
+    cache key without hashing the file contents.
+    
+    Args:
+        file_path (str): Path to the data file
+        
+    Returns:
+        str: "<size>-<mtime_ns>" token, or "missing" if the file does not exist
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return "missing"
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+def load_and_clean_data(file_path="Walmart_customer_fixed.csv", columns=None):
     """
     Load and clean the main dataset
     
+    Duplicate transactions are dropped (see dedup.py), then rows with an
+    unusable transaction key, and other invalid values are blanked (see
+    validation.py).
+    
     Args:
         file_path (str): Path to the CSV file
+        columns (list): Columns to load, defaults to every column and group.
+            Brand and the transaction key are always loaded, missing
+            columns are ignored, and demographics.py's groups (Age_Group,
+            Brand_Group, Gender_Group) may be listed like stored columns
         
     Returns:
         tuple: (full_dataframe, apple_dataframe)
     """
+    # Imported here so that pages which never touch the dataset skip pandas
+    import pandas as pd
+    
+    import dedup
+    import demographics
+    import validation
+    
     try:
-        df = pd.read_csv(file_path, low_memory=False)
-        
-        # Drop duplicates
-        df = df.drop_duplicates()
+        with span("load", file=file_path, columns=len(columns) if columns else None):
+            # The pyarrow parser is multi-threaded and gives the same dtypes
+            # as the default one on this data, at about half the time
+            if columns is None:
+                df = pd.read_csv(file_path, engine="pyarrow")
+            else:
+                # The transaction key is read too, so duplicates can be found
+                wanted = set(columns) | {"Brand"} | set(dedup.DEFAULT_KEY) | demographics.sources(columns)
+                header = pd.read_csv(file_path, nrows=0).columns
+                df = pd.read_csv(
+                    file_path,
+                    usecols=[column for column in header if column in wanted],
+                    engine="pyarrow"
+                )
         
-        # Drop mostly empty columns (>50% NA)
-        thresh = 0.5 * df.shape[0]
-        df = df.loc[:, df.isna().sum() <= thresh]
+        # Drop repeated transactions, matched on the transaction key rather
+        # than on every cell of the row
+        df, _ = dedup.drop_duplicates(df)
         
-        # Convert common fields
-        if "Purchase_Date" in df.columns:
-            df["Purchase_Date"] = pd.to_datetime(df["Purchase_Date"], errors="coerce")
-        if "Market_Price" in df.columns:
-            df["Market_Price"] = pd.to_numeric(df["Market_Price"], errors="coerce")
-        if "Purchase_Amount" in df.columns:
-            df["Purchase_Amount"] = pd.to_numeric(df["Purchase_Amount"], errors="coerce")
-        if "Rating" in df.columns:
-            df["Rating"] = pd.to_numeric(df["Rating"], errors="coerce")
+        # Drop rows whose transaction key is unusable and blank invalid
+        # cells; the key is always loaded, so every page keeps the same rows
+        df, _ = validation.apply(df)
+        if columns is not None:
+            df = df.drop(columns=[c for c in dedup.DEFAULT_KEY if c not in columns])
         
-        # Fill missing values
-        if "Purchase_Amount" in df.columns:
-            df["Purchase_Amount"] = df["Purchase_Amount"].fillna(1)
+        with span("clean", rows=len(df)):
+            # Drop mostly empty columns (>50% NA)
+            thresh = 0.5 * df.shape[0]
+            df = df.loc[:, df.isna().sum() <= thresh]
+            
+            # Convert common fields
+            if "Purchase_Date" in df.columns:
+                df["Purchase_Date"] = pd.to_datetime(df["Purchase_Date"], errors="coerce")
+            if "Market_Price" in df.columns:
+                df["Market_Price"] = pd.to_numeric(df["Market_Price"], errors="coerce")
+            if "Purchase_Amount" in df.columns:
+                df["Purchase_Amount"] = pd.to_numeric(df["Purchase_Amount"], errors="coerce")
+            if "Rating" in df.columns:
+                df["Rating"] = pd.to_numeric(df["Rating"], errors="coerce")
+            
+            # Fill missing values
+            if "Purchase_Amount" in df.columns:
+                df["Purchase_Amount"] = df["Purchase_Amount"].fillna(1)
+            
+            # Demographic groups, as categoricals
+            df = demographics.derive(df, columns)
+            if columns is not None:
+                df = df.drop(columns=[c for c in demographics.sources(columns) if c not in columns and c != "Brand"])
         
-        # Filter for Apple products
-        apple_df = df[df["Brand"].str.lower() == "apple"].copy()
+        with span("filter"):
+            # Filter for Apple products (boolean indexing already returns new
+            # column blocks, so no extra .copy() of the slice is needed)
+            apple_df = df[df["Brand"].str.lower() == "apple"]
         
         return df, apple_df
         
@@ -59,280 +115,42 @@ def load_and_clean_data(file_path="Walmart_customer_fixed.csv"):
         st.error(f"Error loading data: {str(e)}")
         return None, None
 
-def create_market_share_chart(df):
-    """
-    Create market share pie chart
-    
-    Args:
-        df (pd.DataFrame): Main dataframe
-        
-    Returns:
-        plotly.graph_objects.Figure: Market share pie chart
-    """
-    if "Brand" not in df.columns or "Purchase_Amount" not in df.columns:
-        return None
-    
-    brand_share = df.groupby("Brand")["Purchase_Amount"].sum().sort_values(ascending=False)
-    brand_share_pct = brand_share / brand_share.sum() * 100
-    
-    fig = px.pie(
-        values=brand_share_pct.values,
-        names=brand_share_pct.index,
-        title="Market Share by Brand",
-        color_discrete_sequence=px.colors.qualitative.Set3
-    )
-    fig.update_traces(textposition='inside', textinfo='percent+label')
-    return fig
-
-def create_ratings_distribution(apple_df):
-    """
-    Create ratings distribution histogram
-    
-    Args:
-        apple_df (pd.DataFrame): Apple-specific dataframe
-        
-    Returns:
-        plotly.graph_objects.Figure: Ratings distribution chart
-    """
-    if "Rating" not in apple_df.columns:
-        return None
-    
-    fig = px.histogram(
-        apple_df.dropna(subset=['Rating']),
-        x='Rating',
-        nbins=10,
-        title="Apple Product Ratings Distribution",
-        color_discrete_sequence=['#1f77b4']
-    )
-    fig.update_layout(showlegend=False)
-    return fig
-
-def create_geographic_analysis(apple_df):
+def share_frame(df):
     """
-    Create geographic sales analysis
+    Prepare a DataFrame to be shared read-only by every dashboard session
     
-    Args:
-        apple_df (pd.DataFrame): Apple-specific dataframe
-        
-    Returns:
-        plotly.graph_objects.Figure: Geographic sales chart
-    """
-    if "City" not in apple_df.columns or "Purchase_Amount" not in apple_df.columns:
-        return None
-    
-    top_cities = apple_df.groupby("City")["Purchase_Amount"].sum().sort_values(ascending=False).head(10)
-    
-    fig = px.bar(
-        x=top_cities.values,
-        y=top_cities.index,
-        orientation='h',
-        title="Top 10 Cities by Apple Sales",
-        labels={'x': 'Total Sales Amount', 'y': 'City'},
-        color=top_cities.values,
-        color_continuous_scale='Blues'
-    )
-    fig.update_layout(height=500)
-    return fig
-
-def create_price_sales_scatter(apple_df):
-    """
-    Create price vs sales scatter plot
+    Text columns become Arrow-backed strings, which take about a third of
+    the memory of Python string objects, and the other columns are rebuilt
+    on read-only numpy arrays, so an accidental in-place write raises
+    instead of changing the data every other session sees.
     
     Args:
-        apple_df (pd.DataFrame): Apple-specific dataframe
-        
-    Returns:
-        plotly.graph_objects.Figure: Price vs sales scatter plot
-    """
-    if "Market_Price" not in apple_df.columns or "Purchase_Amount" not in apple_df.columns:
-        return None
-    
-    fig = px.scatter(
-        apple_df,
-        x="Market_Price",
-        y="Purchase_Amount",
-        title="Apple Price vs Purchase Volume",
-        labels={'Market_Price': 'Market Price ($)', 'Purchase_Amount': 'Purchase Amount ($)'},
-        color='Market_Price',
-        color_continuous_scale='Viridis'
-    )
-    return fig
-
-def create_discount_analysis(df):
-    """
-    Create discount impact analysis
+        df (pd.DataFrame): Frame to share; None is passed through
     
-    Args:
-        df (pd.DataFrame): Main dataframe
-        
     Returns:
-        plotly.graph_objects.Figure: Discount analysis chart
+        pd.DataFrame: The shared frame, with the same columns and index
     """
-    if "Discount_Applied" not in df.columns or "Brand" not in df.columns or "Purchase_Amount" not in df.columns:
-        return None
+    import pandas as pd
     
-    disc_sales = df.groupby(["Brand", "Discount_Applied"])["Purchase_Amount"].sum().unstack(fill_value=0)
-    if "Apple" not in disc_sales.index:
+    if df is None:
         return None
     
-    apple_disc = disc_sales.loc["Apple"]
-    
-    fig = px.bar(
-        x=apple_disc.index,
-        y=apple_disc.values,
-        title="Apple Sales: Discount vs No Discount",
-        labels={'x': 'Discount Applied', 'y': 'Total Sales Amount ($)'},
-        color=apple_disc.values,
-        color_continuous_scale=['red', 'green']
-    )
-    return fig
-
-def create_monthly_trends(apple_df):
-    """
-    Create monthly sales trends
-    
-    Args:
-        apple_df (pd.DataFrame): Apple-specific dataframe
-        
-    Returns:
-        plotly.graph_objects.Figure: Monthly trends chart
-    """
-    if "Purchase_Date" not in apple_df.columns or "Purchase_Amount" not in apple_df.columns:
-        return None
-    
-    if apple_df["Purchase_Date"].notna().any():
-        apple_monthly = apple_df.groupby(pd.Grouper(key="Purchase_Date", freq="M"))["Purchase_Amount"].sum()
-        
-        fig = px.line(
-            x=apple_monthly.index,
-            y=apple_monthly.values,
-            title="Monthly Apple Sales Trend",
-            labels={'x': 'Month', 'y': 'Sales Amount ($)'}
-        )
-        fig.update_traces(mode='lines+markers')
-        return fig
-    return None
-
-def create_weekday_analysis(apple_df):
-    """
-    Create weekday sales analysis
-    
-    Args:
-        apple_df (pd.DataFrame): Apple-specific dataframe
-        
-    Returns:
-        plotly.graph_objects.Figure: Weekday analysis chart
-    """
-    if "Purchase_Date" not in apple_df.columns or "Purchase_Amount" not in apple_df.columns:
-        return None
-    
-    apple_df_copy = apple_df.copy()
-    apple_df_copy["Weekday"] = apple_df_copy["Purchase_Date"].dt.day_name()
-    weekday_sales = apple_df_copy.groupby("Weekday")["Purchase_Amount"].sum().reindex(
-        ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    )
-    
-    fig = px.bar(
-        x=weekday_sales.index,
-        y=weekday_sales.values,
-        title="Apple Sales by Weekday",
-        labels={'x': 'Day of Week', 'y': 'Total Sales Amount ($)'},
-        color=weekday_sales.values,
-        color_continuous_scale='Blues'
-    )
-    return fig
-
-def create_seasonal_analysis(apple_df):
-    """
-    Create seasonal sales analysis
-    
-    Args:
-        apple_df (pd.DataFrame): Apple-specific dataframe
-        
-    Returns:
-        plotly.graph_objects.Figure: Seasonal analysis chart
-    """
-    if "Purchase_Date" not in apple_df.columns or "Purchase_Amount" not in apple_df.columns:
-        return None
-    
-    if not apple_df["Purchase_Date"].notna().any():
-        return None
-    
-    apple_df_copy = apple_df.copy()
-    apple_df_copy["Month"] = apple_df_copy["Purchase_Date"].dt.month
-    apple_df_copy["Day"] = apple_df_copy["Purchase_Date"].dt.day
-    
-    def label_season(row):
-        m, d = row["Month"], row["Day"]
-        if m == 1 and d <= 7:
-            return "New Year"
-        elif m == 12 and d >= 20:
-            return "Christmas"
-        elif m in [8, 9] and (m == 8 or (m == 9 and d <= 15)):
-            return "Back-to-School"
+    columns = {}
+    for column in df.columns:
+        if df[column].dtype == object:
+            columns[column] = df[column].astype("string[pyarrow]").array
+        elif isinstance(df[column].dtype, pd.CategoricalDtype):
+            # Categoricals are already compact; only their codes are locked
+            codes = df[column].cat.codes.to_numpy(copy=True)
+            codes.flags.writeable = False
+            columns[column] = pd.Categorical.from_codes(codes, dtype=df[column].dtype)
         else:
-            return "Other"
-    
-    apple_df_copy["Season"] = apple_df_copy.apply(label_season, axis=1)
-    seasonal_sales = apple_df_copy.groupby("Season")["Purchase_Amount"].sum().sort_values(ascending=False)
-    
-    fig = px.bar(
-        x=seasonal_sales.index,
-        y=seasonal_sales.values,
-        title="Apple Seasonal Sales Spikes",
-        labels={'x': 'Season', 'y': 'Total Sales Amount ($)'},
-        color=seasonal_sales.values,
-        color_continuous_scale='Set2'
-    )
-    return fig
-
-def create_category_analysis(apple_df):
-    """
-    Create product category analysis
-    
-    Args:
-        apple_df (pd.DataFrame): Apple-specific dataframe
-        
-    Returns:
-        plotly.graph_objects.Figure: Category analysis chart
-    """
-    if "Product_Category" not in apple_df.columns or "Purchase_Amount" not in apple_df.columns:
-        return None
-    
-    category_sales = apple_df.groupby("Product_Category")["Purchase_Amount"].sum().sort_values(ascending=False)
-    
-    fig = px.pie(
-        values=category_sales.values,
-        names=category_sales.index,
-        title="Apple Sales by Product Category",
-        color_discrete_sequence=px.colors.qualitative.Set3
-    )
-    return fig
-
-def create_age_group_analysis(apple_df):
-    """
-    Create age group analysis
-    
-    Args:
-        apple_df (pd.DataFrame): Apple-specific dataframe
-        
-    Returns:
-        plotly.graph_objects.Figure: Age group analysis chart
-    """
-    if "Age_Group" not in apple_df.columns or "Purchase_Amount" not in apple_df.columns:
-        return None
-    
-    age_sales = apple_df.groupby("Age_Group")["Purchase_Amount"].sum().sort_values(ascending=False)
-    
-    fig = px.bar(
-        x=age_sales.index,
-        y=age_sales.values,
-        title="Apple Sales by Age Group",
-        labels={'x': 'Age Group', 'y': 'Total Sales Amount ($)'},
-        color=age_sales.values,
-        color_continuous_scale='Blues'
-    )
-    return fig
+            values = df[column].to_numpy(copy=True)
+            values.flags.writeable = False
+            columns[column] = values
+    # copy=False keeps each column on its own read-only array; views of a
+    # read-only array are read-only too
+    return pd.DataFrame(columns, index=df.index, copy=False)
 
 def load_summary_data():
     """
@@ -344,7 +162,6 @@ def load_summary_data():
     summaries = {}
     summary_files = {
         'ratings': 'apple_ratings/apple_ratings_summary.txt',
-        'sales': 'apple_sales/apple_sales_summary.txt',
         'price_elasticity': 'price_elasticity/price_elasticity_summary.txt',
         'product_domination': 'product_domination/product_domination_summary.txt'
     }
@@ -358,27 +175,39 @@ def load_summary_data():
     
     return summaries
 
+@st.cache_data(show_spinner=False)
+def load_forecast_image(file_path, digest):
+    """
+    Load display-ready bytes for one forecast image
+    
+    Args:
+        file_path (str): Path to the full-resolution forecast image
+        digest (str): Hash of the image file, used only as the cache key
+        
+    Returns:
+        bytes: PNG image bytes
+    """
+    import forecast_artifacts
+    
+    return forecast_artifacts.read_display_bytes(file_path)
+
 def load_forecast_images():
     """
-    Load forecast images
+    Load forecast images as display-ready PNG bytes
+    
+    Images are cached by file hash, so a rerun only re-reads an image after
+    the forecast script has rewritten it.
     
     Returns:
-        dict: Dictionary containing PIL Image objects
+        dict: Dictionary containing PNG bytes (None where an image is missing)
     """
-    images = {}
-    image_files = {
-        'ratings': 'apple_ratings/apple_ratings_forecast.png',
-        'sales': 'apple_sales/apple_sales_forecast.png',
-        'price_elasticity': 'price_elasticity/price_elasticity_forecast.png',
-        'product_domination': 'product_domination/product_domination_forecast.png'
-    }
+    import forecast_artifacts
     
-    for key, file_path in image_files.items():
+    images = {}
+    for key, file_path in forecast_artifacts.FORECAST_IMAGES.items():
         try:
-            if os.path.exists(file_path):
-                images[key] = Image.open(file_path)
-            else:
-                images[key] = None
+            digest = forecast_artifacts.file_digest(file_path)
+            images[key] = load_forecast_image(file_path, digest) if digest else None
         except Exception as e:
             print(f"Could not load image {file_path}: {str(e)}")
             images[key] = None
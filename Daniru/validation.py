@@ -0,0 +1,367 @@
+"""
+Schema and rules validation for the Walmart dataset
+
+Every check is a vectorized test over whole columns, and each column is
+parsed at most once however many rules read it, so validating costs a
+single pass over the data. Rules cover:
+
+- types: numeric columns that do not parse, dates that do not parse
+- ranges: Rating, Competitor_Rating, Age, prices, Market_Share, and
+  dates outside the plausible range
+- allowed values: Yes/No flags, Gender, Payment_Method, categories
+- consistency: a product's Category against the category it belongs to,
+  Category against Fixed_Category, the Category_Match flag against both,
+  Purchase_Amount above Market_Price
+- text: values with stray leading/trailing whitespace (checked once per
+  distinct value, not once per row)
+
+Only the transaction key (KEY_COLUMNS) can make a row unusable: "error"
+rules, a missing ID or an unparsable or out-of-range Purchase_Date or
+Purchase_Amount, exclude the row from the clean-row mask. A bad value in any
+other column is "invalid": apply() blanks that one cell and keeps the rest of
+the transaction. "warning" rules are only reported. Since every load reads
+the key columns, every column subset keeps the same rows; rules whose
+columns are not loaded are skipped.
+
+Run it directly for a report on a CSV:
+
+    python validation.py Walmart_customer_fixed.csv --clean-out clean.csv
+"""
+
+import argparse
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span
+
+# The transaction key (as in dedup.DEFAULT_KEY); rows with a bad key are dropped
+KEY_COLUMNS = ("Product_ID", "Customer_ID", "Purchase_Date", "Purchase_Amount")
+ID_COLUMNS = ("Product_ID", "Customer_ID")
+
+# column -> (min, max), None for an open end; values outside are errors in
+# key columns and blanked elsewhere
+RANGES = {
+    "Rating": (1, 5),
+    "Competitor_Rating": (1, 5),
+    "Age": (13, 110),
+    "Market_Price": (0.01, None),
+    "Purchase_Amount": (0.01, None),
+    "Competitor_Price": (0.01, None),
+    "Market_Share": (0, 100),
+}
+
+# column -> (earliest, latest); None means no later than today
+DATE_RANGES = {
+    "Purchase_Date": ("2000-01-01", None),
+}
+
+CATEGORIES = ("Electronics", "Clothing", "Beauty", "Home")
+
+# column -> values expected; others are reported
+ALLOWED_VALUES = {
+    "Discount_Applied": ("Yes", "No"),
+    "Repeat_Customer": ("Yes", "No"),
+    "Promotion_Competitor": ("Yes", "No"),
+    "Gender": ("Male", "Female"),
+    "Payment_Method": ("Cash on Delivery", "Debit Card", "Credit Card"),
+    "Category": CATEGORIES,
+    "Fixed_Category": CATEGORIES,
+}
+
+# Product_Name -> the category it belongs to
+PRODUCT_CATEGORIES = {
+    "Smartphone": "Electronics", "Laptop": "Electronics", "Headphones": "Electronics", "Smartwatch": "Electronics",
+    "Dress": "Clothing", "T-Shirt": "Clothing", "Jeans": "Clothing", "Jacket": "Clothing",
+    "Face Cream": "Beauty", "Lipstick": "Beauty", "Perfume": "Beauty", "Shampoo": "Beauty",
+    "Sofa Cover": "Home", "Curtains": "Home", "Lamp": "Home", "Cookware": "Home",
+}
+
+# Purchase_Amount may exceed Market_Price by this share (rounding, taxes)
+PRICE_TOLERANCE = 0.01
+
+# Text columns checked for stray whitespace; the near-unique IDs are left out
+# because factorizing them costs more than every other check together
+TEXT_COLUMNS = ("Product_Name", "Brand", "Model", "Category", "Fixed_Category", "Discount_Applied",
+                "Feedback", "Gender", "City", "Payment_Method", "Repeat_Customer", "Competitor_Name",
+                "Competitor_Model", "Promotion_Competitor", "Competitor_Feedback")
+
+Rule = namedtuple("Rule", ["name", "severity", "columns", "check", "description"])
+
+class _Columns:
+    """
+    Parses each column at most once, however many rules read it
+
+    Text columns are factorized into integer codes plus their distinct
+    values, so per-value work (membership, trimming, date parsing) runs on a
+    few hundred distinct values instead of every row, and comparisons between
+    columns are integer comparisons.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._numeric = {}
+        self._dates = {}
+        self._codes = {}
+
+    def raw(self, column):
+        return self.df[column]
+
+    def numeric(self, column):
+        if column not in self._numeric:
+            values = self.df[column]
+            self._numeric[column] = values if pd.api.types.is_numeric_dtype(values) else pd.to_numeric(values, errors="coerce")
+        return self._numeric[column]
+
+    def codes(self, column):
+        """(codes, distinct values) of a column; missing values get code -1"""
+        if column not in self._codes:
+            self._codes[column] = pd.factorize(self.df[column])
+        return self._codes[column]
+
+    def dates(self, column):
+        """Column as datetime64 values, NaT where missing or unparsable"""
+        if column not in self._dates:
+            values = self.df[column]
+            if pd.api.types.is_datetime64_any_dtype(values):
+                self._dates[column] = values.to_numpy()
+            else:
+                codes, uniques = self.codes(column)
+                parsed = pd.to_datetime(pd.Series(uniques, dtype=object), errors="coerce", format="%Y-%m-%d")
+                self._dates[column] = _take(parsed.to_numpy(), codes, np.datetime64("NaT"))
+        return self._dates[column]
+
+    def recode(self, column, values):
+        """Codes of values (per distinct value of another column) in this column's code space"""
+        _, uniques = self.codes(column)
+        lookup = {value: i for i, value in enumerate(uniques)}
+        return np.array([lookup.get(value, -2) for value in values], dtype=np.intp)
+
+def _take(per_unique, codes, missing):
+    """Broadcast per-distinct-value results back to rows"""
+    out = np.append(per_unique, np.array([missing], dtype=per_unique.dtype))
+    return out[codes]  # code -1 picks the trailing missing value
+
+def _unparsed(parsed, raw):
+    """Values present in the raw column that did not parse"""
+    return np.asarray(pd.isna(parsed)) & raw.notna().to_numpy()
+
+def _outside(values, low, high):
+    values = values.to_numpy(dtype=float, na_value=np.nan)
+    with np.errstate(invalid="ignore"):
+        bad = np.zeros(len(values), dtype=bool)
+        if low is not None:
+            bad |= values < low
+        if high is not None:
+            bad |= values > high
+    return bad
+
+def _not_allowed(cols, column, allowed):
+    codes, uniques = cols.codes(column)
+    return _take(~pd.Index(uniques).isin(allowed), codes, False)
+
+def _dates_outside(cols, column, earliest, latest):
+    dates = cols.dates(column)
+    latest = pd.Timestamp(latest) if latest else pd.Timestamp.today()
+    return (dates < np.datetime64(pd.Timestamp(earliest))) | (dates > np.datetime64(latest))
+
+def _untrimmed_text(cols):
+    """Rows with a text value that has leading or trailing whitespace"""
+    bad = np.zeros(len(cols.df), dtype=bool)
+    for column in TEXT_COLUMNS:
+        if column in cols.df.columns and cols.df[column].dtype == object:
+            codes, uniques = cols.codes(column)
+            strings = pd.Series(uniques, dtype=object)
+            untrimmed = strings.map(lambda v: isinstance(v, str) and v != v.strip()).to_numpy(dtype=bool)
+            if untrimmed.any():
+                bad |= _take(untrimmed, codes, False)
+    return bad
+
+def _product_category(cols):
+    """Category differs from the category its Product_Name belongs to"""
+    product_codes, products = cols.codes("Product_Name")
+    category_codes, _ = cols.codes("Category")
+    expected = pd.Series(products, dtype=object).map(PRODUCT_CATEGORIES)
+    known = _take(expected.notna().to_numpy(), product_codes, False)
+    expected_codes = _take(cols.recode("Category", expected), product_codes, -2)
+    return known & (expected_codes != category_codes)
+
+def _same_category(cols):
+    """Category == Fixed_Category per row, compared as integer codes"""
+    category_codes, _ = cols.codes("Category")
+    fixed_codes, fixed = cols.codes("Fixed_Category")
+    return _take(cols.recode("Category", fixed), fixed_codes, -2) == category_codes
+
+def _flag(cols, column):
+    """Category_Match style flags, which may be read as bools or strings"""
+    values = cols.raw(column)
+    if values.dtype == bool:
+        return values.to_numpy()
+    codes, uniques = cols.codes(column)
+    return _take(pd.Index(uniques).astype(str).str.lower().isin(("true", "1", "yes")), codes, False)
+
+def build_rules():
+    """
+    The validation rules
+
+    Returns:
+        list: Rule tuples, checked in this order
+    """
+    rules = []
+
+    for column in ID_COLUMNS:
+        rules.append(Rule(f"{column}_missing", "error", (column,),
+                          lambda c, col=column: c.raw(col).isna().to_numpy(),
+                          f"{column} is missing"))
+
+    for column, (low, high) in RANGES.items():
+        severity = "error" if column in KEY_COLUMNS else "invalid"
+        rules.append(Rule(f"{column}_type", severity, (column,),
+                          lambda c, col=column: _unparsed(c.numeric(col), c.raw(col)),
+                          f"{column} is not a number"))
+        rules.append(Rule(f"{column}_range", severity, (column,),
+                          lambda c, col=column, lo=low, hi=high: _outside(c.numeric(col), lo, hi),
+                          f"{column} outside [{low}, {'∞' if high is None else high}]"))
+
+    for column, (earliest, latest) in DATE_RANGES.items():
+        severity = "error" if column in KEY_COLUMNS else "invalid"
+        rules.append(Rule(f"{column}_type", severity, (column,),
+                          lambda c, col=column: _unparsed(c.dates(col), c.raw(col)),
+                          f"{column} is not a YYYY-MM-DD date"))
+        rules.append(Rule(f"{column}_range", severity, (column,),
+                          lambda c, col=column, lo=earliest, hi=latest: _dates_outside(c, col, lo, hi),
+                          f"{column} before {earliest} or in the future"))
+
+    for column, allowed in ALLOWED_VALUES.items():
+        rules.append(Rule(f"{column}_value", "warning", (column,),
+                          lambda c, col=column, ok=allowed: _not_allowed(c, col, ok),
+                          f"{column} not one of {', '.join(allowed)}"))
+
+    rules += [
+        Rule("product_category", "warning", ("Product_Name", "Category"),
+             _product_category,
+             "Category differs from the product's category (e.g. Dress sold as Electronics)"),
+        Rule("fixed_category", "warning", ("Category", "Fixed_Category"),
+             lambda c: ~_same_category(c),
+             "Category differs from Fixed_Category"),
+        Rule("category_match_flag", "warning", ("Category", "Fixed_Category", "Category_Match"),
+             lambda c: _flag(c, "Category_Match") != _same_category(c),
+             "Category_Match disagrees with Category == Fixed_Category"),
+        Rule("brand_model_flag", "warning", ("Name_Brand_Model_Match",),
+             lambda c: ~_flag(c, "Name_Brand_Model_Match"),
+             "Row is flagged as a Product_Name/Brand/Model mismatch"),
+        Rule("amount_above_price", "warning", ("Purchase_Amount", "Market_Price"),
+             lambda c: (c.numeric("Purchase_Amount") > c.numeric("Market_Price") * (1 + PRICE_TOLERANCE)).to_numpy(),
+             "Purchase_Amount above Market_Price"),
+        Rule("untrimmed_text", "warning", (), _untrimmed_text,
+             "Text with leading or trailing whitespace"),
+    ]
+    return rules
+
+RULES = build_rules()
+
+def _check(df, rules):
+    """Applicable rules and their rules x rows violation matrix"""
+    cols = _Columns(df)
+    applicable = [rule for rule in rules if all(column in df.columns for column in rule.columns)]
+    violations = np.zeros((len(applicable), len(df)), dtype=bool)
+    for i, rule in enumerate(applicable):
+        violations[i] = rule.check(cols)
+    return applicable, violations
+
+def _report(df, applicable, violations, examples):
+    counts = violations.sum(axis=1)
+    return pd.DataFrame([
+        {
+            "rule": rule.name,
+            "severity": rule.severity,
+            "columns": ", ".join(rule.columns),
+            "violations": int(count),
+            "share": round(count / len(df), 4) if len(df) else 0.0,
+            "examples": df.index[violations[i]][:examples].tolist(),
+            "description": rule.description,
+        }
+        for i, (rule, count) in enumerate(zip(applicable, counts)) if count
+    ], columns=["rule", "severity", "columns", "violations", "share", "examples", "description"])
+
+def _clean_mask(applicable, violations):
+    errors = np.array([rule.severity == "error" for rule in applicable], dtype=bool)
+    return ~violations[errors].any(axis=0) if errors.any() else np.ones(violations.shape[1], dtype=bool)
+
+def validate(df, rules=RULES, examples=3):
+    """
+    Run every applicable rule over a DataFrame
+
+    Args:
+        df (pd.DataFrame): Rows to validate, as read from the CSV or cleaned
+        rules (list): Rule tuples, by default RULES
+        examples (int): Example row labels kept per violated rule
+
+    Returns:
+        tuple: (clean-row mask as a boolean np.ndarray, report DataFrame with
+            one row per violated rule: rule, severity, columns, violations,
+            share, examples, description)
+    """
+    with span("validate", rows=len(df)) as info:
+        applicable, violations = _check(df, rules)
+        clean = _clean_mask(applicable, violations)
+        info.update(rules=len(applicable), dirty_rows=int((~clean).sum()))
+        return clean, _report(df, applicable, violations, examples)
+
+def apply(df, rules=RULES, examples=3):
+    """
+    Drop rows with a bad transaction key and blank invalid cells
+
+    Args:
+        df (pd.DataFrame): Rows as read from the CSV
+        rules (list): Rule tuples, by default RULES
+        examples (int): Example row labels kept per violated rule
+
+    Returns:
+        tuple: (cleaned DataFrame, report DataFrame as from validate())
+    """
+    with span("validate", rows=len(df)) as info:
+        applicable, violations = _check(df, rules)
+        clean = _clean_mask(applicable, violations)
+        report = _report(df, applicable, violations, examples)
+        blanked = {}
+        for rule, bad in zip(applicable, violations):
+            if rule.severity == "invalid" and bad.any():
+                column = rule.columns[0]
+                blanked[column] = blanked.get(column, False) | bad
+        if blanked:
+            df = df.assign(**{column: df[column].mask(bad) for column, bad in blanked.items()})
+        if not clean.all():
+            df = df[clean]
+        info.update(rules=len(applicable), dirty_rows=int((~clean).sum()),
+                    blanked_cells=int(sum(bad.sum() for bad in blanked.values())))
+        return df, report
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate a Walmart customer CSV")
+    parser.add_argument("csv", nargs="?", default="Walmart_customer_fixed.csv", help="CSV file to validate")
+    parser.add_argument("--clean-out", help="write the rows with a valid key, invalid cells blanked, to this CSV")
+    parser.add_argument("--report-out", help="write the violations report to this CSV")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv, engine="pyarrow")
+    clean, report = validate(df)
+
+    print(f"🔎 {len(df):,} rows checked against {len(RULES)} rules: {int(clean.sum()):,} kept, "
+          f"{int((~clean).sum()):,} with a bad transaction key")
+    if report.empty:
+        print("✅ No violations")
+    else:
+        with pd.option_context("display.max_colwidth", 60, "display.width", 200):
+            print(report.drop(columns="examples").to_string(index=False))
+
+    if args.clean_out:
+        apply(df)[0].to_csv(args.clean_out, index=False)
+        print(f"💾 Clean rows saved to: {args.clean_out}")
+    if args.report_out:
+        report.to_csv(args.report_out, index=False)
+        print(f"💾 Report saved to: {args.report_out}")
+
+if __name__ == "__main__":
+    main()